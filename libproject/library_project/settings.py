@@ -24,6 +24,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'projects.roles.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -41,6 +42,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'projects.context_processors.roles',
                 'projects.context_processors.moderation_count',
             ],
         },
@@ -53,6 +55,19 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
+
+# Кэш. При нескольких процессах (gunicorn, uwsgi) нужен общий бэкенд, например Redis:
+# через него процессы узнают, что их локальные индексы устарели (см. projects/versions.py).
+# В LocMemCache по умолчанию всего 300 ключей, и карточки с фасетами быстро их вытесняют
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+}
+
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
@@ -70,6 +85,44 @@ import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Счетчики просмотров и скачиваний копятся в памяти процесса и сохраняются в БД
+# раз в N секунд и при завершении процесса (projects/buffers.py); 0 — без потока сброса
+PROJECT_COUNTERS_FLUSH_INTERVAL = 30
+
+# Передача файлов проектов фронт-серверу после проверки прав и подсчета скачивания:
+# None — файл отдает Django (с поддержкой докачки),
+# 'x-accel-redirect' — nginx, нужен internal-location с alias на MEDIA_ROOT:
+#     location /protected-media/ { internal; alias /path/to/media/; }
+# 'x-sendfile' — Apache (mod_xsendfile) или lighttpd
+PROJECT_FILES_OFFLOAD = None
+PROJECT_FILES_ACCEL_PREFIX = '/protected-media/'
+# Сколько проектов можно выгрузить одним архивом (projects/export/)
+PROJECT_EXPORT_MAX_PROJECTS = 200
+
+# Загрузка файлов по частям. Временный каталог лучше держать на том же диске,
+# что и MEDIA_ROOT: тогда готовый файл переносится в хранилище без копирования
+PROJECT_UPLOAD_TEMP_DIR = os.path.join(BASE_DIR, 'upload_tmp')
+PROJECT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+PROJECT_UPLOAD_MAX_SIZE = 1024 * 1024 * 1024
+# Каждая часть проверяется по SHA-256 из заголовка Chunk-SHA256. Браузер считает хеш
+# (crypto.subtle) только на HTTPS и localhost: сайту, открытому по HTTP, нужно разрешить
+# части без хеша, но тогда поврежденная при передаче часть не будет обнаружена
+PROJECT_UPLOAD_ALLOW_UNHASHED_CHUNKS = False
+# Незавершенные загрузки удаляются командой clear_stale_uploads через сутки
+PROJECT_UPLOAD_SESSION_TTL = 60 * 60 * 24
+
+# Фоновая обработка файлов (manage.py run_worker)
+PROJECT_WORKER_PROCESSES = 2
+PROJECT_JOBS_MAX_ATTEMPTS = 5
+# Пауза перед повтором: 30 с, 60 с, 120 с...
+PROJECT_JOBS_RETRY_DELAY = 30
+# Задание, которое воркер держит дольше, считается брошенным и возвращается в очередь
+PROJECT_JOBS_LOCK_TIMEOUT = 60 * 10
+PROJECT_EXTRACT_MAX_CHARS = 1_000_000
+
+# Сколько похожих проектов хранится для каждого (manage.py build_recommendations)
+PROJECT_SIMILAR_TOP_K = 10
+
 # Login/Logout URLs
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'index'
@@ -1,6 +1,7 @@
 # projects/admin.py
 from django.contrib import admin
-from .models import Subject, Teacher, Pupil, Project, Comment
+from .models import Subject, Teacher, Pupil, Project, Comment, Job, Keyword
+from .moderation import UPDATED, moderate_projects
 
 
 @admin.register(Subject)
@@ -9,31 +10,45 @@ class SubjectAdmin(admin.ModelAdmin):
     search_fields = ['name', 'code']
 
     def project_count(self, obj):
-        return obj.projects.count()
+        return obj.published_count
 
-    project_count.short_description = 'Проектов'
+    project_count.short_description = 'Опубликовано проектов'
+    project_count.admin_order_field = 'published_count'
 
 
 @admin.register(Teacher)
 class TeacherAdmin(admin.ModelAdmin):
     list_display = ['user', 'department', 'position', 'project_count']
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
     search_fields = ['user__username', 'user__first_name', 'user__last_name']
 
     def project_count(self, obj):
-        return obj.supervised_projects.count()
+        return obj.published_count
 
-    project_count.short_description = 'Проектов'
+    project_count.short_description = 'Опубликовано проектов'
+    project_count.admin_order_field = 'published_count'
 
 
 @admin.register(Pupil)
 class PupilAdmin(admin.ModelAdmin):
     list_display = ['user', 'project_count']
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
     search_fields = ['user__username', 'user__first_name', 'user__last_name']
 
     def project_count(self, obj):
-        return obj.projects.count()
+        return obj.published_count
 
-    project_count.short_description = 'Проектов'
+    project_count.short_description = 'Опубликовано проектов'
+    project_count.admin_order_field = 'published_count'
+
+
+@admin.register(Keyword)
+class KeywordAdmin(admin.ModelAdmin):
+    list_display = ['name', 'published_count']
+    search_fields = ['name']
+    ordering = ['-published_count', 'name']
 
 
 @admin.register(Project)
@@ -42,13 +57,15 @@ class ProjectAdmin(admin.ModelAdmin):
     list_filter = ['status', 'subject', 'year']
     search_fields = ['title', 'description', 'keywords']
     readonly_fields = ['views', 'downloads', 'created_at', 'updated_at']
-    filter_horizontal = ['pupils']
+    # Ученики, руководители и предметы подгружаются поиском, а не выводятся все в HTML
+    autocomplete_fields = ['subject', 'teacher', 'moderated_by', 'pupils']
+    list_select_related = ['subject', 'teacher__user']
     actions = ['approve_projects']
 
     def approve_projects(self, request, queryset):
-        from django.utils import timezone
-        queryset.update(status='published', published_at=timezone.now())
-        self.message_user(request, f'{queryset.count()} проектов опубликовано')
+        results = moderate_projects(queryset.values_list('pk', flat=True), 'approve', request.roles.teacher_id)
+        updated = list(results.values()).count(UPDATED)
+        self.message_user(request, f'{updated} проектов опубликовано')
 
     approve_projects.short_description = 'Опубликовать выбранные проекты'
 
@@ -56,4 +73,22 @@ class ProjectAdmin(admin.ModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ['user', 'project', 'created_at']
-    list_filter = ['created_at']
\ No newline at end of file
+    list_filter = ['created_at']
+    list_select_related = ['user', 'project']
+    autocomplete_fields = ['user', 'project']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['blob', 'stage', 'status', 'attempts', 'run_after', 'updated_at']
+    list_filter = ['status', 'stage']
+    list_select_related = ['blob']
+    readonly_fields = ['blob', 'stage', 'attempts', 'locked_by', 'locked_at', 'result', 'error', 'created_at', 'updated_at']
+    actions = ['retry_jobs']
+
+    def retry_jobs(self, request, queryset):
+        from django.utils import timezone
+        updated = queryset.exclude(status='running').update(status='queued', attempts=0, run_after=timezone.now())
+        self.message_user(request, f'{updated} заданий поставлено в очередь')
+
+    retry_jobs.short_description = 'Повторить выбранные задания'
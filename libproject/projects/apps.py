@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class ProjectsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'projects'
+
+    def ready(self):
+        from . import signals  # noqa: F401
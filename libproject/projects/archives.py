@@ -0,0 +1,117 @@
+# projects/archives.py
+"""Содержимое архивов проектов: дерево файлов на странице проекта и скачивание отдельного файла.
+
+Оглавление читает воркер (этап listing) из центрального каталога архива, без распаковки,
+и сохраняет в ArchiveManifest. Блоб неизменен (имя — хеш содержимого), поэтому
+оглавление кэшируется по SHA-256 без сроков и сбросов.
+"""
+import mimetypes
+import os
+import zipfile
+
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header
+
+from .processing import ARCHIVE_KINDS
+
+MANIFEST_TIMEOUT = 60 * 60 * 24 * 7
+# Отдельный файл можно отдать, не распаковывая остальные, только из zip;
+# в 7z данные обычно сжаты одним потоком
+STREAMABLE_KINDS = {'zip'}
+TREE_LIMIT = 500
+CHUNK_SIZE = 64 * 1024
+
+
+def _key(blob):
+    return f'archive:manifest:{blob.sha256}'
+
+
+def get_manifest(blob):
+    """Список [имя, размер, сжатый размер] или None, если оглавление еще не прочитано"""
+    from .models import ArchiveManifest
+
+    entries = cache.get(_key(blob))
+    if entries is None:
+        manifest = ArchiveManifest.objects.filter(blob=blob).first()
+        if manifest is None:
+            return None
+        entries = manifest.items
+        cache.set(_key(blob), entries, MANIFEST_TIMEOUT)
+    return entries
+
+
+def forget(blob):
+    cache.delete(_key(blob))
+
+
+def tree(entries, limit=TREE_LIMIT):
+    """Строки дерева: каталоги перед своими файлами, depth — уровень вложенности.
+
+    index файла — его номер в оглавлении (по нему файл скачивается).
+    """
+    rows = []
+    opened = []
+    for index in sorted(range(len(entries)), key=lambda i: entries[i][0].split('/')):
+        name, size = entries[index][:2]
+        *folders, filename = name.split('/')
+        common = 0
+        while common < min(len(opened), len(folders)) and opened[common] == folders[common]:
+            common += 1
+        for depth in range(common, len(folders)):
+            rows.append({'name': folders[depth], 'depth': depth, 'is_dir': True})
+        opened = folders
+        rows.append({'name': filename, 'depth': len(folders), 'size': size, 'index': index})
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def tree_for(blob):
+    """Дерево файлов для шаблона или None (не архив или оглавление еще не готово)"""
+    if blob is None or blob.kind not in ARCHIVE_KINDS:
+        return None
+    entries = get_manifest(blob)
+    if entries is None:
+        return None
+    rows = tree(entries)
+    return {
+        'rows': rows,
+        'entries': len(entries),
+        'hidden': len(entries) - sum(1 for row in rows if not row.get('is_dir')),
+        'streamable': blob.kind in STREAMABLE_KINDS,
+    }
+
+
+def _read_member(fieldfile, name):
+    with fieldfile.storage.open(fieldfile.name, 'rb') as file, \
+            zipfile.ZipFile(file) as archive, archive.open(name) as member:
+        for chunk in iter(lambda: member.read(CHUNK_SIZE), b''):
+            yield chunk
+
+
+def serve_member(request, fieldfile, blob, index):
+    """Отдает один файл из zip-архива потоком; архив целиком не читается и не распаковывается"""
+    entries = get_manifest(blob) if blob is not None and blob.kind in STREAMABLE_KINDS else None
+    if entries is None or not 0 <= index < len(entries):
+        raise Http404('Файл в архиве не найден')
+    name, size = entries[index][:2]
+
+    # Содержимое блоба не меняется, поэтому ETag — хеш архива и номер файла
+    etag = f'"{blob.sha256}-{index}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response.headers['ETag'] = etag
+        return response
+
+    filename = os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = StreamingHttpResponse(_read_member(fieldfile, name), content_type=content_type)
+    response.headers['Content-Length'] = str(size)
+    response.headers['ETag'] = etag
+    response.headers['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
@@ -0,0 +1,217 @@
+# projects/autocomplete.py
+"""Индекс префиксов для автодополнения поиска, хранится в памяти процесса.
+
+Вместе с ним обновляется словарь для поиска с опечатками (fuzzy.py): оба строятся
+по одним и тем же проектам и сверяются с одним номером поколения.
+"""
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+
+from .fuzzy import TrigramIndex
+from .versions import bump_version, get_version
+
+VERSION_NAME = 'autocomplete'
+
+# Приоритет совпадения: начало названия, слово в названии, ключевое слово
+TITLE_START, TITLE_WORD, KEYWORD = 0, 1, 2
+
+# Сколько кандидатов просматривать при ранжировании
+MAX_CANDIDATES = 200
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().replace('ё', 'е').split())
+
+
+def _keys_for(title, keywords):
+    """Ключи проекта: название целиком, название с каждого слова и ключевые слова"""
+    title = normalize(title)
+    keys = {(title, TITLE_START)} if title else set()
+    position = title.find(' ')
+    while position != -1:
+        keys.add((title[position + 1:], TITLE_WORD))
+        position = title.find(' ', position + 1)
+    for keyword in (keywords or '').split(','):
+        keyword = normalize(keyword)
+        if keyword:
+            keys.add((keyword, KEYWORD))
+    return keys
+
+
+class PrefixIndex:
+    """Отсортированный список (ключ, приоритет, id проекта) с поиском через bisect"""
+
+    def __init__(self):
+        self._entries = []
+        self._keys_by_project = {}
+        self._projects = {}
+        self._lock = threading.Lock()
+        self.version = None
+        self.build_time = 0.0
+
+    def build(self, rows, version=None):
+        """Строит индекс заново по строкам (id, title, year, keywords)"""
+        started = time.perf_counter()
+        entries = []
+        keys_by_project = {}
+        projects = {}
+        for pk, title, year, keywords in rows:
+            keys = _keys_for(title, keywords)
+            keys_by_project[pk] = keys
+            projects[pk] = (title, year)
+            entries.extend((key, priority, pk) for key, priority in keys)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._keys_by_project = keys_by_project
+            self._projects = projects
+            self.version = version
+            self.build_time = time.perf_counter() - started
+
+    def add(self, pk, title, year, keywords):
+        with self._lock:
+            self._remove(pk)
+            keys = _keys_for(title, keywords)
+            self._keys_by_project[pk] = keys
+            self._projects[pk] = (title, year)
+            for key, priority in keys:
+                insort(self._entries, (key, priority, pk))
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        for key, priority in self._keys_by_project.pop(pk, ()):
+            position = bisect_left(self._entries, (key, priority, pk))
+            if position < len(self._entries) and self._entries[position] == (key, priority, pk):
+                del self._entries[position]
+        self._projects.pop(pk, None)
+
+    def search(self, query, limit=5):
+        """Возвращает [(id, title, year)] проектов, у которых ключ начинается с query"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        entries = self._entries
+        position = bisect_left(entries, (prefix,))
+        candidates = {}
+        while position < len(entries) and len(candidates) < MAX_CANDIDATES:
+            key, priority, pk = entries[position]
+            if not key.startswith(prefix):
+                break
+            if pk not in candidates or priority < candidates[pk]:
+                candidates[pk] = priority
+            position += 1
+
+        results = []
+        for pk, priority in candidates.items():
+            project = self._projects.get(pk)
+            if project:
+                results.append((priority, project[0].lower(), pk, project[0], project[1]))
+        results.sort()
+        return [(pk, title, year) for _, _, pk, title, year in results[:limit]]
+
+    def stats(self):
+        """Размер индекса в памяти (приблизительно, в байтах) и время построения"""
+        with self._lock:
+            memory = sys.getsizeof(self._entries) + sys.getsizeof(self._projects)
+            memory += sys.getsizeof(self._keys_by_project)
+            for entry in self._entries:
+                memory += sys.getsizeof(entry) + sys.getsizeof(entry[0])
+            for keys in self._keys_by_project.values():
+                memory += sys.getsizeof(keys)
+            for title, year in self._projects.values():
+                memory += sys.getsizeof(title)
+            return {
+                'projects': len(self._projects),
+                'entries': len(self._entries),
+                'memory_bytes': memory,
+                'build_time_ms': round(self.build_time * 1000, 2),
+                'version': self.version,
+            }
+
+
+_index = PrefixIndex()
+_fuzzy_index = TrigramIndex()
+
+
+def _published_rows():
+    from .models import Project
+
+    return Project.objects.filter(status='published').values_list('id', 'title', 'year', 'keywords')
+
+
+def current_version():
+    """Номер поколения индекса: по нему клиенты сверяют закэшированные подсказки"""
+    return get_version(VERSION_NAME)
+
+
+def get_index():
+    """Возвращает актуальный индекс; перестраивает его, если другой процесс менял проекты"""
+    version = get_version(VERSION_NAME)
+    if _index.version != version:
+        _index.build(_published_rows().iterator(), version=version)
+    return _index
+
+
+def get_fuzzy_index():
+    """Словарь для исправления опечаток; перестраивается так же, как индекс префиксов"""
+    version = get_version(VERSION_NAME)
+    if _fuzzy_index.version != version:
+        _fuzzy_index.build(_published_rows().iterator(), version=version)
+    return _fuzzy_index
+
+
+def _mark_changed():
+    """Сообщает другим процессам об изменении; свой индекс уже обновлен инкрементально"""
+    version = bump_version(VERSION_NAME)
+    for index in (_index, _fuzzy_index):
+        if index.version is not None and version == index.version + 1:
+            index.version = version
+        else:
+            index.version = None
+
+
+def update_project(project):
+    """Добавляет, обновляет или убирает проект из индекса в зависимости от статуса"""
+    for index in (_index, _fuzzy_index):
+        if project.status == 'published':
+            index.add(project.pk, project.title, project.year, project.keywords)
+        else:
+            index.remove(project.pk)
+    _mark_changed()
+
+
+def update_projects(pks):
+    """Как update_project для проектов из списка id (после queryset.update); один запрос"""
+    from .models import Project
+
+    missing = set(pks)
+    rows = Project.objects.filter(pk__in=missing).values_list('id', 'title', 'year', 'keywords', 'status')
+    for pk, title, year, keywords, status in rows:
+        missing.discard(pk)
+        for index in (_index, _fuzzy_index):
+            if status == 'published':
+                index.add(pk, title, year, keywords)
+            else:
+                index.remove(pk)
+    for pk in missing:
+        _index.remove(pk)
+        _fuzzy_index.remove(pk)
+    _mark_changed()
+
+
+def remove_project(pk):
+    _index.remove(pk)
+    _fuzzy_index.remove(pk)
+    _mark_changed()
+
+
+def invalidate():
+    """Полная перестройка при следующем запросе во всех процессах"""
+    bump_version(VERSION_NAME)
+    _index.version = None
+    _fuzzy_index.version = None
@@ -0,0 +1,64 @@
+# projects/buffers.py
+"""Буферы в памяти процесса, которые периодически сохраняются в БД.
+
+Модули регистрируют функцию сброса своего буфера (register). Поток-таймер вызывает
+их раз в PROJECT_COUNTERS_FLUSH_INTERVAL секунд, а при завершении процесса (atexit)
+они вызываются в последний раз. Поток запускается при первом обращении к буферу,
+в дочернем процессе после fork — заново. При интервале 0 поток не запускается,
+и буферы сохраняются только вызовом flush_all().
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_flushers = []
+_started_pid = None
+_start_lock = threading.Lock()
+
+
+def register(flush):
+    """Добавляет функцию сброса буфера; подходит как декоратор"""
+    if flush not in _flushers:
+        _flushers.append(flush)
+    return flush
+
+
+def flush_interval():
+    return getattr(settings, 'PROJECT_COUNTERS_FLUSH_INTERVAL', 30)
+
+
+def flush_all():
+    for flush in _flushers:
+        try:
+            flush()
+        except Exception:
+            logger.exception('Не удалось сохранить буфер %s', flush.__module__)
+
+
+def _run(interval):
+    while True:
+        time.sleep(interval)
+        flush_all()
+        # Соединение потока закрывается, как после запроса, чтобы не висеть между сбросами
+        connection.close()
+
+
+def ensure_started():
+    """Запускает поток сброса в текущем процессе, если он еще не запущен"""
+    global _started_pid
+    interval = flush_interval()
+    if not interval or _started_pid == os.getpid():
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        threading.Thread(target=_run, args=(interval,), name='projects-buffers', daemon=True).start()
+        atexit.register(flush_all)
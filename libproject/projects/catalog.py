@@ -0,0 +1,112 @@
+# projects/catalog.py
+"""Фильтры каталога и счетчики фасетов (предмет, руководитель, год); точный фильтр по тегу"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .keywords import normalize
+from .reference import get_snapshot
+from .search import search_projects
+from .versions import bump_version, get_version
+
+FILTER_FIELDS = {
+    'subject': 'subject_id',
+    'teacher': 'teacher_id',
+    'year': 'year',
+}
+
+FACETS_VERSION = 'facets'
+FACETS_TIMEOUT = 60 * 60
+
+
+def parse_filters(params):
+    """Фильтры из GET-параметров; нечисловые значения отбрасываются"""
+    filters = {'q': (params.get('q') or '').strip() or None}
+    for name in FILTER_FIELDS:
+        value = params.get(name)
+        filters[name] = value if value and value.isdigit() else None
+    filters['tag'] = normalize(params.get('tag')) or None
+    return filters
+
+
+def filter_projects(filters, exclude=None, queryset=None):
+    """Опубликованные проекты по фильтрам; фильтр exclude не применяется (для его фасета)"""
+    from .models import Project
+
+    projects = Project.objects.published() if queryset is None else queryset
+    if filters.get('q'):
+        projects = search_projects(projects, filters['q'])
+    for name, field in FILTER_FIELDS.items():
+        if name != exclude and filters.get(name):
+            projects = projects.filter(**{field: filters[name]})
+    if filters.get('tag'):
+        # Название тега уникально: соединение не размножает строки проектов
+        projects = projects.filter(tags__name=filters['tag'])
+    return projects
+
+
+def _signature(filters):
+    normalized = dict(filters, q=' '.join((filters.get('q') or '').lower().split()))
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+def _compute_facets(filters):
+    subjects = (
+        filter_projects(filters, exclude='subject')
+        .filter(subject__isnull=False)
+        .order_by()
+        .values('subject_id')
+        .annotate(total=Count('pk'))
+    )
+    teachers = (
+        filter_projects(filters, exclude='teacher')
+        .filter(teacher__isnull=False)
+        .order_by()
+        .values('teacher_id')
+        .annotate(total=Count('pk'))
+    )
+    years = (
+        filter_projects(filters, exclude='year')
+        .order_by()
+        .values('year')
+        .annotate(total=Count('pk'))
+    )
+    # Названия из снимка справочников: счетчики считаются без соединений
+    reference = get_snapshot()
+    return {
+        'subject': sorted(
+            ((row['subject_id'], reference.subject_names.get(row['subject_id'], ''), row['total'])
+             for row in subjects),
+            key=lambda item: item[1].lower()
+        ),
+        'teacher': sorted(
+            ((row['teacher_id'], reference.teacher_names.get(row['teacher_id'], ''), row['total'])
+             for row in teachers),
+            key=lambda item: item[1].lower()
+        ),
+        'year': sorted(
+            ((row['year'], str(row['year']), row['total']) for row in years),
+            reverse=True
+        ),
+    }
+
+
+def facet_counts(filters):
+    """Число опубликованных проектов по каждому значению фасета для текущих фильтров.
+
+    Для каждого фасета учитываются все фильтры, кроме его собственного,
+    поэтому в списке остаются альтернативы выбранному значению.
+    Возвращает {'subject': [(id, название, число)], 'teacher': [...], 'year': [...]}.
+    """
+    key = f'facets:{get_version(FACETS_VERSION)}:{_signature(filters)}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = _compute_facets(filters)
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
+
+
+def invalidate_facets():
+    bump_version(FACETS_VERSION)
@@ -0,0 +1,60 @@
+# projects/conditional.py
+"""Условные GET-запросы: по ETag и Last-Modified отвечаем 304, не строя страницу"""
+import hashlib
+
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(request, *parts):
+    """Слабый ETag: страница зависит от данных и от того, кто ее смотрит.
+
+    Модераторам в шапке показывается число проектов на модерации
+    (context_processors.moderation_count), поэтому оно тоже входит в ETag.
+    """
+    from .moderation import status_counts
+    from .roles import resolve
+
+    viewer = request.user.pk if request.user.is_authenticated else 'anonymous'
+    roles = getattr(request, 'roles', None) or resolve(request)
+    if roles.is_moderator:
+        viewer = (viewer, status_counts()['pending'])
+    digest = hashlib.sha1(repr((viewer,) + parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _set_validators(request, response, etag, last_modified):
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    # Кэш может хранить страницу, но обязан каждый раз сверять ее с сервером
+    if request.user.is_authenticated:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional_page(request, etag, build, last_modified=None):
+    """Ответ 304 (или 412), если у клиента актуальная версия, иначе результат build().
+
+    Страницы с непоказанными сообщениями всегда строятся заново, иначе
+    сообщения остались бы в сессии до следующей страницы.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return build()
+    if messages.get_messages(request):
+        response = build()
+    else:
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is None:
+            response = build()
+    if response.status_code in (200, 304):
+        _set_validators(request, response, etag, last_modified)
+    return response
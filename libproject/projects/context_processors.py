@@ -1,9 +1,16 @@
 # projects/context_processors.py
-from .models import Project
+from .moderation import status_counts
+from .roles import resolve
+
+
+def roles(request):
+    """Роли пользователя для шаблонов: {% if roles.is_pupil %}"""
+    return {'roles': getattr(request, 'roles', None) or resolve(request)}
+
 
 def moderation_count(request):
     """Добавляет количество проектов на модерации в контекст"""
-    if request.user.is_authenticated and (hasattr(request.user, 'teacher') or request.user.is_staff):
-        pending_count = Project.objects.filter(status='pending').count()
-        return {'projects_pending': pending_count}
-    return {'projects_pending': 0}
\ No newline at end of file
+    roles = getattr(request, 'roles', None) or resolve(request)
+    if roles.is_moderator:
+        return {'projects_pending': status_counts()['pending']}
+    return {'projects_pending': 0}
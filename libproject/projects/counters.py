@@ -0,0 +1,78 @@
+# projects/counters.py
+"""Отложенная запись счетчиков просмотров и скачиваний.
+
+Приращения копятся в памяти процесса и переносятся в БД пачками через F()-выражения
+раз в PROJECT_COUNTERS_FLUSH_INTERVAL секунд и при завершении процесса (buffers.py).
+Каждый процесс сохраняет свои приращения сам, поэтому общий кэш для них не нужен;
+пропадают только приращения процесса, убитого без завершения (kill -9), —
+не больше чем за один интервал.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from . import buffers
+from .fragments import bump_counters_generation
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('views', 'downloads')
+
+_lock = threading.Lock()
+# (id проекта, поле) -> еще не сохраненное приращение
+_deltas = defaultdict(int)
+
+
+def increment(pk, field, delta=1):
+    """Увеличивает счетчик без записи в БД; возвращает число еще не сохраненных приращений"""
+    with _lock:
+        _deltas[pk, field] += delta
+        value = _deltas[pk, field]
+    buffers.ensure_started()
+    return value
+
+
+def pending(pk):
+    """Приращения проекта, еще не перенесенные в БД этим процессом"""
+    with _lock:
+        return {field: _deltas.get((pk, field), 0) for field in FIELDS}
+
+
+@buffers.register
+def flush():
+    """Переносит накопленные приращения в БД; возвращает число обновленных проектов"""
+    from .models import Project
+
+    # Буфер забирается целиком: приращения во время записи попадут в следующий сброс
+    with _lock:
+        taken = dict(_deltas)
+        _deltas.clear()
+    if not taken:
+        return 0
+
+    # Проекты с одинаковыми приращениями обновляются одним UPDATE
+    groups = defaultdict(list)
+    for pk in {pk for pk, _ in taken}:
+        deltas = tuple(taken.get((pk, field), 0) for field in FIELDS)
+        groups[deltas].append(pk)
+
+    try:
+        with transaction.atomic():
+            for deltas, group in groups.items():
+                Project.objects.filter(pk__in=group).update(**{
+                    field: F(field) + delta for field, delta in zip(FIELDS, deltas) if delta
+                })
+    except Exception:
+        logger.exception('Не удалось сохранить счетчики, приращения возвращены в буфер')
+        with _lock:
+            for key, value in taken.items():
+                _deltas[key] += value
+        raise
+
+    # Карточки с новыми просмотрами получат новые ключи (fragments._card_key),
+    # а страницы целиком и ETag каталога зависят от поколения счетчиков
+    bump_counters_generation()
+    return sum(len(group) for group in groups.values())
@@ -0,0 +1,148 @@
+# projects/downloads.py
+"""Отдача файлов проектов: докачка (Range/If-Range), строгий ETag и передача фронт-серверу"""
+import hashlib
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(fieldfile, size, modified):
+    """Строгий ETag: меняется при любой замене файла"""
+    digest = hashlib.sha1(f'{fieldfile.name}:{size}:{modified.timestamp()}'.encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def parse_range(header, size):
+    """(начало, конец) включительно; None — отдать файл целиком; ValueError — диапазон недостижим.
+
+    Несколько диапазонов в одном запросе не поддерживаются: на них отдается весь файл.
+    """
+    match = RANGE_RE.match((header or '').replace(' ', ''))
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # bytes=-N — последние N байт
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def range_start(header):
+    """Первый запрошенный байт без знания размера файла (None — заголовка нет или он неразборчив)"""
+    match = RANGE_RE.match((header or '').replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if first:
+        return int(first)
+    return None if last else 0
+
+
+def _if_range_matches(request, etag, modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    # Даты сравниваются точно; слабые ETag для If-Range не годятся
+    if if_range.startswith('W/'):
+        return False
+    return parse_http_date_safe(if_range) == int(modified.timestamp())
+
+
+def _read(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _offload_response(fieldfile, mode):
+    response = HttpResponse()
+    if mode == 'x-accel-redirect':
+        prefix = settings.PROJECT_FILES_ACCEL_PREFIX.rstrip('/')
+        response.headers['X-Accel-Redirect'] = f'{prefix}/{quote(fieldfile.name)}'
+    else:
+        response.headers['X-Sendfile'] = fieldfile.path
+    # Тип ответа определит фронт-сервер
+    del response.headers['Content-Type']
+    return response
+
+
+def serve_file(request, fieldfile, filename, on_start=None):
+    """Ответ на скачивание файла; on_start() вызывается, если клиент начинает файл с первого байта.
+
+    Докачка и повторные проверки кэша (304) не считаются новым скачиванием.
+    При PROJECT_FILES_OFFLOAD файл передает nginx (X-Accel-Redirect) или
+    Apache/lighttpd (X-Sendfile): Range и If-Range тогда обрабатывает фронт-сервер.
+    """
+    disposition = content_disposition_header(True, filename)
+    mode = getattr(settings, 'PROJECT_FILES_OFFLOAD', None)
+    if mode:
+        if on_start and request.method != 'HEAD' and range_start(request.headers.get('Range')) in (None, 0):
+            on_start()
+        response = _offload_response(fieldfile, mode)
+        response.headers['Content-Disposition'] = disposition
+        return response
+
+    storage = fieldfile.storage
+    size = storage.size(fieldfile.name)
+    modified = storage.get_modified_time(fieldfile.name)
+    etag = file_etag(fieldfile, size, modified)
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(modified.timestamp()))
+    if response is not None:
+        response.headers['ETag'] = etag
+        return response
+
+    # Если файл изменился после начала загрузки (If-Range), Range игнорируется
+    range_header = request.headers.get('Range') if _if_range_matches(request, etag, modified) else None
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    length = max(end - start + 1, 0)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            _read(storage.open(fieldfile.name, 'rb'), start, length), content_type=content_type
+        )
+    if byte_range is not None:
+        response.status_code = 206
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.headers['Content-Length'] = str(length)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(modified.timestamp())
+    response.headers['Content-Disposition'] = disposition
+
+    if on_start and request.method != 'HEAD' and start == 0:
+        on_start()
+    return response
@@ -0,0 +1,124 @@
+# projects/export.py
+"""Выгрузка нескольких проектов одним zip-архивом.
+
+Архив собирается на лету: файлы пишутся без сжатия (ZIP_STORED) в приемник,
+из которого генератор сразу отдает байты клиенту. Память не зависит от размера
+выгрузки, временные файлы не создаются. Без сжатия размер архива известен
+заранее, поэтому отправляется Content-Length (если не нужен формат zip64).
+"""
+import csv
+import io
+import zipfile
+
+from django.urls import reverse
+from django.utils import timezone
+
+CHUNK_SIZE = 64 * 1024
+METADATA_NAME = 'projects.csv'
+
+# Размеры записей zip без расширений zip64 (см. zipfile.ZipInfo.FileHeader)
+LOCAL_HEADER_SIZE = 30
+DATA_DESCRIPTOR_SIZE = 16
+CENTRAL_HEADER_SIZE = 46
+END_RECORD_SIZE = 22
+
+
+class _Sink:
+    """Приемник для ZipFile: без tell() zipfile пишет архив последовательно, без перемоток"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+class Entry:
+    """Файл архива: имя, размер и функция, открывающая содержимое на чтение"""
+
+    def __init__(self, name, size, opener, modified):
+        self.name = name
+        self.size = size
+        self.opener = opener
+        self.date_time = timezone.localtime(modified).timetuple()[:6] if modified else (1980, 1, 1, 0, 0, 0)
+
+
+def archive_size(entries):
+    """Точный размер архива или None, если понадобится zip64"""
+    total = END_RECORD_SIZE
+    for entry in entries:
+        if entry.size * 1.05 > zipfile.ZIP64_LIMIT:
+            return None
+        name = len(entry.name.encode('utf-8'))
+        total += LOCAL_HEADER_SIZE + name + entry.size + DATA_DESCRIPTOR_SIZE + CENTRAL_HEADER_SIZE + name
+    if total > zipfile.ZIP64_LIMIT or len(entries) >= zipfile.ZIP_FILECOUNT_LIMIT:
+        return None
+    return total
+
+
+def stream(entries):
+    """Генератор байтов zip-архива из entries"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.name, entry.date_time)
+            info.file_size = entry.size
+            info.external_attr = 0o644 << 16
+            with entry.opener() as source, archive.open(info, 'w') as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def metadata(rows):
+    """CSV с описанием проектов; BOM — чтобы Excel правильно открыл кириллицу"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['id', 'Название', 'Предмет', 'Руководитель', 'Авторы', 'Год', 'Файл', 'Ссылка'])
+    writer.writerows(rows)
+    return ('﻿' + buffer.getvalue()).encode('utf-8')
+
+
+def project_entries(projects, request):
+    """Файлы проектов и CSV с их описанием; проекты без файла попадают только в CSV"""
+    entries, rows = [], []
+    for project in projects:
+        name = ''
+        fieldfile = project.project_file
+        if fieldfile:
+            storage = fieldfile.storage
+            try:
+                size = storage.size(fieldfile.name)
+            except OSError:
+                size = None
+            if size is not None:
+                name = f'{project.pk}/{project.download_filename}'
+                entries.append(Entry(
+                    name, size,
+                    lambda storage=storage, path=fieldfile.name: storage.open(path, 'rb'),
+                    project.updated_at,
+                ))
+        rows.append([
+            project.pk,
+            project.title,
+            project.subject.name if project.subject else '',
+            project.teacher.user.get_full_name() if project.teacher else '',
+            ', '.join(pupil.user.get_full_name() or pupil.user.username for pupil in project.pupils.all()),
+            project.year,
+            name,
+            request.build_absolute_uri(reverse('project_detail', args=[project.pk])),
+        ])
+
+    content = metadata(rows)
+    entries.insert(0, Entry(METADATA_NAME, len(content), lambda: io.BytesIO(content), timezone.now()))
+    return entries
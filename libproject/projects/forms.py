@@ -3,7 +3,9 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from .models import Project, Teacher, Pupil, Comment
+from django.urls import reverse
+from .models import Project, Teacher, Pupil, Comment, UploadSession
+from . import reference, uploads
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -74,7 +76,38 @@ class UserRegistrationForm(UserCreationForm):
         return user
 
 
+class LookupSelect(forms.Select):
+    """Список с поиском по мере ввода (lookups.py).
+
+    Если вариантов больше max_choices, в HTML попадает только выбранный, остальные
+    скрипт страницы запрашивает у /api/lookup/<kind>/.
+    """
+
+    def __init__(self, kind, attrs=None, max_choices=100):
+        super().__init__(attrs)
+        self.kind = kind
+        self.max_choices = max_choices
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-lookup-url'] = reverse('lookup', args=[self.kind])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        if len(choices) > self.max_choices:
+            selected = {str(item) for item in value}
+            self.choices = [choice for choice in choices if choice[0] == '' or str(choice[0]) in selected]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
+
+
 class ProjectForm(forms.ModelForm):
+    # Файл, загруженный по частям (см. uploads.py), вместо обычного поля project_file
+    upload_id = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Project
         fields = ['title', 'description', 'subject', 'teacher', 'year', 'keywords', 'project_file']
@@ -92,6 +125,8 @@ class ProjectForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'python, django, базы данных'
             }),
+            'subject': LookupSelect('subject'),
+            'teacher': LookupSelect('teacher'),
             'year': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'min': 2000,
@@ -100,12 +135,45 @@ class ProjectForm(forms.ModelForm):
             }),
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['subject'].widget.attrs['class'] = 'form-select'
-        self.fields['teacher'].widget.attrs['class'] = 'form-select'
+        self.user = user
+        self.upload = None
+        # Варианты из снимка справочников (reference.py), без запросов при показе формы
+        for name, choices in (('subject', reference.subject_choices()), ('teacher', reference.teacher_choices())):
+            field = self.fields[name]
+            field.choices = ([('', field.empty_label)] if field.empty_label is not None else []) + choices
+            field.widget.attrs['class'] = 'form-select'
         self.fields['project_file'].widget.attrs['class'] = 'form-control'
 
+    def clean(self):
+        cleaned_data = super().clean()
+        upload_id = cleaned_data.get('upload_id')
+        if upload_id:
+            session = UploadSession.objects.filter(pk=upload_id, user=self.user).first()
+            if session is None or not session.is_complete:
+                self.add_error('project_file', 'Загрузка файла не завершена, выберите файл еще раз.')
+            elif not self.errors:
+                # Файл открывается, только если остальные поля прошли проверку
+                self.upload = session
+                cleaned_data['project_file'] = uploads.completed_file(session)
+        return cleaned_data
+
+    def _post_clean(self):
+        super()._post_clean()
+        # Проверка модели может найти ошибки и после clean(): тогда файл закрывается,
+        # а сессия загрузки остается для повторной отправки формы
+        if self.upload is not None and self.errors:
+            self.cleaned_data['project_file'].close()
+            self.upload = None
+
+    def release_upload(self):
+        """Вызывается после сохранения проекта: сессия загрузки больше не нужна"""
+        if self.upload is not None:
+            self.cleaned_data['project_file'].close()
+            uploads.discard(self.upload)
+            self.upload = None
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
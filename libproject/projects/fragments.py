@@ -0,0 +1,170 @@
+# projects/fragments.py
+"""Кэш HTML-фрагментов: карточки проектов и главная страница для анонимных посетителей.
+
+Ключ карточки содержит id проекта, updated_at, число просмотров и номер поколения
+каталога. Поколение увеличивается при публикации, редактировании и модерации, поэтому
+старые фрагменты просто перестают запрашиваться. Сброс счетчиков просмотров меняет
+только ключи карточек с новыми просмотрами и отдельное поколение счетчиков, от которого
+зависят страницы целиком (главная, ETag каталога).
+
+Попадания и промахи копятся в памяти процесса и сохраняются в FragmentCacheStat
+вместе со счетчиками просмотров (buffers.py), команда fragment_cache_stats читает их из БД.
+"""
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.template.loader import render_to_string
+
+from . import buffers
+from .versions import bump_version, get_version
+
+CATALOG_VERSION = 'catalog'
+COUNTERS_VERSION = 'counters'
+# Ключи карточек меняются вместе с просмотрами, поэтому старые не должны жить долго
+CARD_TIMEOUT = 60 * 60
+PAGE_TIMEOUT = 60 * 10
+# Место в карточке каталога для фрагмента текста файла (см. search.attach_snippets)
+SNIPPET_MARKER = '<!--search-snippet-->'
+
+CARD_TEMPLATES = {
+    'catalog': 'projects/includes/project_card.html',
+    'moderation': 'projects/includes/project_card_moderation.html',
+}
+
+METRIC_NAMES = ('card', 'page')
+
+_metrics_lock = threading.Lock()
+# (имя, 'hit' или 'miss') -> еще не сохраненное число
+_metrics = Counter()
+
+
+def catalog_generation():
+    return get_version(CATALOG_VERSION)
+
+
+def bump_catalog_generation():
+    bump_version(CATALOG_VERSION)
+
+
+def catalog_state():
+    """Поколения каталога и счетчиков: от них зависят страницы со списками проектов"""
+    return catalog_generation(), get_version(COUNTERS_VERSION)
+
+
+def bump_counters_generation():
+    bump_version(COUNTERS_VERSION)
+
+
+def _record(name, hits, misses):
+    with _metrics_lock:
+        _metrics[name, 'hit'] += hits
+        _metrics[name, 'miss'] += misses
+    buffers.ensure_started()
+
+
+@buffers.register
+def flush_metrics():
+    """Переносит накопленные попадания и промахи в FragmentCacheStat"""
+    from .models import FragmentCacheStat
+
+    with _metrics_lock:
+        taken = dict(_metrics)
+        _metrics.clear()
+    names = {name for (name, _), value in taken.items() if value}
+    if not names:
+        return
+    try:
+        FragmentCacheStat.objects.bulk_create(
+            [FragmentCacheStat(name=name) for name in names], ignore_conflicts=True
+        )
+        for name in names:
+            FragmentCacheStat.objects.filter(name=name).update(
+                hits=F('hits') + taken.get((name, 'hit'), 0),
+                misses=F('misses') + taken.get((name, 'miss'), 0),
+            )
+    except Exception:
+        with _metrics_lock:
+            _metrics.update(taken)
+        raise
+
+
+def metrics():
+    """Попадания и промахи кэша фрагментов: {имя: (попадания, промахи, доля попаданий)}"""
+    from .models import FragmentCacheStat
+
+    stored = {stat.name: (stat.hits, stat.misses) for stat in FragmentCacheStat.objects.all()}
+    with _metrics_lock:
+        local = dict(_metrics)
+    result = {}
+    for name in METRIC_NAMES:
+        hits, misses = stored.get(name, (0, 0))
+        hits += local.get((name, 'hit'), 0)
+        misses += local.get((name, 'miss'), 0)
+        total = hits + misses
+        result[name] = (hits, misses, hits / total if total else 0.0)
+    return result
+
+
+def reset_metrics():
+    from .models import FragmentCacheStat
+
+    with _metrics_lock:
+        _metrics.clear()
+    FragmentCacheStat.objects.all().delete()
+
+
+def _card_key(variant, project, generation):
+    return f'fragment:card:{variant}:{project.pk}:{project.updated_at.timestamp()}:{project.views}:{generation}'
+
+
+def _with_snippet(html, project):
+    """Фрагмент текста файла зависит от запроса, поэтому вставляется в готовую карточку"""
+    snippet = getattr(project, 'search_snippet', '')
+    if not snippet:
+        return html
+    return html.replace(SNIPPET_MARKER, f'<p class="card-text small text-muted">{snippet}</p>', 1)
+
+
+def render_cards(projects, variant='catalog', generation=None, request=None):
+    """Возвращает HTML карточек: готовые берутся из кэша одним get_many, остальные рендерятся"""
+    projects = list(projects)
+    if not projects:
+        return ''
+    if generation is None:
+        generation = catalog_generation()
+    keys = [_card_key(variant, project, generation) for project in projects]
+    cached = cache.get_many(keys)
+
+    missing = [project for project, key in zip(projects, keys) if key not in cached]
+    if missing:
+        from .models import Pupil
+
+        # Авторы нужны только для карточек, которых нет в кэше
+        unfetched = [project for project in missing if 'pupils' not in getattr(project, '_prefetched_objects_cache', {})]
+        prefetch_related_objects(unfetched, Prefetch('pupils', queryset=Pupil.objects.select_related('user')))
+        rendered = {}
+        for project in missing:
+            key = _card_key(variant, project, generation)
+            rendered[key] = render_to_string(CARD_TEMPLATES[variant], {'project': project}, request=request)
+        cache.set_many(rendered, CARD_TIMEOUT)
+        cached.update(rendered)
+
+    _record('card', hits=len(projects) - len(missing), misses=len(missing))
+    return ''.join(_with_snippet(cached[key], project) for project, key in zip(projects, keys))
+
+
+def cached_page(name, build, generation=None):
+    """Готовый HTML страницы из кэша или результат build() (который кэшируется)"""
+    if generation is None:
+        generation = catalog_state()
+    key = f'fragment:page:{name}:{generation[0]}:{generation[1]}'
+    content = cache.get(key)
+    if content is not None:
+        _record('page', hits=1, misses=0)
+        return content
+    content = build()
+    cache.set(key, content, PAGE_TIMEOUT)
+    _record('page', hits=0, misses=1)
+    return content
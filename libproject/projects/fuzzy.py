@@ -0,0 +1,166 @@
+# projects/fuzzy.py
+"""Поиск с опечатками по триграммам: словарь слов из названий и ключевых слов проектов.
+
+Индекс хранится в памяти процесса рядом с индексом автодополнения и обновляется вместе
+с ним (autocomplete.py). Для каждой триграммы хранится список слов, в которых она есть:
+похожие слова находятся подсчетом общих триграмм (Counter.update по спискам), без
+перебора словаря. Сходство — как в pg_trgm: общие / (все триграммы обоих слов).
+Индекс не зависит от базы данных и одинаково работает с SQLite и PostgreSQL.
+"""
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+WORD_RE = re.compile(r'\w+')
+MIN_WORD_LENGTH = 3
+# Порог сходства pg_trgm по умолчанию
+SIMILARITY_THRESHOLD = 0.3
+MAX_CANDIDATES = 5
+
+
+def normalize_word(word):
+    return word.lower().replace('ё', 'е')
+
+
+def words(text):
+    """Слова текста для словаря: без чисел и коротких слов"""
+    return [
+        normalize_word(word) for word in WORD_RE.findall(text or '')
+        if len(word) >= MIN_WORD_LENGTH and not word.isdigit()
+    ]
+
+
+def trigrams(word):
+    """Триграммы слова с пробелами по краям, как в pg_trgm: «кот» -> «  к», « ко», «кот», «от »"""
+    padded = f'  {word} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Словарь слов с обратным индексом триграмм и списками проектов для каждого слова"""
+
+    def __init__(self):
+        self._words = []
+        self._word_ids = {}
+        self._sizes = []
+        self._trigrams = defaultdict(list)
+        self._projects_by_word = []
+        self._words_by_project = {}
+        self._projects = {}
+        self._lock = threading.Lock()
+        self.version = None
+        self.build_time = 0.0
+
+    def build(self, rows, version=None):
+        """Строит индекс заново по строкам (id, title, year, keywords)"""
+        started = time.perf_counter()
+        fresh = TrigramIndex()
+        for pk, title, year, keywords in rows:
+            fresh._add(pk, title, year, keywords)
+        with self._lock:
+            for name in ('_words', '_word_ids', '_sizes', '_trigrams', '_projects_by_word',
+                         '_words_by_project', '_projects'):
+                setattr(self, name, getattr(fresh, name))
+            self.version = version
+            self.build_time = time.perf_counter() - started
+
+    def add(self, pk, title, year, keywords):
+        with self._lock:
+            self._remove(pk)
+            self._add(pk, title, year, keywords)
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def _word_id(self, word):
+        word_id = self._word_ids.get(word)
+        if word_id is None:
+            word_id = self._word_ids[word] = len(self._words)
+            self._words.append(word)
+            grams = trigrams(word)
+            self._sizes.append(len(grams))
+            self._projects_by_word.append(set())
+            for gram in grams:
+                self._trigrams[gram].append(word_id)
+        return word_id
+
+    def _add(self, pk, title, year, keywords):
+        word_ids = {self._word_id(word) for word in words(title) + words(keywords)}
+        for word_id in word_ids:
+            self._projects_by_word[word_id].add(pk)
+        self._words_by_project[pk] = word_ids
+        self._projects[pk] = (title, year)
+
+    def _remove(self, pk):
+        # Слова без проектов остаются в словаре до перестройки, но не предлагаются
+        for word_id in self._words_by_project.pop(pk, ()):
+            self._projects_by_word[word_id].discard(pk)
+        self._projects.pop(pk, None)
+
+    def similar_words(self, word, limit=MAX_CANDIDATES, threshold=SIMILARITY_THRESHOLD):
+        """[(слово, сходство, число проектов)] — самые похожие слова словаря"""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigrams.get(gram, ()))
+        scored = []
+        for word_id, count in shared.items():
+            score = count / (len(grams) + self._sizes[word_id] - count)
+            projects = len(self._projects_by_word[word_id])
+            if score >= threshold and projects:
+                scored.append((score, projects, self._words[word_id]))
+        scored.sort(reverse=True)
+        return [(found, score, projects) for score, projects, found in scored[:limit]]
+
+    def suggest(self, query):
+        """Запрос с исправленными словами («Возможно, вы имели в виду») или None.
+
+        Слово, которое есть в словаре, не меняется; иначе берется самое похожее,
+        при равном сходстве — встречающееся в большем числе проектов.
+        """
+        corrected, changed = [], False
+        for word in WORD_RE.findall(query or ''):
+            normalized = normalize_word(word)
+            word_id = self._word_ids.get(normalized)
+            if len(word) < MIN_WORD_LENGTH or word.isdigit() or (
+                    word_id is not None and self._projects_by_word[word_id]):
+                corrected.append(word)
+                continue
+            candidates = self.similar_words(normalized, limit=1)
+            if candidates:
+                corrected.append(candidates[0][0])
+                changed = True
+            else:
+                corrected.append(word)
+        return ' '.join(corrected) if changed else None
+
+    def search(self, query, limit=5):
+        """[(id, title, year)] проектов, похожих на запрос по каждому слову, лучшие первыми"""
+        query_words = words(query)
+        if not query_words:
+            return []
+        scores = None
+        for word in query_words:
+            best = {}
+            for found, score, _ in self.similar_words(word):
+                for pk in self._projects_by_word[self._word_ids[found]]:
+                    best[pk] = max(best.get(pk, 0), score)
+            # Проект должен быть похож на все слова запроса
+            scores = best if scores is None else {
+                pk: scores[pk] + score for pk, score in best.items() if pk in scores
+            }
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self._projects[item[0]][0].lower()))
+        return [(pk, *self._projects[pk]) for pk, _ in ranked[:limit]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'words': len(self._words),
+                'trigrams': len(self._trigrams),
+                'projects': len(self._projects),
+                'build_time_ms': round(self.build_time * 1000, 2),
+                'version': self.version,
+            }
+
@@ -0,0 +1,144 @@
+# projects/jobs.py
+"""Очередь заданий обработки файлов в БД.
+
+Задания создаются после сохранения файла проекта и выполняются командой run_worker:
+сначала проверка целостности, затем — в зависимости от типа файла — список файлов
+архива, извлечение текста и превью. Неудачные задания повторяются с растущей паузой.
+"""
+import datetime
+import os
+import traceback
+import zlib
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import archives, processing, search
+from .catalog import invalidate_facets
+from .fragments import bump_catalog_generation
+from .models import ArchiveManifest, ExtractedText, Job, StoredBlob
+from .storage import project_storage
+
+
+def enqueue(blob, stage='integrity'):
+    """Ставит этап в очередь; уже существующее задание не дублируется"""
+    try:
+        with transaction.atomic():
+            return Job.objects.get_or_create(blob=blob, stage=stage)[0]
+    except IntegrityError:
+        return Job.objects.get(blob=blob, stage=stage)
+
+
+def enqueue_file(name):
+    blob = StoredBlob.objects.filter(name=name).first()
+    if blob is not None:
+        enqueue(blob)
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых к запуску заданий; одно задание достается одному воркеру"""
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(status='queued', run_after__lte=now)
+        .order_by('run_after', 'pk')
+        .values_list('pk', flat=True)[:limit * 2]
+    )
+    claimed = []
+    for pk in candidates:
+        taken = Job.objects.filter(pk=pk, status='queued').update(
+            status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1
+        )
+        if taken:
+            claimed.append(pk)
+            if len(claimed) == limit:
+                break
+    return list(Job.objects.filter(pk__in=claimed).select_related('blob'))
+
+
+def requeue_stale():
+    """Возвращает в очередь задания воркеров, которые упали, не закончив работу"""
+    cutoff = timezone.now() - datetime.timedelta(seconds=settings.PROJECT_JOBS_LOCK_TIMEOUT)
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(status='queued', locked_by='')
+
+
+def preview_name(blob):
+    return f'projects/previews/{blob.sha256[:2]}/{blob.sha256}.png'
+
+
+def arguments(job):
+    """Аргументы этапа для processing.run_stage: все, что нужно, без обращений к БД"""
+    blob = job.blob
+    return {
+        'path': project_storage.path(blob.name),
+        'sha256': blob.sha256,
+        'size': blob.size,
+        'extension': os.path.splitext(blob.name)[1],
+        'kind': blob.kind,
+        'max_chars': settings.PROJECT_EXTRACT_MAX_CHARS,
+        'preview_path': default_storage.path(preview_name(blob)),
+    }
+
+
+def complete(job, result):
+    blob = job.blob
+    # Текст и оглавление хранятся в своих таблицах, в результате задания — только их размер
+    text, stems = result.pop('text', None), result.pop('stems', None)
+    manifest = result.pop('manifest', None)
+    with transaction.atomic():
+        Job.objects.filter(pk=job.pk).update(status='done', result=result, error='', locked_by='')
+        if job.stage == 'integrity':
+            StoredBlob.objects.filter(pk=blob.pk).update(kind=result['kind'])
+            for stage in processing.next_stages(result['kind']):
+                enqueue(blob, stage)
+        elif job.stage == 'listing' and manifest is not None:
+            ArchiveManifest.objects.update_or_create(blob=blob, defaults={
+                'content': manifest,
+                'entries': result['entries'],
+                'uncompressed': result['uncompressed'],
+            })
+            transaction.on_commit(lambda: archives.forget(blob))
+            transaction.on_commit(bump_catalog_generation)
+        elif job.stage == 'extract' and text is not None:
+            ExtractedText.objects.update_or_create(blob=blob, defaults={
+                'content': text,
+                'characters': result['characters'],
+                'truncated': result['truncated'],
+            })
+            search.index_content(blob.pk, zlib.decompress(stems).decode())
+            # Проекты с этим файлом теперь находятся по его тексту
+            transaction.on_commit(invalidate_facets)
+            transaction.on_commit(bump_catalog_generation)
+        elif job.stage == 'preview' and result.get('preview'):
+            StoredBlob.objects.filter(pk=blob.pk).update(preview=preview_name(blob))
+            # Превью показывается на странице проекта
+            transaction.on_commit(bump_catalog_generation)
+
+
+def fail(job, error, permanent=False):
+    """Ошибка этапа: повтор через PROJECT_JOBS_RETRY_DELAY * 2^(попытка - 1) секунд"""
+    message = ''.join(traceback.format_exception_only(type(error), error)).strip()
+    if permanent or job.attempts >= settings.PROJECT_JOBS_MAX_ATTEMPTS:
+        Job.objects.filter(pk=job.pk).update(status='failed', error=message, locked_by='')
+        return
+    delay = settings.PROJECT_JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+    Job.objects.filter(pk=job.pk).update(
+        status='queued',
+        error=message,
+        locked_by='',
+        run_after=timezone.now() + datetime.timedelta(seconds=delay),
+    )
+
+
+def run_now(job):
+    """Выполняет задание в текущем процессе (для отладки и тестов)"""
+    try:
+        result = processing.run_stage(job.stage, **arguments(job))
+    except processing.PermanentError as error:
+        fail(job, error, permanent=True)
+    except Exception as error:
+        fail(job, error)
+    else:
+        complete(job, result)
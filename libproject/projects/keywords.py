@@ -0,0 +1,75 @@
+# projects/keywords.py
+"""Ключевые слова проектов как теги.
+
+Пользователь по-прежнему вводит ключевые слова строкой через запятую (Project.keywords),
+при сохранении строка разбирается в записи Keyword (Project.tags). По тегам работает
+точный фильтр каталога (?tag=...) и облако тегов; у тега хранится число опубликованных
+проектов (published_counts.py).
+"""
+import math
+import re
+
+from django.core.cache import cache
+
+from .versions import bump_version, get_version
+
+SEPARATOR_RE = re.compile(r'[,;\n]')
+MAX_LENGTH = 100
+
+CLOUD_VERSION = 'tag-cloud'
+CLOUD_TIMEOUT = 60 * 60
+CLOUD_SIZE = 30
+CLOUD_LEVELS = 5
+
+
+def normalize(name):
+    """Строчные буквы и одиночные пробелы: «Машинное  Обучение» и «машинное обучение» — один тег"""
+    return ' '.join((name or '').lower().split())[:MAX_LENGTH]
+
+
+def parse_keywords(text):
+    """Теги из строки через запятую (или точку с запятой) без повторов, в исходном порядке"""
+    names = []
+    for part in SEPARATOR_RE.split(text or ''):
+        name = normalize(part)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def sync_project(project):
+    """Приводит теги проекта к его строке keywords; возвращает id добавленных и убранных тегов"""
+    from .models import Keyword
+
+    names = parse_keywords(project.keywords)
+    Keyword.objects.bulk_create([Keyword(name=name) for name in names], ignore_conflicts=True)
+    new_ids = set(Keyword.objects.filter(name__in=names).values_list('pk', flat=True))
+    old_ids = set(project.tags.values_list('pk', flat=True))
+    if new_ids != old_ids:
+        project.tags.set(new_ids)
+    return old_ids ^ new_ids
+
+
+def tag_cloud(limit=CLOUD_SIZE):
+    """Популярные теги: [(название, число проектов, уровень 1..CLOUD_LEVELS)] по алфавиту"""
+    from .models import Keyword
+
+    key = f'keywords:cloud:{get_version(CLOUD_VERSION)}:{limit}'
+    cloud = cache.get(key)
+    if cloud is None:
+        rows = list(
+            Keyword.objects.filter(published_count__gt=0)
+            .order_by('-published_count', 'name')
+            .values_list('name', 'published_count')[:limit]
+        )
+        top = max((count for _, count in rows), default=1)
+        cloud = sorted(
+            (name, count, 1 + round((CLOUD_LEVELS - 1) * math.log(count) / math.log(top)) if top > 1 else 1)
+            for name, count in rows
+        )
+        cache.set(key, cloud, CLOUD_TIMEOUT)
+    return cloud
+
+
+def invalidate_cloud():
+    bump_version(CLOUD_VERSION)
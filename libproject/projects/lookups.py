@@ -0,0 +1,78 @@
+# projects/lookups.py
+"""Поиск вариантов для полей с автодополнением (предмет, руководитель, ученик).
+
+Предметы и руководители ищутся в снимке справочников (reference.py) без запросов к БД,
+ученики — запросом с LIMIT по началу фамилии, имени или логина. Ответ в формате
+Select2: {"results": [{"id", "text"}], "pagination": {"more"}}, его же понимает
+виджет LookupSelect (forms.py).
+"""
+from django.db.models import Q
+
+from .reference import get_snapshot
+
+PAGE_SIZE = 20
+
+
+def _normalize(text):
+    return ' '.join((text or '').lower().replace('ё', 'е').split())
+
+
+def _page(items, page):
+    start = (page - 1) * PAGE_SIZE
+    return items[start:start + PAGE_SIZE], len(items) > start + PAGE_SIZE
+
+
+def subjects(term, page=1):
+    term = _normalize(term)
+    return _page([
+        (subject.id, subject.name) for subject in get_snapshot().subjects
+        if term in _normalize(subject.name) or term in _normalize(subject.code)
+    ], page)
+
+
+def teachers(term, page=1):
+    term = _normalize(term)
+    return _page([
+        (teacher.id, teacher.name) for teacher in get_snapshot().teachers
+        if term in _normalize(teacher.name)
+    ], page)
+
+
+def pupils(term, page=1):
+    from .models import Pupil
+
+    rows = Pupil.objects.order_by('user__last_name', 'user__first_name', 'pk')
+    term = ' '.join((term or '').split())
+    if term:
+        rows = rows.filter(
+            Q(user__last_name__istartswith=term)
+            | Q(user__first_name__istartswith=term)
+            | Q(user__username__istartswith=term)
+        )
+    start = (page - 1) * PAGE_SIZE
+    rows = list(rows.values_list('pk', 'user__first_name', 'user__last_name', 'user__username')
+                [start:start + PAGE_SIZE + 1])
+    items = [
+        (pk, f'{first_name} {last_name}'.strip() or username)
+        for pk, first_name, last_name, username in rows[:PAGE_SIZE]
+    ]
+    return items, len(rows) > PAGE_SIZE
+
+
+SOURCES = {
+    'subject': subjects,
+    'teacher': teachers,
+    'pupil': pupils,
+}
+
+
+def lookup(kind, term, page=1):
+    """Ответ для виджета или None, если такого справочника нет"""
+    source = SOURCES.get(kind)
+    if source is None:
+        return None
+    items, more = source(term, page)
+    return {
+        'results': [{'id': pk, 'text': text} for pk, text in items],
+        'pagination': {'more': more},
+    }
@@ -0,0 +1,20 @@
+# projects/management/commands/autocomplete_stats.py
+from django.core.management.base import BaseCommand
+
+from projects import autocomplete
+
+
+class Command(BaseCommand):
+    help = 'Строит индексы автодополнения и поиска с опечатками, выводит их размер и время построения'
+
+    def handle(self, *args, **options):
+        stats = autocomplete.get_index().stats()
+        self.stdout.write(f"Проектов: {stats['projects']}")
+        self.stdout.write(f"Ключей: {stats['entries']}")
+        self.stdout.write(f"Память: {stats['memory_bytes'] / 1024:.1f} КБ")
+        self.stdout.write(f"Время построения: {stats['build_time_ms']} мс")
+
+        fuzzy = autocomplete.get_fuzzy_index().stats()
+        self.stdout.write(f"Слов в словаре опечаток: {fuzzy['words']}")
+        self.stdout.write(f"Триграмм: {fuzzy['trigrams']}")
+        self.stdout.write(f"Время построения словаря: {fuzzy['build_time_ms']} мс")
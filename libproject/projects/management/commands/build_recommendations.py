@@ -0,0 +1,12 @@
+# projects/management/commands/build_recommendations.py
+from django.core.management.base import BaseCommand
+
+from projects import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие проекты для всех опубликованных проектов'
+
+    def handle(self, *args, **options):
+        total = recommendations.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано проектов: {total}'))
@@ -0,0 +1,16 @@
+# projects/management/commands/clear_stale_uploads.py
+from django.core.management.base import BaseCommand
+
+from projects import uploads
+
+
+class Command(BaseCommand):
+    help = 'Удаляет незавершенные загрузки файлов по частям и их временные файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None,
+                            help='Возраст брошенной загрузки в секундах (по умолчанию PROJECT_UPLOAD_SESSION_TTL)')
+
+    def handle(self, *args, **options):
+        removed = uploads.clear_stale(options['max_age'])
+        self.stdout.write(f"Удалено загрузок: {removed}")
@@ -0,0 +1,22 @@
+# projects/management/commands/collect_blobs.py
+from django.core.management.base import BaseCommand
+
+from projects import storage
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из хранилища файлы проектов, на которые не ссылается ни один проект'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=3600,
+                            help='Не трогать файлы, сохраненные менее N секунд назад')
+        parser.add_argument('--recount', action='store_true',
+                            help='Сначала пересчитать ссылки по таблице проектов')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.stdout.write(f"Пересчитано записей: {storage.recount()}")
+        removed, freed = storage.collect_garbage(grace=options['grace'], dry_run=options['dry_run'])
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(f"{verb} файлов: {removed}, освобождено {freed / 1024 / 1024:.1f} МБ")
@@ -0,0 +1,36 @@
+# projects/management/commands/enqueue_file_jobs.py
+from django.core.management.base import BaseCommand
+
+from projects import jobs, storage
+from projects.models import Job, Project, StoredBlob
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь обработку файлов всех проектов; старые файлы переносит в хранилище по содержимому'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-skipped', action='store_true',
+            help='Повторить этапы, пропущенные из-за отсутствия библиотеки (после ее установки)'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_skipped']:
+            retried = Job.objects.filter(status='done', result__has_key='skipped').update(
+                status='queued', attempts=0, result={}
+            )
+            self.stdout.write(f"Повторно поставлено в очередь: {retried}")
+        adopted = 0
+        known = set(StoredBlob.objects.values_list('name', flat=True))
+        projects = Project.objects.exclude(project_file='').exclude(project_file__isnull=True)
+        for project in projects.iterator():
+            name = project.project_file.name
+            if name not in known:
+                if not project.project_file.storage.exists(name):
+                    self.stderr.write(f"Файл проекта {project.pk} не найден: {name}")
+                    continue
+                name = storage.adopt(project)
+                known.add(name)
+                adopted += 1
+            jobs.enqueue_file(name)
+        self.stdout.write(f"Перенесено файлов: {adopted}")
@@ -0,0 +1,18 @@
+# projects/management/commands/fragment_cache_stats.py
+from django.core.management.base import BaseCommand
+
+from projects import fragments
+
+
+class Command(BaseCommand):
+    help = 'Выводит долю попаданий в кэш карточек проектов и главной страницы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счетчики после вывода')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Поколение каталога: {fragments.catalog_generation()}")
+        for name, (hits, misses, ratio) in fragments.metrics().items():
+            self.stdout.write(f"{name}: попаданий {hits}, промахов {misses}, доля попаданий {ratio:.1%}")
+        if options['reset']:
+            fragments.reset_metrics()
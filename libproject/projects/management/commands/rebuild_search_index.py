@@ -0,0 +1,16 @@
+# projects/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from projects import search
+from projects.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс опубликованных проектов'
+
+    def handle(self, *args, **options):
+        if not search.uses_fts():
+            self.stdout.write('Индекс поддерживается базой данных, перестраивать нечего.')
+            return
+        total = search.rebuild_index(Project.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано проектов: {total}'))
@@ -0,0 +1,14 @@
+# projects/management/commands/recount_published_projects.py
+from django.core.management.base import BaseCommand
+
+from projects import published_counts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает число опубликованных проектов у предметов, преподавателей и учеников'
+
+    def handle(self, *args, **options):
+        updated = published_counts.refresh_all()
+        for name, count in updated.items():
+            self.stdout.write(f'{name}: обновлено {count}')
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
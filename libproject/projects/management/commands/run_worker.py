@@ -0,0 +1,97 @@
+# projects/management/commands/run_worker.py
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from projects import jobs, processing, recommendations
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задания обработки загруженных файлов в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.PROJECT_WORKER_PROCESSES,
+                            help='Число процессов обработки')
+        parser.add_argument('--poll', type=float, default=2.0,
+                            help='Пауза между проверками очереди, секунд')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задания и завершиться')
+
+    def handle(self, *args, **options):
+        self.processes = options['processes']
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        previous_handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+
+        # spawn: дочерние процессы не наследуют соединения с БД; этапы обработки к БД не обращаются
+        context = multiprocessing.get_context('spawn')
+        pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+        in_flight = {}
+        done_count = 0
+        last_requeue = 0
+        try:
+            while True:
+                if time.monotonic() - last_requeue > 60:
+                    jobs.requeue_stale()
+                    last_requeue = time.monotonic()
+
+                # Рекомендации пересчитываются в этом процессе: им нужна БД, а не пул
+                try:
+                    recommendations.process_pending()
+                except Exception:
+                    logger.warning('Не удалось пересчитать рекомендации', exc_info=True)
+
+                # Берем заданий не больше, чем свободных процессов: остальные ждут в очереди
+                free = self.processes - len(in_flight)
+                if free and not self.stopping:
+                    for job in jobs.claim(self.worker, free):
+                        future = pool.submit(processing.run_stage, job.stage, **jobs.arguments(job))
+                        in_flight[future] = job
+
+                if not in_flight:
+                    if self.stopping or options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+
+                finished, _ = wait(in_flight, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except processing.PermanentError as error:
+                        jobs.fail(job, error, permanent=True)
+                    except BrokenProcessPool as error:
+                        # Процесс обработки упал (например, не хватило памяти): пул пересоздается
+                        jobs.fail(job, error)
+                        for other in in_flight.values():
+                            jobs.fail(other, error)
+                        in_flight.clear()
+                        pool.shutdown(wait=False)
+                        pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+                        break
+                    except Exception as error:
+                        logger.warning('Этап %s для %s завершился ошибкой', job.stage, job.blob, exc_info=True)
+                        jobs.fail(job, error)
+                    else:
+                        jobs.complete(job, result)
+                        done_count += 1
+        finally:
+            pool.shutdown(wait=True)
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+        self.stdout.write(f"Выполнено заданий: {done_count}")
+
+    def stop(self, signum, frame):
+        """Новые задания не берутся, начатые доделываются"""
+        self.stopping = True
@@ -0,0 +1,193 @@
+import re
+
+from django.db import migrations
+
+# Копия DDL из search.py и стеммера из stemmer.py на момент миграции
+FTS_TABLE = 'projects_project_fts'
+WORD_RE = re.compile(r'\w+')
+PG_DOCUMENT = (
+    "(setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(keywords, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'C'))"
+)
+BATCH_SIZE = 500
+
+
+def _longest_first(*endings):
+    return tuple(sorted(endings, key=len, reverse=True))
+
+
+VOWELS = 'аеиоуыэюя'
+CYRILLIC_WORD = re.compile(r'^[а-я]+$')
+
+PERFECTIVE_GERUND_1 = _longest_first('в', 'вши', 'вшись')
+PERFECTIVE_GERUND_2 = _longest_first('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись')
+ADJECTIVE = _longest_first(
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE_1 = _longest_first('ем', 'нн', 'вш', 'ющ', 'щ')
+PARTICIPLE_2 = _longest_first('ивш', 'ывш', 'ующ')
+REFLEXIVE = _longest_first('ся', 'сь')
+VERB_1 = _longest_first(
+    'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны',
+    'ть', 'ешь', 'нно',
+)
+VERB_2 = _longest_first(
+    'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл',
+    'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены',
+    'ить', 'ыть', 'ишь', 'ую', 'ю',
+)
+NOUN = _longest_first(
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией',
+    'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах',
+    'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)
+SUPERLATIVE = _longest_first('ейш', 'ейше')
+DERIVATIONAL = _longest_first('ост', 'ость')
+
+
+def _regions(word):
+    """Возвращает начала областей RV и R2"""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start):
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def _remove(word, rv, endings):
+    """Удаляет самое длинное окончание из endings, лежащее в RV"""
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= rv:
+            return word[:-len(ending)], True
+    return word, False
+
+
+def _remove_grouped(word, rv, group_1, group_2):
+    """Окончания группы 1 удаляются только после «а» или «я»"""
+    candidates = []
+    for ending in group_1:
+        if word.endswith(ending):
+            start = len(word) - len(ending)
+            if start - 1 >= rv and word[start - 1] in 'ая':
+                candidates.append(ending)
+    for ending in group_2:
+        if word.endswith(ending) and len(word) - len(ending) >= rv:
+            candidates.append(ending)
+    if not candidates:
+        return word, False
+    longest = max(candidates, key=len)
+    return word[:-len(longest)], True
+
+
+def stem(word):
+    """Возвращает основу русского слова; прочие слова возвращаются как есть"""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_WORD.match(word):
+        return word
+
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    # Шаг 1
+    word, removed = _remove_grouped(word, rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2)
+    if not removed:
+        word, _ = _remove(word, rv, REFLEXIVE)
+        word, removed = _remove(word, rv, ADJECTIVE)
+        if removed:
+            word, _ = _remove_grouped(word, rv, PARTICIPLE_1, PARTICIPLE_2)
+        else:
+            word, removed = _remove_grouped(word, rv, VERB_1, VERB_2)
+            if not removed:
+                word, _ = _remove(word, rv, NOUN)
+
+    # Шаг 2
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3
+    for ending in DERIVATIONAL:
+        if word.endswith(ending) and len(word) - len(ending) >= r2:
+            word = word[:-len(ending)]
+            break
+
+    # Шаг 4
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    else:
+        stripped, removed = _remove(word, rv, SUPERLATIVE)
+        if removed:
+            word = stripped
+            if word.endswith('нн') and len(word) - 2 >= rv:
+                word = word[:-1]
+        elif word.endswith('ь') and len(word) - 1 >= rv:
+            word = word[:-1]
+
+    return word
+
+
+def tokens(text):
+    return ' '.join(stem(word) for word in WORD_RE.findall(text or ''))
+
+
+def create_search_index(apps, schema_editor):
+    """Создает индекс и заполняет его опубликованными проектами, пачками по BATCH_SIZE"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS projects_project_search_idx ON projects_project USING GIN ({PG_DOCUMENT})"
+        )
+    if vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(title, description, keywords, tokenize='unicode61 remove_diacritics 2')"
+    )
+    Project = apps.get_model('projects', 'Project')
+    rows = (
+        Project.objects.using(schema_editor.connection.alias)
+        .filter(status='published')
+        .order_by('pk')
+        .values_list('pk', 'title', 'description', 'keywords')
+    )
+    sql = f'INSERT INTO {FTS_TABLE} (rowid, title, description, keywords) VALUES (%s, %s, %s, %s)'
+    batch = []
+    with schema_editor.connection.cursor() as cursor:
+        for pk, title, description, keywords in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append((pk, tokens(title), tokens(description), tokens(keywords)))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS projects_project_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_project_moderated_at_project_moderated_by_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_published_counts(apps, schema_editor):
+    """Начальные значения счетчиков (копия логики published_counts.py на момент миграции)"""
+    using = schema_editor.connection.alias
+    Project = apps.get_model('projects', 'Project')
+    for name, relation in (('Subject', 'subject'), ('Teacher', 'teacher'), ('Pupil', 'pupils')):
+        published = (
+            Project.objects.using(using)
+            .filter(status='published', **{relation: OuterRef('pk')})
+            .order_by()
+            .values(relation)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        apps.get_model('projects', name).objects.using(using).update(
+            published_count=Coalesce(Subquery(published), Value(0))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_project_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pupil',
+            name='published_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Опубликованных проектов'),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='published_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Опубликованных проектов'),
+        ),
+        migrations.AddField(
+            model_name='teacher',
+            name='published_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Опубликованных проектов'),
+        ),
+        migrations.RunPython(fill_published_counts, migrations.RunPython.noop),
+    ]
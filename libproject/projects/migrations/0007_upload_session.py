@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:17
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_published_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('size', models.BigIntegerField(verbose_name='Размер')),
+                ('received', models.BigIntegerField(default=0, verbose_name='Получено байт')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Начата')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Последняя часть')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка файла',
+                'verbose_name_plural': 'Загрузки файлов',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:19
+
+import django.core.validators
+import projects.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Путь в хранилище')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(verbose_name='Размер')),
+                ('ref_count', models.IntegerField(default=0, verbose_name='Ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('last_seen_at', models.DateTimeField(auto_now=True, verbose_name='Последнее сохранение')),
+            ],
+            options={
+                'verbose_name': 'Файл в хранилище',
+                'verbose_name_plural': 'Файлы в хранилище',
+            },
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='original_filename',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Исходное имя файла'),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='project_file',
+            field=models.FileField(blank=True, null=True, storage=projects.storage.get_project_storage, upload_to='projects/blobs/', validators=[django.core.validators.FileExtensionValidator(['pdf', 'doc', 'docx', 'zip', 'rar', '7z'])], verbose_name='Файл проекта'),
+        ),
+    ]
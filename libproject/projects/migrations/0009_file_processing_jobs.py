@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_content_addressed_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedblob',
+            name='kind',
+            field=models.CharField(blank=True, max_length=20, verbose_name='Тип содержимого'),
+        ),
+        migrations.AddField(
+            model_name='storedblob',
+            name='preview',
+            field=models.FileField(blank=True, upload_to='projects/previews/', verbose_name='Превью'),
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('integrity', 'Проверка целостности'), ('listing', 'Содержимое архива'), ('extract', 'Извлечение текста'), ('preview', 'Превью')], max_length=20, verbose_name='Этап')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='queued', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Не раньше')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Воркер')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Взято в работу')),
+                ('result', models.JSONField(blank=True, default=dict, verbose_name='Результат')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Изменено')),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='projects.storedblob', verbose_name='Файл')),
+            ],
+            options={
+                'verbose_name': 'Задание обработки',
+                'verbose_name_plural': 'Задания обработки',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='projects_jo_status_31b2a3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('blob', 'stage'), name='unique_job_stage_per_blob')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Копия DDL из search.py на момент миграции; таблицу заполняет воркер (этап extract)
+CONTENT_FTS_TABLE = 'projects_content_fts'
+
+
+def create_content_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {CONTENT_FTS_TABLE} "
+            f"USING fts5(content, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_content_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {CONTENT_FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_file_processing_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedText',
+            fields=[
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text', serialize=False, to='projects.storedblob', verbose_name='Файл')),
+                ('content', models.BinaryField(verbose_name='Текст (zlib)')),
+                ('characters', models.IntegerField(default=0, verbose_name='Символов')),
+                ('truncated', models.BooleanField(default=False, verbose_name='Обрезан')),
+                ('created_at', models.DateTimeField(auto_now=True, verbose_name='Извлечен')),
+            ],
+            options={
+                'verbose_name': 'Текст файла',
+                'verbose_name_plural': 'Тексты файлов',
+            },
+        ),
+        migrations.RunPython(create_content_index, drop_content_index),
+    ]
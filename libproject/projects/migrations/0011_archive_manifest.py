@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_extracted_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveManifest',
+            fields=[
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='manifest', serialize=False, to='projects.storedblob', verbose_name='Файл')),
+                ('content', models.BinaryField(verbose_name='Оглавление (zlib)')),
+                ('entries', models.IntegerField(default=0, verbose_name='Файлов')),
+                ('uncompressed', models.BigIntegerField(default=0, verbose_name='Объем после распаковки')),
+                ('created_at', models.DateTimeField(auto_now=True, verbose_name='Прочитано')),
+            ],
+            options={
+                'verbose_name': 'Оглавление архива',
+                'verbose_name_plural': 'Оглавления архивов',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0011_archive_manifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarProject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='projects.project', verbose_name='Проект')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.project', verbose_name='Похожий проект')),
+            ],
+            options={
+                'verbose_name': 'Похожий проект',
+                'verbose_name_plural': 'Похожие проекты',
+                'constraints': [models.UniqueConstraint(fields=('project', 'rank'), name='unique_similar_project_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:32
+
+import re
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 500
+
+# Копия разбора из keywords.py на момент миграции
+SEPARATOR_RE = re.compile(r'[,;\n]')
+MAX_LENGTH = 100
+
+
+def parse_keywords(text):
+    names = []
+    for part in SEPARATOR_RE.split(text or ''):
+        name = ' '.join(part.lower().split())[:MAX_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _link(Keyword, Through, batch, using):
+    names = {name for _, project_names in batch for name in project_names}
+    Keyword.objects.using(using).bulk_create([Keyword(name=name) for name in names], ignore_conflicts=True)
+    ids = dict(Keyword.objects.using(using).filter(name__in=names).values_list('name', 'pk'))
+    Through.objects.using(using).bulk_create(
+        [Through(project_id=pk, keyword_id=ids[name]) for pk, project_names in batch for name in project_names],
+        ignore_conflicts=True,
+    )
+
+
+def fill_keywords(apps, schema_editor):
+    """Разбирает строки ключевых слов существующих проектов в теги, пачками по BATCH_SIZE"""
+    using = schema_editor.connection.alias
+    Project = apps.get_model('projects', 'Project')
+    Keyword = apps.get_model('projects', 'Keyword')
+    Through = Project.tags.through
+
+    batch = []
+    rows = Project.objects.using(using).exclude(keywords='').order_by('pk').values_list('pk', 'keywords')
+    for pk, text in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append((pk, parse_keywords(text)))
+        if len(batch) >= BATCH_SIZE:
+            _link(Keyword, Through, batch, using)
+            batch = []
+    if batch:
+        _link(Keyword, Through, batch, using)
+
+    published = (
+        Project.objects.using(using)
+        .filter(status='published', tags=OuterRef('pk'))
+        .order_by()
+        .values('tags')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Keyword.objects.using(using).update(published_count=Coalesce(Subquery(published), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0012_similar_projects'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Keyword',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Название')),
+                ('published_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Опубликованных проектов')),
+            ],
+            options={
+                'verbose_name': 'Ключевое слово',
+                'verbose_name_plural': 'Ключевые слова',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='tags',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='projects', to='projects.keyword', verbose_name='Теги'),
+        ),
+        migrations.RunPython(fill_keywords, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0013_keywords'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRecommendation',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='projects.project', verbose_name='Проект')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Добавлен')),
+            ],
+            options={
+                'verbose_name': 'Пересчет рекомендаций',
+                'verbose_name_plural': 'Пересчет рекомендаций',
+            },
+        ),
+    ]
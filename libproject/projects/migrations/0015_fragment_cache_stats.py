@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0014_recommendation_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FragmentCacheStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20, unique=True, verbose_name='Фрагмент')),
+                ('hits', models.BigIntegerField(default=0, verbose_name='Попаданий')),
+                ('misses', models.BigIntegerField(default=0, verbose_name='Промахов')),
+            ],
+            options={
+                'verbose_name': 'Статистика кэша фрагментов',
+                'verbose_name_plural': 'Статистика кэша фрагментов',
+            },
+        ),
+    ]
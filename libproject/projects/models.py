@@ -1,8 +1,18 @@
 # projects/models.py
+import json
+import os
+import uuid
+import zlib
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import counters
+from .storage import get_project_storage
 
 
 class Subject(models.Model):
@@ -10,6 +20,11 @@ class Subject(models.Model):
     name = models.CharField(max_length=200, verbose_name="Название предмета")
     code = models.CharField(max_length=20, verbose_name="Код предмета", blank=True)
     description = models.TextField(verbose_name="Описание", blank=True)
+    published_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Опубликованных проектов"
+    )
 
     class Meta:
         verbose_name = "Предмет"
@@ -20,7 +35,7 @@ class Subject(models.Model):
         return self.name
 
     def project_count(self):
-        return self.projects.filter(status='published').count()
+        return self.published_count
 
 
 class Teacher(models.Model):
@@ -29,6 +44,11 @@ class Teacher(models.Model):
     department = models.CharField(max_length=200, verbose_name="Кафедра", blank=True)
     position = models.CharField(max_length=200, verbose_name="Должность", blank=True)
     bio = models.TextField(verbose_name="Биография", blank=True)
+    published_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Опубликованных проектов"
+    )
 
     class Meta:
         verbose_name = "Преподаватель"
@@ -38,11 +58,16 @@ class Teacher(models.Model):
         return f"{self.user.get_full_name() or self.user.username}"
 
     def project_count(self):
-        return self.supervised_projects.filter(status='published').count()
+        return self.published_count
 
 
 class Pupil(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    published_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Опубликованных проектов"
+    )
 
     class Meta:
         verbose_name = "Ученик"
@@ -52,7 +77,37 @@ class Pupil(models.Model):
         return f"{self.user.get_full_name() or self.user.username}"
 
     def project_count(self):
-        return self.projects.filter(status='published').count()
+        return self.published_count
+
+
+class Keyword(models.Model):
+    """Ключевое слово (тег) проекта; название нормализовано (см. keywords.py)"""
+    name = models.CharField(max_length=100, unique=True, verbose_name="Название")
+    published_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Опубликованных проектов"
+    )
+
+    class Meta:
+        verbose_name = "Ключевое слово"
+        verbose_name_plural = "Ключевые слова"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class ProjectQuerySet(models.QuerySet):
+    def published(self):
+        return self.filter(status='published')
+
+    def cards(self):
+        """Проекты для карточек: предмет, руководитель и авторы загружаются заранее,
+        число запросов не зависит от количества карточек"""
+        return self.select_related('subject', 'teacher__user').prefetch_related(
+            models.Prefetch('pupils', queryset=Pupil.objects.select_related('user'))
+        )
 
 
 class Project(models.Model):
@@ -121,15 +176,31 @@ class Project(models.Model):
         help_text="Через запятую",
         blank=True
     )
+    # Заполняется из keywords при сохранении (signals.py)
+    tags = models.ManyToManyField(
+        Keyword,
+        related_name='projects',
+        blank=True,
+        editable=False,
+        verbose_name="Теги"
+    )
 
     # Файлы проекта
+    # Имя файла в хранилище — хеш содержимого (см. storage.py), исходное имя хранится отдельно
     project_file = models.FileField(
-        upload_to='projects/files/%Y/%m/%d/',
+        upload_to='projects/blobs/',
+        storage=get_project_storage,
         verbose_name="Файл проекта",
         validators=[FileExtensionValidator(['pdf', 'doc', 'docx', 'zip', 'rar', '7z'])],
         null=True,
         blank=True
     )
+    original_filename = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        verbose_name="Исходное имя файла"
+    )
 
     # Статистика и статус
     status = models.CharField(
@@ -146,6 +217,8 @@ class Project(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     published_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата публикации")
 
+    objects = ProjectQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Проект"
         verbose_name_plural = "Проекты"
@@ -161,13 +234,35 @@ class Project(models.Model):
     def get_absolute_url(self):
         return reverse('project_detail', args=[str(self.id)])
 
+    def save(self, *args, **kwargs):
+        if self.project_file and not self.project_file._committed:
+            self.original_filename = os.path.basename(self.project_file.name)
+        super().save(*args, **kwargs)
+
+    @cached_property
+    def file_blob(self):
+        """Запись хранилища для файла проекта (тип, превью); None для файлов, сохраненных до него"""
+        if not self.project_file:
+            return None
+        return StoredBlob.objects.filter(name=self.project_file.name).first()
+
+    @cached_property
+    def archive_tree(self):
+        """Строки дерева файлов архива для страницы проекта (None — оглавления нет)"""
+        from . import archives
+
+        return archives.tree_for(self.file_blob)
+
+    @property
+    def download_filename(self):
+        return self.original_filename or os.path.basename(self.project_file.name)
+
     def increase_views(self):
-        self.views += 1
-        self.save(update_fields=['views'])
+        # Запись в БД выполняется пачками (см. counters.py); на странице сразу видно новое значение
+        self.views += counters.increment(self.pk, 'views')
 
     def increase_downloads(self):
-        self.downloads += 1
-        self.save(update_fields=['downloads'])
+        self.downloads += counters.increment(self.pk, 'downloads')
 
 
 class Comment(models.Model):
@@ -193,4 +288,201 @@ class Comment(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"Комментарий от {self.user.username}"
\ No newline at end of file
+        return f"Комментарий от {self.user.username}"
+
+
+class SimilarProject(models.Model):
+    """Похожий проект из рекомендаций (см. recommendations.py); rank — место в списке, с нуля"""
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='similar_links',
+        verbose_name="Проект"
+    )
+    similar = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Похожий проект"
+    )
+    score = models.FloatField(verbose_name="Сходство")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+
+    class Meta:
+        verbose_name = "Похожий проект"
+        verbose_name_plural = "Похожие проекты"
+        # Индекс для выборки рекомендаций на странице проекта
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'rank'], name='unique_similar_project_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id} → {self.similar_id}"
+
+
+class PendingRecommendation(models.Model):
+    """Проект, соседей которого нужно пересчитать; очередь разбирает run_worker"""
+    project = models.OneToOneField(
+        Project,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name="Проект"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Добавлен")
+
+    class Meta:
+        verbose_name = "Пересчет рекомендаций"
+        verbose_name_plural = "Пересчет рекомендаций"
+
+
+class UploadSession(models.Model):
+    """Загрузка большого файла по частям; части дописываются во временный файл на диске"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name="Пользователь"
+    )
+    filename = models.CharField(max_length=255, verbose_name="Имя файла")
+    size = models.BigIntegerField(verbose_name="Размер")
+    received = models.BigIntegerField(default=0, verbose_name="Получено байт")
+    sha256 = models.CharField(max_length=64, blank=True, verbose_name="SHA-256")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Начата")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Последняя часть")
+
+    class Meta:
+        verbose_name = "Загрузка файла"
+        verbose_name_plural = "Загрузки файлов"
+
+    def __str__(self):
+        return f"{self.filename} ({self.received} из {self.size})"
+
+    @property
+    def is_complete(self):
+        return bool(self.sha256)
+
+
+class StoredBlob(models.Model):
+    """Файл в хранилище по содержимому; ref_count — число проектов, которые на него ссылаются"""
+    name = models.CharField(max_length=255, unique=True, verbose_name="Путь в хранилище")
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256")
+    size = models.BigIntegerField(verbose_name="Размер")
+    ref_count = models.IntegerField(default=0, verbose_name="Ссылок")
+    # Заполняются воркером после проверки файла (см. processing.py)
+    kind = models.CharField(max_length=20, blank=True, verbose_name="Тип содержимого")
+    preview = models.FileField(upload_to='projects/previews/', blank=True, verbose_name="Превью")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    last_seen_at = models.DateTimeField(auto_now=True, verbose_name="Последнее сохранение")
+
+    class Meta:
+        verbose_name = "Файл в хранилище"
+        verbose_name_plural = "Файлы в хранилище"
+
+    def __str__(self):
+        return self.name
+
+
+class ExtractedText(models.Model):
+    """Текст PDF/DOCX-файла (этап extract); хранится сжатым, в поисковом индексе — основы слов"""
+    blob = models.OneToOneField(
+        StoredBlob, on_delete=models.CASCADE, primary_key=True, related_name='text', verbose_name="Файл"
+    )
+    content = models.BinaryField(verbose_name="Текст (zlib)")
+    characters = models.IntegerField(default=0, verbose_name="Символов")
+    truncated = models.BooleanField(default=False, verbose_name="Обрезан")
+    created_at = models.DateTimeField(auto_now=True, verbose_name="Извлечен")
+
+    class Meta:
+        verbose_name = "Текст файла"
+        verbose_name_plural = "Тексты файлов"
+
+    def __str__(self):
+        return str(self.blob)
+
+    @property
+    def text(self):
+        return zlib.decompress(bytes(self.content)).decode()
+
+
+class ArchiveManifest(models.Model):
+    """Оглавление архива (этап listing): список [имя, размер, сжатый размер], JSON в zlib"""
+    blob = models.OneToOneField(
+        StoredBlob, on_delete=models.CASCADE, primary_key=True, related_name='manifest', verbose_name="Файл"
+    )
+    content = models.BinaryField(verbose_name="Оглавление (zlib)")
+    entries = models.IntegerField(default=0, verbose_name="Файлов")
+    uncompressed = models.BigIntegerField(default=0, verbose_name="Объем после распаковки")
+    created_at = models.DateTimeField(auto_now=True, verbose_name="Прочитано")
+
+    class Meta:
+        verbose_name = "Оглавление архива"
+        verbose_name_plural = "Оглавления архивов"
+
+    def __str__(self):
+        return str(self.blob)
+
+    @property
+    def items(self):
+        return json.loads(zlib.decompress(bytes(self.content)))
+
+
+class Job(models.Model):
+    """Задание фоновой обработки файла; выполняется командой run_worker"""
+    STAGE_CHOICES = [
+        ('integrity', 'Проверка целостности'),
+        ('listing', 'Содержимое архива'),
+        ('extract', 'Извлечение текста'),
+        ('preview', 'Превью'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    blob = models.ForeignKey(
+        StoredBlob,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        verbose_name="Файл"
+    )
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, verbose_name="Этап")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Не раньше")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Воркер")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Взято в работу")
+    result = models.JSONField(default=dict, blank=True, verbose_name="Результат")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменено")
+
+    class Meta:
+        verbose_name = "Задание обработки"
+        verbose_name_plural = "Задания обработки"
+        constraints = [
+            models.UniqueConstraint(fields=['blob', 'stage'], name='unique_job_stage_per_blob'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_stage_display()}: {self.blob}"
+
+
+class FragmentCacheStat(models.Model):
+    """Попадания и промахи кэша фрагментов (fragments.py) всех процессов"""
+    name = models.CharField(max_length=20, unique=True, verbose_name="Фрагмент")
+    hits = models.BigIntegerField(default=0, verbose_name="Попаданий")
+    misses = models.BigIntegerField(default=0, verbose_name="Промахов")
+
+    class Meta:
+        verbose_name = "Статистика кэша фрагментов"
+        verbose_name_plural = "Статистика кэша фрагментов"
+
+    def __str__(self):
+        return self.name
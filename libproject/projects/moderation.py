@@ -0,0 +1,85 @@
+# projects/moderation.py
+"""Модерация проектов: смена статуса пачкой и статистика по статусам с кэшированием"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+STATUS_COUNTS_KEY = 'moderation:status_counts'
+
+# Действие модератора -> новый статус проекта
+ACTIONS = {
+    'approve': 'published',
+    'reject': 'rejected',
+    'revision': 'revision',
+}
+MAX_BATCH = 500
+
+UPDATED, UNCHANGED, MISSING = 'updated', 'unchanged', 'missing'
+
+
+def status_counts():
+    """Возвращает {статус: число проектов}; пересчитывается только после смены статусов"""
+    counts = cache.get(STATUS_COUNTS_KEY)
+    if counts is None:
+        from .models import Project
+
+        counts = {status: 0 for status, _ in Project.STATUS_CHOICES}
+        counts.update(
+            Project.objects.order_by().values_list('status').annotate(total=Count('pk'))
+        )
+        cache.set(STATUS_COUNTS_KEY, counts, timeout=None)
+    return counts
+
+
+def invalidate_status_counts():
+    cache.delete(STATUS_COUNTS_KEY)
+
+
+def moderate_projects(project_ids, action, teacher_id=None, comment=''):
+    """Меняет статус проектов одним UPDATE в одной транзакции.
+
+    Возвращает {id: результат}: UPDATED, UNCHANGED (проект уже в этом статусе,
+    записываются только модератор, время и комментарий) или MISSING (проекта нет).
+    """
+    from .models import Project
+    from .signals import projects_bulk_updated
+
+    if action not in ACTIONS:
+        raise ValueError(f'Неизвестное действие: {action}')
+    status = ACTIONS[action]
+    now = timezone.now()
+    # update() не заполняет auto_now, updated_at нужен кэшу карточек и ETag
+    values = {
+        'status': status,
+        'moderated_by_id': teacher_id,
+        'moderated_at': now,
+        'moderation_comment': '' if action == 'approve' else comment,
+        'updated_at': now,
+    }
+    if action == 'approve':
+        values['published_at'] = now
+
+    project_ids = list(dict.fromkeys(int(pk) for pk in project_ids))
+    with transaction.atomic():
+        current = dict(
+            Project.objects.select_for_update().filter(pk__in=project_ids).values_list('pk', 'status')
+        )
+        changed = [pk for pk, previous in current.items() if previous != status]
+        if changed:
+            projects = Project.objects.filter(pk__in=changed)
+            projects.update(**values)
+            projects_bulk_updated(projects)
+        # Повторное действие с новым комментарием: статус и публикация не меняются,
+        # поэтому индексы и счетчики не трогаются, а карточки обновит updated_at
+        unchanged = [pk for pk, previous in current.items() if previous == status]
+        if unchanged:
+            Project.objects.filter(pk__in=unchanged).update(**{
+                name: value for name, value in values.items() if name not in ('status', 'published_at')
+            })
+
+    changed = set(changed)
+    return {
+        pk: UPDATED if pk in changed else UNCHANGED if pk in current else MISSING
+        for pk in project_ids
+    }
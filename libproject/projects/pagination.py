@@ -0,0 +1,126 @@
+# projects/pagination.py
+"""Постраничный вывод по ключу (keyset): страница N стоит столько же, сколько первая"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+# Целые вне диапазона BIGINT база не примет
+MAX_INTEGER = 2 ** 63 - 1
+
+
+def encode_cursor(values):
+    data = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+
+
+def _is_scalar(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return abs(value) <= MAX_INTEGER
+    return isinstance(value, (str, float))
+
+
+def decode_cursor(cursor, length=None):
+    """Возвращает список значений или None, если курсор поврежден.
+
+    Значения — только строки и числа; length — ожидаемое число значений.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(values, list) or not all(_is_scalar(value) for value in values):
+        return None
+    if length is not None and len(values) != length:
+        return None
+    return values
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Страницы по упорядоченному набору полей; последнее поле должно быть уникальным.
+
+    ordering — например ('-created_at', '-id'): курсор хранит значения этих полей
+    у последнего объекта страницы, следующая страница начинается строго после него.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id')):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.ordering = ordering
+
+    def _field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)
+
+    def _clean(self, values):
+        """Значения курсора, приведенные к типам полей, или None, если курсор подделан"""
+        try:
+            cleaned = [
+                self._field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+            return None
+        return None if None in cleaned else cleaned
+
+    def _after(self, values):
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def get_page(self, cursor=None):
+        queryset = self.queryset
+        values = decode_cursor(cursor, len(self.ordering))
+        if values is not None:
+            values = self._clean(values)
+        if values is not None:
+            # Неверный курсор — просто первая страница
+            try:
+                queryset = queryset.filter(self._after(values))
+            except (ValidationError, TypeError, ValueError):
+                pass
+
+        objects = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(objects) > self.per_page:
+            objects = objects[:self.per_page]
+            last = objects[-1]
+            next_cursor = encode_cursor([getattr(last, field.lstrip('-')) for field in self.ordering])
+        return KeysetPage(objects, next_cursor)
+
+
+def estimate_count(queryset, limit=1000):
+    """Считает не более limit + 1 строк; возвращает (число, точно ли оно)"""
+    count = queryset.order_by()[:limit + 1].count()
+    return min(count, limit), count <= limit
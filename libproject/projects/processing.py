@@ -0,0 +1,229 @@
+# projects/processing.py
+"""Этапы обработки загруженных файлов; выполняются в процессах воркера (run_worker).
+
+Функции работают только с файлом на диске и не обращаются к БД и настройкам Django:
+все нужное передается аргументами, результат возвращается словарем.
+Необязательные библиотеки (pypdf, PyMuPDF, py7zr, rarfile) подключаются, если установлены;
+без них соответствующий этап отмечается как пропущенный.
+"""
+import hashlib
+import json
+import os
+import re
+import zipfile
+import zlib
+from xml.etree import ElementTree
+
+from .stemmer import stem
+
+READ_SIZE = 64 * 1024
+# Как в search.py: слова для поискового индекса
+WORD_RE = re.compile(r'\w+')
+# Защита от zip-бомб: архив не должен распаковываться больше чем в N раз
+MAX_COMPRESSION_RATIO = 200
+MAX_UNCOMPRESSED_SIZE = 20 * 1024 * 1024 * 1024
+
+SIGNATURES = [
+    (b'%PDF-', 'pdf'),
+    (b'PK\x03\x04', 'zip'),
+    (b'PK\x05\x06', 'zip'),
+    (b'7z\xbc\xaf\x27\x1c', '7z'),
+    (b'Rar!\x1a\x07', 'rar'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'doc'),
+]
+# Какое содержимое допустимо для расширения файла
+EXPECTED_KINDS = {
+    '.pdf': {'pdf'},
+    '.zip': {'zip'},
+    '.7z': {'7z'},
+    '.rar': {'rar'},
+    '.doc': {'doc'},
+    '.docx': {'docx'},
+}
+ARCHIVE_KINDS = {'zip', '7z', 'rar'}
+TEXT_KINDS = {'pdf', 'docx'}
+PREVIEW_KINDS = {'pdf'}
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class PermanentError(Exception):
+    """Файл поврежден или не того типа: повторять обработку бессмысленно"""
+
+
+def next_stages(kind):
+    """Этапы, которые запускаются после успешной проверки целостности"""
+    stages = []
+    if kind in ARCHIVE_KINDS:
+        stages.append('listing')
+    if kind in TEXT_KINDS:
+        stages.append('extract')
+    if kind in PREVIEW_KINDS:
+        stages.append('preview')
+    return stages
+
+
+def detect_kind(path):
+    with open(path, 'rb') as file:
+        head = file.read(8)
+    for signature, kind in SIGNATURES:
+        if head.startswith(signature):
+            if kind == 'zip' and _is_docx(path):
+                return 'docx'
+            return kind
+    return 'unknown'
+
+
+def _is_docx(path):
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return 'word/document.xml' in archive.NameToInfo
+    except zipfile.BadZipFile:
+        return False
+
+
+def integrity(path, sha256, size, extension, **options):
+    """Размер и хеш совпадают с записанными, содержимое соответствует расширению, CRC архива верны"""
+    if os.path.getsize(path) != size:
+        raise PermanentError('Размер файла не совпадает с записанным')
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for data in iter(lambda: file.read(READ_SIZE), b''):
+            digest.update(data)
+    if digest.hexdigest() != sha256:
+        raise PermanentError('Хеш файла не совпадает с записанным')
+
+    kind = detect_kind(path)
+    expected = EXPECTED_KINDS.get(extension.lower())
+    if expected is not None and kind not in expected:
+        raise PermanentError(f'Содержимое ({kind}) не соответствует расширению {extension}')
+    if kind in ('zip', 'docx'):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                broken = archive.testzip()
+        except zipfile.BadZipFile as error:
+            raise PermanentError(f'Архив поврежден: {error}')
+        if broken is not None:
+            raise PermanentError(f'Архив поврежден: ошибка CRC в {broken}')
+    if kind == 'pdf':
+        with open(path, 'rb') as file:
+            file.seek(max(size - 1024, 0))
+            if b'%%EOF' not in file.read():
+                raise PermanentError('PDF-файл обрезан')
+    return {'kind': kind}
+
+
+def _archive_entries(path, kind):
+    """(имя, размер, сжатый размер) для каждого файла архива.
+
+    Читается только оглавление (центральный каталог zip, заголовок 7z), без распаковки.
+    """
+    if kind == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            return [(info.filename, info.file_size, info.compress_size)
+                    for info in archive.infolist() if not info.is_dir()]
+    if kind == '7z':
+        import py7zr
+
+        with py7zr.SevenZipFile(path) as archive:
+            return [(info.filename, info.uncompressed or 0, info.compressed or 0)
+                    for info in archive.list() if not info.is_directory]
+    if kind == 'rar':
+        import rarfile
+
+        with rarfile.RarFile(path) as archive:
+            return [(info.filename, info.file_size, info.compress_size)
+                    for info in archive.infolist() if not info.is_dir()]
+    raise PermanentError(f'Неизвестный тип архива: {kind}')
+
+
+def listing(path, kind, size, **options):
+    """Оглавление архива (manifest — сжатый zlib JSON); подозрительно сильно сжатые архивы отклоняются"""
+    try:
+        entries = _archive_entries(path, kind)
+    except ImportError as error:
+        return {'skipped': f'нет библиотеки {error.name}'}
+    uncompressed = sum(entry[1] for entry in entries)
+    if uncompressed > MAX_UNCOMPRESSED_SIZE or uncompressed > max(size, 1) * MAX_COMPRESSION_RATIO:
+        raise PermanentError('Архив распаковывается в слишком большой объем')
+    manifest = json.dumps([list(entry) for entry in entries], ensure_ascii=False, separators=(',', ':'))
+    return {
+        'entries': len(entries),
+        'uncompressed': uncompressed,
+        'manifest': zlib.compress(manifest.encode(), 9),
+    }
+
+
+def iter_text(path, kind):
+    """Текст документа по кускам (страница PDF или абзац DOCX), без загрузки всего файла в память"""
+    if kind == 'pdf':
+        from pypdf import PdfReader
+
+        for page in PdfReader(path).pages:
+            yield page.extract_text() or ''
+    elif kind == 'docx':
+        with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as document:
+            paragraph = []
+            for event, element in ElementTree.iterparse(document, events=('end',)):
+                if element.tag == WORD_NAMESPACE + 't':
+                    paragraph.append(element.text or '')
+                elif element.tag == WORD_NAMESPACE + 'p':
+                    yield ''.join(paragraph)
+                    paragraph = []
+                    element.clear()
+
+
+def extract(path, kind, max_chars=1_000_000, **options):
+    """Текст документа (не более max_chars символов) и его основы для поискового индекса.
+
+    Текст сжимается по мере чтения, поэтому в памяти не бывает всего документа сразу.
+    Возвращает 'text' и 'stems' — сжатые zlib байты.
+    """
+    text, stems = zlib.compressobj(9), zlib.compressobj(9)
+    text_parts, stem_parts = [], []
+    characters, truncated = 0, False
+    try:
+        for chunk in iter_text(path, kind):
+            if characters + len(chunk) > max_chars:
+                chunk = chunk[:max_chars - characters]
+                truncated = True
+            characters += len(chunk)
+            text_parts.append(text.compress((chunk + '\n').encode()))
+            stem_parts.append(stems.compress(' '.join(stem(word) for word in WORD_RE.findall(chunk)).encode() + b' '))
+            if truncated:
+                break
+    except ImportError as error:
+        return {'skipped': f'нет библиотеки {error.name}'}
+    return {
+        'characters': characters,
+        'truncated': truncated,
+        'text': b''.join(text_parts) + text.flush(),
+        'stems': b''.join(stem_parts) + stems.flush(),
+    }
+
+
+def preview(path, kind, preview_path, **options):
+    """PNG первой страницы PDF (через PyMuPDF) в preview_path"""
+    try:
+        import fitz
+    except ImportError:
+        return {'skipped': 'нет библиотеки fitz'}
+    with fitz.open(path) as document:
+        if not document.page_count:
+            return {'skipped': 'пустой документ'}
+        pixmap = document[0].get_pixmap(matrix=fitz.Matrix(0.5, 0.5))
+    os.makedirs(os.path.dirname(preview_path), exist_ok=True)
+    pixmap.save(preview_path)
+    return {'preview': True}
+
+
+HANDLERS = {
+    'integrity': integrity,
+    'listing': listing,
+    'extract': extract,
+    'preview': preview,
+}
+
+
+def run_stage(stage, **arguments):
+    return HANDLERS[stage](**arguments)
@@ -0,0 +1,75 @@
+# projects/published_counts.py
+"""Пересчет хранимых счетчиков опубликованных проектов у предметов, преподавателей и учеников"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# Модель -> поле проекта, связывающее его с этой моделью
+RELATIONS = {
+    'Subject': 'subject',
+    'Teacher': 'teacher',
+    'Pupil': 'pupils',
+    'Keyword': 'tags',
+}
+
+
+def _refresh(model, project_model, relation, ids):
+    if ids is not None:
+        ids = {pk for pk in ids if pk is not None}
+        if not ids:
+            return 0
+    published = (
+        project_model.objects
+        .filter(status='published', **{relation: OuterRef('pk')})
+        .order_by()
+        .values(relation)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    queryset = model.objects.all() if ids is None else model.objects.filter(pk__in=ids)
+    return queryset.update(published_count=Coalesce(Subquery(published), Value(0)))
+
+
+def refresh(subject_ids=(), teacher_ids=(), pupil_ids=(), keyword_ids=()):
+    """Пересчитывает счетчики у указанных объектов одним UPDATE на модель.
+
+    None вместо списка id означает «все объекты модели».
+    """
+    from django.apps import apps
+
+    models = {name: apps.get_model('projects', name) for name in (*RELATIONS, 'Project')}
+    ids_by_model = {'Subject': subject_ids, 'Teacher': teacher_ids, 'Pupil': pupil_ids, 'Keyword': keyword_ids}
+    with transaction.atomic():
+        return {
+            name: _refresh(models[name], models['Project'], relation, ids_by_model[name])
+            for name, relation in RELATIONS.items()
+            if ids_by_model[name] is None or ids_by_model[name]
+        }
+
+
+def refresh_all():
+    return refresh(None, None, None, None)
+
+
+def refresh_for_projects(queryset):
+    """Пересчитывает счетчики у всех, кто связан с проектами из queryset"""
+    rows = list(queryset.values_list('pk', 'subject_id', 'teacher_id'))
+    if not rows:
+        return
+    project_ids = [pk for pk, _, _ in rows]
+    pupil_ids = set(
+        queryset.model.pupils.through.objects
+        .filter(project_id__in=project_ids)
+        .values_list('pupil_id', flat=True)
+    )
+    keyword_ids = set(
+        queryset.model.tags.through.objects
+        .filter(project_id__in=project_ids)
+        .values_list('keyword_id', flat=True)
+    )
+    refresh(
+        subject_ids={subject_id for _, subject_id, _ in rows},
+        teacher_ids={teacher_id for _, _, teacher_id in rows},
+        pupil_ids=pupil_ids,
+        keyword_ids=keyword_ids,
+    )
@@ -0,0 +1,255 @@
+# projects/recommendations.py
+"""Похожие проекты: TF-IDF по названию, описанию и ключевым словам.
+
+Для каждого опубликованного проекта заранее считаются TOP_K ближайших по косинусной
+мере и сохраняются в SimilarProject, страница проекта берет их одним запросом по индексу.
+При публикации и правке пересчитывается только сам проект, а он добавляется в списки
+соседей. IDF со временем смещается, поэтому полезен периодический полный пересчет
+(manage.py build_recommendations). Пересчет после правки не выполняется в запросе:
+проект ставится в очередь (PendingRecommendation), ее разбирает run_worker.
+
+С NumPy и SciPy сходство считается умножением разреженных матриц блоками строк,
+без них — на чистом Python через обратный индекс (для небольших библиотек этого достаточно).
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .search import tokenize
+
+# Слово из названия весит как три слова описания
+FIELD_WEIGHTS = {'title': 3, 'description': 1, 'keywords': 2}
+TERMS_TIMEOUT = 60 * 60 * 24 * 7
+BLOCK_SIZE = 256
+
+
+def _terms_key(pk, updated_at):
+    return f'similar:terms:{pk}:{updated_at.timestamp()}'
+
+
+def _count_terms(row):
+    terms = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for word in tokenize(row[field]):
+            terms[word] += weight
+    return dict(terms)
+
+
+def corpus():
+    """(pk опубликованных проектов, частоты основ для каждого).
+
+    Основы кэшируются по времени изменения проекта, так что текст читается
+    и разбирается только для новых и отредактированных проектов.
+    """
+    from .models import Project
+
+    published = list(Project.objects.filter(status='published').order_by('pk').values_list('pk', 'updated_at'))
+    keys = [_terms_key(pk, updated_at) for pk, updated_at in published]
+    cached = cache.get_many(keys)
+    missing = {pk: key for (pk, _), key in zip(published, keys) if key not in cached}
+    if missing:
+        rows = Project.objects.filter(pk__in=list(missing)).values('pk', *FIELD_WEIGHTS)
+        computed = {missing[row['pk']]: _count_terms(row) for row in rows}
+        cache.set_many(computed, TERMS_TIMEOUT)
+        cached.update(computed)
+    pks = [pk for pk, _ in published]
+    return pks, [cached.get(key, {}) for key in keys]
+
+
+def tfidf(documents):
+    """Векторы TF-IDF (логарифмическая частота), нормированные по длине"""
+    frequency = Counter(term for document in documents for term in document)
+    total = len(documents)
+    idf = {term: math.log((1 + total) / (1 + count)) + 1 for term, count in frequency.items()}
+    vectors = []
+    for document in documents:
+        vector = {term: (1 + math.log(count)) * idf[term] for term, count in document.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        vectors.append({term: weight / norm for term, weight in vector.items()})
+    return vectors
+
+
+def top_similar(vectors, targets, k):
+    """{номер цели: [(номер соседа, сходство), ...]} — до k соседей с ненулевым сходством"""
+    try:
+        import numpy  # noqa: F401
+        from scipy import sparse  # noqa: F401
+    except ImportError:
+        return _top_similar_python(vectors, targets, k)
+    return _top_similar_sparse(vectors, targets, k)
+
+
+def _top_similar_sparse(vectors, targets, k):
+    import numpy as np
+    from scipy import sparse
+
+    vocabulary, indices, data, indptr = {}, [], [], [0]
+    for vector in vectors:
+        for term, weight in vector.items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            data.append(weight)
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix(
+        (np.array(data, dtype=np.float32), np.array(indices), np.array(indptr)),
+        shape=(len(vectors), len(vocabulary)),
+    )
+    transposed = matrix.T.tocsc()
+
+    result = {}
+    # Блоками: плотная матрица сходства не больше BLOCK_SIZE x число проектов
+    for start in range(0, len(targets), BLOCK_SIZE):
+        block = targets[start:start + BLOCK_SIZE]
+        scores = (matrix[block] @ transposed).toarray()
+        scores[np.arange(len(block)), block] = 0
+        count = min(k, scores.shape[1])
+        for target, row in zip(block, scores):
+            best = np.argpartition(-row, count - 1)[:count]
+            best = best[np.argsort(-row[best], kind='stable')]
+            result[target] = [(int(index), float(row[index])) for index in best if row[index] > 0]
+    return result
+
+
+def _top_similar_python(vectors, targets, k):
+    postings = defaultdict(list)
+    for index, vector in enumerate(vectors):
+        for term, weight in vector.items():
+            postings[term].append((index, weight))
+
+    result = {}
+    for target in targets:
+        scores = defaultdict(float)
+        for term, weight in vectors[target].items():
+            for index, other in postings[term]:
+                scores[index] += weight * other
+        scores.pop(target, None)
+        result[target] = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    return result
+
+
+def _links(project_id, neighbours):
+    from .models import SimilarProject
+
+    return [
+        SimilarProject(project_id=project_id, similar_id=similar_id, score=score, rank=rank)
+        for rank, (similar_id, score) in enumerate(neighbours)
+    ]
+
+
+def rebuild():
+    """Полный пересчет таблицы SimilarProject; возвращает число проектов"""
+    from .models import SimilarProject
+
+    pks, documents = corpus()
+    neighbours = top_similar(tfidf(documents), list(range(len(pks))), settings.PROJECT_SIMILAR_TOP_K)
+    links = []
+    for target, found in neighbours.items():
+        links.extend(_links(pks[target], [(pks[index], score) for index, score in found]))
+    with transaction.atomic():
+        SimilarProject.objects.all().delete()
+        SimilarProject.objects.bulk_create(links, batch_size=500)
+    return len(pks)
+
+
+def update_projects(project_ids):
+    """Пересчитывает соседей проектов и списки соседей, в которых они есть или могут появиться.
+
+    Неопубликованные проекты удаляются из всех списков.
+    """
+    from .models import SimilarProject
+
+    k = settings.PROJECT_SIMILAR_TOP_K
+    project_ids = set(project_ids)
+    pks, documents = corpus()
+    positions = {pk: index for index, pk in enumerate(pks)}
+    published = {pk for pk in project_ids if pk in positions}
+    # Списки, где проект уже есть: его сходство изменилось, и место в списке может
+    # занять другой проект, поэтому такие списки пересчитываются целиком
+    containing = set(
+        SimilarProject.objects.filter(similar_id__in=published).values_list('project_id', flat=True)
+    ) & set(positions)
+    recomputed = published | containing
+    neighbours = top_similar(tfidf(documents), [positions[pk] for pk in recomputed], k)
+
+    found = {pks[target]: [(pks[index], score) for index, score in items] for target, items in neighbours.items()}
+    # Списки, в которые проект может попасть (сходство симметрично)
+    incoming = defaultdict(list)
+    for project_id in published:
+        for similar_id, score in found[project_id]:
+            if similar_id not in recomputed:
+                incoming[similar_id].append((project_id, score))
+
+    with transaction.atomic():
+        SimilarProject.objects.filter(project_id__in=project_ids | recomputed).delete()
+        # Снятые с публикации проекты убираются из чужих списков
+        SimilarProject.objects.filter(similar_id__in=project_ids - published).delete()
+        links = []
+        for project_id, items in found.items():
+            links.extend(_links(project_id, items))
+
+        existing = defaultdict(list)
+        rows = SimilarProject.objects.filter(project_id__in=list(incoming)).order_by('rank')
+        for link in rows.values_list('project_id', 'similar_id', 'score'):
+            existing[link[0]].append(link[1:])
+        for project_id, candidates in incoming.items():
+            merged = heapq.nlargest(k, existing[project_id] + candidates, key=lambda item: item[1])
+            links.extend(_links(project_id, merged))
+        SimilarProject.objects.filter(project_id__in=list(incoming)).delete()
+        SimilarProject.objects.bulk_create(links, batch_size=500)
+
+
+def schedule(project_ids):
+    """Ставит проекты в очередь пересчета; TF-IDF по всему каталогу считается в run_worker"""
+    from .models import PendingRecommendation
+
+    # Повторная постановка обновляет created_at: так process_pending, уже прочитавший
+    # очередь, не удалит запись об изменении, которого он не видел
+    PendingRecommendation.objects.bulk_create(
+        [PendingRecommendation(project_id=pk) for pk in project_ids],
+        update_conflicts=True, unique_fields=['project'], update_fields=['created_at'],
+    )
+
+
+def process_pending():
+    """Пересчитывает все проекты из очереди за один проход по каталогу; возвращает их число"""
+    from .models import PendingRecommendation
+
+    started = timezone.now()
+    project_ids = list(PendingRecommendation.objects.values_list('project_id', flat=True))
+    if not project_ids:
+        return 0
+    update_projects(project_ids)
+    PendingRecommendation.objects.filter(project_id__in=project_ids, created_at__lte=started).delete()
+    return len(project_ids)
+
+
+def similar_projects(project, limit=3):
+    """Похожие опубликованные проекты из готовой таблицы (один запрос по индексу)"""
+    from .models import SimilarProject
+
+    links = (
+        SimilarProject.objects.filter(project=project, similar__status='published')
+        .select_related('similar')
+        .order_by('rank')[:limit]
+    )
+    similar = [link.similar for link in links]
+    if similar or project.subject_id is None:
+        return similar
+    return _same_subject(project, limit)
+
+
+def _same_subject(project, limit):
+    """Проекты того же предмета, пока таблица не заполнена или проект ждет пересчета"""
+    from .models import PendingRecommendation, Project, SimilarProject
+
+    waiting = PendingRecommendation.objects.filter(project=project).exists()
+    if not waiting and SimilarProject.objects.exists():
+        return []
+    return list(
+        Project.objects.filter(subject_id=project.subject_id, status='published')
+        .exclude(pk=project.pk)[:limit]
+    )
@@ -0,0 +1,73 @@
+# projects/reference.py
+"""Справочники (предметы и руководители) в памяти процесса.
+
+Таблицы маленькие и меняются несколько раз за семестр, поэтому читаются целиком
+в неизменяемый снимок из кортежей. Актуальность сверяется с номером поколения в общем
+кэше (versions.py): изменение предмета или преподавателя в любом процессе увеличивает
+номер, и остальные процессы перечитают снимок при следующем обращении.
+"""
+from collections import namedtuple
+from types import MappingProxyType
+
+from .versions import bump_version, get_version
+
+VERSION_NAME = 'reference'
+
+SubjectRecord = namedtuple('SubjectRecord', 'id name code')
+TeacherRecord = namedtuple('TeacherRecord', 'id name department')
+Snapshot = namedtuple('Snapshot', 'version subjects teachers subject_names teacher_names')
+
+_snapshot = None
+
+
+def _teacher_name(first_name, last_name, username):
+    # Как Teacher.__str__
+    return f'{first_name} {last_name}'.strip() or username
+
+
+def _load(version):
+    from .models import Subject, Teacher
+
+    subjects = tuple(
+        SubjectRecord(*row) for row in Subject.objects.order_by('name').values_list('id', 'name', 'code')
+    )
+    rows = Teacher.objects.values_list(
+        'id', 'user__first_name', 'user__last_name', 'user__username', 'department'
+    )
+    teachers = tuple(sorted(
+        (TeacherRecord(pk, _teacher_name(first_name, last_name, username), department)
+         for pk, first_name, last_name, username, department in rows),
+        key=lambda teacher: teacher.name.lower()
+    ))
+    return Snapshot(
+        version=version,
+        subjects=subjects,
+        teachers=teachers,
+        subject_names=MappingProxyType({subject.id: subject.name for subject in subjects}),
+        teacher_names=MappingProxyType({teacher.id: teacher.name for teacher in teachers}),
+    )
+
+
+def get_snapshot():
+    """Актуальный снимок справочников; перечитывается, если другой процесс их менял"""
+    global _snapshot
+    # Номер читается до таблиц: изменение во время чтения заметит следующее обращение
+    version = get_version(VERSION_NAME)
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        snapshot = _snapshot = _load(version)
+    return snapshot
+
+
+def subject_choices():
+    return [(subject.id, subject.name) for subject in get_snapshot().subjects]
+
+
+def teacher_choices():
+    return [(teacher.id, teacher.name) for teacher in get_snapshot().teachers]
+
+
+def invalidate():
+    global _snapshot
+    bump_version(VERSION_NAME)
+    _snapshot = None
@@ -0,0 +1,100 @@
+# projects/roles.py
+"""Роли пользователя (преподаватель, ученик, администратор) для представлений и шаблонов.
+
+RoleMiddleware добавляет ленивый request.roles. Id профилей Teacher и Pupil хранятся
+в сессии вместе с номером поколения ролей пользователя (versions.py): при создании,
+изменении или удалении профиля номер меняется, и роли перечитываются одним запросом.
+Сами объекты Teacher и Pupil загружаются, только когда они действительно нужны.
+"""
+from django.utils.functional import SimpleLazyObject, cached_property
+
+from .versions import bump_version, get_version
+
+SESSION_KEY = 'projects_roles'
+
+
+def _version_name(user_id):
+    return f'roles:{user_id}'
+
+
+class Roles:
+    def __init__(self, user, teacher_id=None, pupil_id=None):
+        self.user = user
+        self.teacher_id = teacher_id
+        self.pupil_id = pupil_id
+
+    @property
+    def is_teacher(self):
+        return self.teacher_id is not None
+
+    @property
+    def is_pupil(self):
+        return self.pupil_id is not None
+
+    @property
+    def is_moderator(self):
+        """Модерировать и выгружать проекты могут преподаватели и администраторы"""
+        return self.is_teacher or self.user.is_staff
+
+    @cached_property
+    def teacher(self):
+        from .models import Teacher
+
+        return self._profile(Teacher, self.teacher_id)
+
+    @cached_property
+    def pupil(self):
+        from .models import Pupil
+
+        return self._profile(Pupil, self.pupil_id)
+
+    def _profile(self, model, pk):
+        if pk is None:
+            return None
+        profile = model.objects.filter(pk=pk).first()
+        if profile is not None:
+            profile.user = self.user
+        return profile
+
+
+def remember(session, user, version=None):
+    """Читает id профилей пользователя одним запросом и сохраняет их в сессии"""
+    from django.contrib.auth import get_user_model
+
+    if version is None:
+        version = get_version(_version_name(user.pk))
+    teacher_id, pupil_id = get_user_model().objects.filter(pk=user.pk).values_list('teacher', 'pupil').get()
+    stored = session[SESSION_KEY] = {
+        'user': user.pk,
+        'version': version,
+        'teacher': teacher_id,
+        'pupil': pupil_id,
+    }
+    return stored
+
+
+def resolve(request):
+    user = request.user
+    if not user.is_authenticated:
+        return Roles(user)
+    # Номер поколения читается до профилей: изменение между ними заметит следующий запрос
+    version = get_version(_version_name(user.pk))
+    stored = request.session.get(SESSION_KEY)
+    if not stored or stored['user'] != user.pk or stored['version'] != version:
+        stored = remember(request.session, user, version)
+    return Roles(user, stored['teacher'], stored['pupil'])
+
+
+def invalidate(user_id):
+    bump_version(_version_name(user_id))
+
+
+class RoleMiddleware:
+    """request.roles — роли текущего пользователя, вычисляются при первом обращении"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.roles = SimpleLazyObject(lambda: resolve(request))
+        return self.get_response(request)
@@ -0,0 +1,232 @@
+# projects/search.py
+"""Полнотекстовый поиск по проектам: FTS5 в SQLite, tsvector в PostgreSQL.
+
+В SQLite ищется и текст загруженных PDF/DOCX (отдельная таблица CONTENT_FTS_TABLE,
+строка на файл хранилища), для найденных в тексте проектов строятся фрагменты.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .stemmer import stem
+
+FTS_TABLE = 'projects_project_fts'
+CONTENT_FTS_TABLE = 'projects_content_fts'
+WORD_RE = re.compile(r'\w+')
+
+# Веса полей при ранжировании: название, описание, ключевые слова
+FTS_RANK = f'-bm25({FTS_TABLE}, 10.0, 1.0, 5.0)'
+# Совпадение в тексте файла весит меньше совпадения в описании
+CONTENT_RANK_WEIGHT = 0.3
+
+PROJECT_MATCH_SQL = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+CONTENT_MATCH_SQL = (
+    f'SELECT b.name FROM projects_storedblob b JOIN {CONTENT_FTS_TABLE} c ON c.rowid = b.id '
+    f'WHERE {CONTENT_FTS_TABLE} MATCH %s'
+)
+PROJECT_RANK_SQL = (
+    f'coalesce((SELECT {FTS_RANK} FROM {FTS_TABLE} '
+    f'WHERE {FTS_TABLE} MATCH %s AND rowid = projects_project.id), 0)'
+)
+CONTENT_RANK_SQL = (
+    f'coalesce((SELECT -bm25({CONTENT_FTS_TABLE}) FROM {CONTENT_FTS_TABLE} c '
+    f'JOIN projects_storedblob b ON c.rowid = b.id '
+    f'WHERE {CONTENT_FTS_TABLE} MATCH %s AND b.name = projects_project.project_file), 0)'
+)
+
+SNIPPET_RADIUS = 100
+
+# Выражение должно совпадать с индексом из миграции 0005, иначе индекс не используется
+PG_DOCUMENT = (
+    "(setweight(to_tsvector('russian', coalesce({table}title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce({table}keywords, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce({table}description, '')), 'C'))"
+)
+
+INDEX_BATCH_SIZE = 500
+
+
+def tokenize(text):
+    """Разбивает текст на слова и приводит их к основам"""
+    return [stem(word) for word in WORD_RE.findall(text or '')]
+
+
+def _index_row(project):
+    return (
+        project.pk,
+        ' '.join(tokenize(project.title)),
+        ' '.join(tokenize(project.description)),
+        ' '.join(tokenize(project.keywords)),
+    )
+
+
+def uses_fts():
+    return connection.vendor == 'sqlite'
+
+
+def index_content(blob_id, stems):
+    """Записывает основы слов текста файла (их готовит этап extract воркера)"""
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {CONTENT_FTS_TABLE} WHERE rowid = %s', [blob_id])
+        cursor.execute(f'INSERT INTO {CONTENT_FTS_TABLE} (rowid, content) VALUES (%s, %s)', [blob_id, stems])
+
+
+def remove_content(blob_id):
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {CONTENT_FTS_TABLE} WHERE rowid = %s', [blob_id])
+
+
+def index_project(project):
+    """Обновляет запись проекта в индексе; в индексе только опубликованные проекты"""
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [project.pk])
+        if project.status == 'published':
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description, keywords) VALUES (%s, %s, %s, %s)',
+                _index_row(project)
+            )
+
+
+def remove_project(pk):
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+
+def reindex_projects(queryset):
+    """Переиндексирует проекты из queryset (например, после queryset.update)"""
+    if not uses_fts():
+        return
+    pks = list(queryset.values_list('pk', flat=True))
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), INDEX_BATCH_SIZE):
+            batch = pks[start:start + INDEX_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch)
+    _insert_published(queryset)
+
+
+def rebuild_index(queryset):
+    """Полностью перестраивает индекс по проектам из queryset"""
+    if not uses_fts():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    return _insert_published(queryset)
+
+
+def _insert_published(queryset):
+    projects = queryset.filter(status='published').only('pk', 'title', 'description', 'keywords')
+    rows = []
+    total = 0
+    with connection.cursor() as cursor:
+        for project in projects.iterator(chunk_size=INDEX_BATCH_SIZE):
+            rows.append(_index_row(project))
+            if len(rows) >= INDEX_BATCH_SIZE:
+                total += _insert_rows(cursor, rows)
+                rows = []
+        total += _insert_rows(cursor, rows)
+    return total
+
+
+def _insert_rows(cursor, rows):
+    if rows:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, keywords) VALUES (%s, %s, %s, %s)',
+            rows
+        )
+    return len(rows)
+
+
+def build_match(query):
+    """Строит запрос FTS5: все слова запроса должны встретиться (с учетом префикса основы)"""
+    stems = tokenize(query)
+    return ' '.join(f'"{word}"*' for word in stems)
+
+
+def search_projects(queryset, query):
+    """Фильтрует queryset по запросу и сортирует по релевантности (поле search_rank)"""
+    if uses_fts():
+        match = build_match(query)
+        if not match:
+            return queryset.none()
+        # Проект найден, если запрос совпал с его полями или с текстом его файла
+        queryset = queryset.extra(
+            where=[f'(projects_project.id IN ({PROJECT_MATCH_SQL}) '
+                   f'OR projects_project.project_file IN ({CONTENT_MATCH_SQL}))'],
+            params=[match, match],
+        ).annotate(
+            search_rank=RawSQL(
+                f'{PROJECT_RANK_SQL} + {CONTENT_RANK_WEIGHT} * {CONTENT_RANK_SQL}',
+                (match, match),
+                output_field=FloatField()
+            ),
+            content_rank=RawSQL(CONTENT_RANK_SQL, (match,), output_field=FloatField()),
+        )
+    elif connection.vendor == 'postgresql':
+        words = WORD_RE.findall(query)
+        if not words:
+            return queryset.none()
+        document = PG_DOCUMENT.format(table='projects_project.')
+        tsquery = "to_tsquery('russian', %s)"
+        ts_terms = ' & '.join(f'{word}:*' for word in words)
+        queryset = queryset.extra(
+            where=[f'{document} @@ {tsquery}'],
+            params=[ts_terms],
+        ).annotate(search_rank=RawSQL(
+            f'ts_rank({document}, {tsquery})', (ts_terms,), output_field=FloatField()
+        ))
+    else:
+        from .keywords import normalize
+        from .models import Project
+
+        tagged = Project.tags.through.objects.filter(keyword__name=normalize(query)).values('project_id')
+        queryset = queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(pk__in=tagged)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by('-search_rank', '-created_at')
+
+
+def snippet(text, query):
+    """Фрагмент текста вокруг первого найденного слова запроса; слово выделено <mark>"""
+    prefixes = tokenize(query)
+    for match in WORD_RE.finditer(text):
+        word = match.group().lower().replace('ё', 'е')
+        # Основа — начало слова, поэтому stem() вызывается только для подходящих по началу слов
+        if not any(word.startswith(prefix) and stem(word).startswith(prefix) for prefix in prefixes):
+            continue
+        start = max(match.start() - SNIPPET_RADIUS, 0)
+        end = min(match.end() + SNIPPET_RADIUS, len(text))
+        return mark_safe(''.join([
+            '…' if start else '',
+            escape(text[start:match.start()]),
+            f'<mark>{escape(match.group())}</mark>',
+            escape(text[match.end():end]),
+            '…' if end < len(text) else '',
+        ]))
+    return ''
+
+
+def attach_snippets(projects, query):
+    """Добавляет search_snippet проектам, найденным по тексту файла (одним запросом)"""
+    from .models import ExtractedText
+
+    matched = {project.project_file.name: project for project in projects if getattr(project, 'content_rank', 0)}
+    if not matched:
+        return
+    texts = ExtractedText.objects.filter(blob__name__in=list(matched)).select_related('blob')
+    for extracted in texts:
+        matched[extracted.blob.name].search_snippet = snippet(extracted.text, query)
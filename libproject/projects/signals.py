@@ -0,0 +1,192 @@
+# projects/signals.py
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import autocomplete, jobs, keywords, published_counts, recommendations, reference, roles, search, storage
+from .catalog import invalidate_facets
+from .fragments import bump_catalog_generation
+from .moderation import invalidate_status_counts
+from .models import Project, Pupil, StoredBlob, Subject, Teacher
+
+
+@receiver(pre_save, sender=Project)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    """Запоминает статус и связи проекта до сохранения"""
+    instance._previous_state = None
+    if instance.pk and not raw:
+        instance._previous_state = (
+            Project.objects.filter(pk=instance.pk)
+            .values('status', 'subject_id', 'teacher_id', 'project_file', 'keywords', 'title', 'year')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance, created, raw=False, **kwargs):
+    """Синхронизирует поисковый индекс и счетчики при создании, редактировании и модерации"""
+    if raw:
+        return
+    search.index_project(instance)
+
+    previous = getattr(instance, '_previous_state', None) or {}
+    was_published = previous.get('status') == 'published'
+    is_published = instance.status == 'published'
+    # Черновики и проекты на модерации не видны в каталоге и не входят в индекс
+    # автодополнения: их сохранение не заставляет другие процессы перестраивать индекс
+    if was_published or is_published:
+        transaction.on_commit(bump_catalog_generation)
+        transaction.on_commit(invalidate_facets)
+        pk = instance.pk
+        transaction.on_commit(lambda: recommendations.schedule([pk]))
+        indexed = ('title', 'year', 'keywords')
+        if was_published != is_published or any(previous.get(name) != getattr(instance, name) for name in indexed):
+            transaction.on_commit(lambda: autocomplete.update_project(instance))
+
+    previous_file = previous.get('project_file') or ''
+    if previous_file != (instance.project_file.name or ''):
+        storage.retain(instance.project_file.name)
+        storage.release(previous_file)
+        if instance.project_file:
+            name = instance.project_file.name
+            transaction.on_commit(lambda: jobs.enqueue_file(name))
+
+    if created or previous.get('status') != instance.status:
+        transaction.on_commit(invalidate_status_counts)
+
+    moved = (previous.get('subject_id'), previous.get('teacher_id')) != (instance.subject_id, instance.teacher_id)
+    if was_published != is_published or (is_published and moved):
+        published_counts.refresh(
+            subject_ids={previous.get('subject_id'), instance.subject_id},
+            teacher_ids={previous.get('teacher_id'), instance.teacher_id},
+            pupil_ids=set() if created else set(instance.pupils.values_list('pk', flat=True)),
+        )
+
+    keyword_ids = set()
+    if created or previous.get('keywords') != instance.keywords:
+        keyword_ids = keywords.sync_project(instance)
+    if was_published != is_published:
+        keyword_ids |= set(instance.tags.values_list('pk', flat=True))
+    if keyword_ids and (was_published or is_published):
+        published_counts.refresh(keyword_ids=keyword_ids)
+        transaction.on_commit(keywords.invalidate_cloud)
+
+
+@receiver(m2m_changed, sender=Project.pupils.through)
+def project_pupils_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчитывает счетчики учеников при изменении авторов проекта"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(bump_catalog_generation)
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_pupil_ids = {instance.pk}
+        else:
+            instance._cleared_pupil_ids = set(instance.pupils.values_list('pk', flat=True))
+        return
+    if action == 'post_clear':
+        published_counts.refresh(pupil_ids=getattr(instance, '_cleared_pupil_ids', set()))
+        return
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    if reverse:
+        published_counts.refresh(pupil_ids={instance.pk})
+    elif instance.status == 'published':
+        published_counts.refresh(pupil_ids=pk_set)
+
+
+@receiver(pre_delete, sender=Project)
+def remember_project_relations(sender, instance, **kwargs):
+    instance._deleted_relations = {
+        'subject_ids': {instance.subject_id},
+        'teacher_ids': {instance.teacher_id},
+        'pupil_ids': set(instance.pupils.values_list('pk', flat=True)),
+        'keyword_ids': set(instance.tags.values_list('pk', flat=True)),
+    }
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    storage.release(instance.project_file.name)
+    search.remove_project(pk)
+    transaction.on_commit(lambda: autocomplete.remove_project(pk))
+    transaction.on_commit(invalidate_status_counts)
+    transaction.on_commit(bump_catalog_generation)
+    if instance.status == 'published':
+        transaction.on_commit(invalidate_facets)
+        transaction.on_commit(keywords.invalidate_cloud)
+        published_counts.refresh(**instance._deleted_relations)
+
+
+@receiver(post_delete, sender=StoredBlob)
+def blob_deleted(sender, instance, **kwargs):
+    search.remove_content(instance.pk)
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Subject)
+@receiver(post_delete, sender=Teacher)
+def reference_changed(sender, **kwargs):
+    """Названия предметов и имена руководителей хранятся в кэше фасетов и карточек"""
+    transaction.on_commit(reference.invalidate)
+    transaction.on_commit(invalidate_facets)
+    transaction.on_commit(bump_catalog_generation)
+
+
+@receiver(pre_save, sender=User)
+def remember_user_name(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Запоминает имя пользователя до сохранения (оно показывается в карточках проектов)"""
+    instance._previous_name = None
+    if instance.pk and not raw and not (update_fields and set(update_fields) <= {'last_login'}):
+        instance._previous_name = (
+            User.objects.filter(pk=instance.pk).values_list('first_name', 'last_name').first()
+        )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Имя руководителя берется из User; вход пользователя меняет только last_login"""
+    if raw or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    transaction.on_commit(reference.invalidate)
+    previous = getattr(instance, '_previous_name', None)
+    if previous is None or previous == (instance.first_name, instance.last_name):
+        return
+    # Имена руководителя и учеников выводятся в закэшированных карточках и фасетах
+    teacher_id, pupil_id = User.objects.filter(pk=instance.pk).values_list('teacher', 'pupil').get()
+    if teacher_id is not None:
+        transaction.on_commit(invalidate_facets)
+    if teacher_id is not None or pupil_id is not None:
+        transaction.on_commit(bump_catalog_generation)
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_save, sender=Pupil)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_delete, sender=Pupil)
+def profile_changed(sender, instance, raw=False, **kwargs):
+    """Роли пользователя в сессии (roles.py) перечитываются после изменения его профилей"""
+    if not raw:
+        transaction.on_commit(lambda: roles.invalidate(instance.user_id))
+
+
+@receiver(user_logged_in)
+def remember_roles(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        roles.remember(request.session, user)
+
+
+def projects_bulk_updated(queryset):
+    """Вызывается после queryset.update(), который не отправляет сигналы"""
+    search.reindex_projects(queryset)
+    pks = list(queryset.values_list('pk', flat=True))
+    transaction.on_commit(lambda: recommendations.schedule(pks))
+    published_counts.refresh_for_projects(queryset)
+    transaction.on_commit(keywords.invalidate_cloud)
+    transaction.on_commit(lambda: autocomplete.update_projects(pks))
+    transaction.on_commit(invalidate_status_counts)
+    transaction.on_commit(invalidate_facets)
+    transaction.on_commit(bump_catalog_generation)
@@ -0,0 +1,231 @@
+# projects/storage.py
+"""Хранилище файлов проектов с адресацией по содержимому.
+
+Файл сохраняется под именем из своего SHA-256 (projects/blobs/ab/cd/<sha256>.zip),
+поэтому одинаковые загрузки и повторные отправки без изменений занимают место один раз.
+Число ссылающихся проектов хранится в StoredBlob.ref_count; файлы без ссылок
+удаляет команда collect_blobs.
+"""
+import datetime
+import hashlib
+import os
+import uuid
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+
+READ_SIZE = 64 * 1024
+INCOMING_DIR = '.incoming'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for data in iter(lambda: file.read(READ_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def blob_name(directory, sha256, extension):
+    return '/'.join(filter(None, [directory, sha256[:2], sha256[2:4], f'{sha256}{extension.lower()}']))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Имя файла определяется содержимым; upload_to задает только общий каталог"""
+
+    def get_available_name(self, name, max_length=None):
+        # Имя все равно будет заменено на хеш содержимого в _save()
+        return name
+
+    def _spool(self, content):
+        """Пишет поток во временный файл хранилища, попутно считая хеш"""
+        incoming = self.path(INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        path = os.path.join(incoming, uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        with open(path, 'wb') as file:
+            for chunk in content.chunks():
+                file.write(chunk)
+                digest.update(chunk)
+        return path, digest.hexdigest()
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        if hasattr(content, 'temporary_file_path'):
+            # Файл уже на диске (большая загрузка или загрузка по частям): переносим без копирования
+            source = content.temporary_file_path()
+            sha256 = getattr(content, 'sha256', None) or file_sha256(source)
+            spooled = False
+        else:
+            source, sha256 = self._spool(content)
+            spooled = True
+
+        name = blob_name(directory, sha256, os.path.splitext(filename)[1])
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            if spooled:
+                os.remove(source)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            try:
+                if spooled:
+                    os.replace(source, full_path)
+                else:
+                    file_move_safe(source, full_path)
+            except FileExistsError:
+                # Тот же файл одновременно сохранил другой процесс
+                pass
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+
+        register_blob(name, sha256, os.path.getsize(full_path))
+        return name
+
+
+project_storage = ContentAddressedStorage()
+
+
+def get_project_storage():
+    return project_storage
+
+
+def register_blob(name, sha256, size):
+    """Запись о блобе; last_seen_at защищает свежий блоб от сборщика до сохранения проекта"""
+    from .models import StoredBlob
+
+    blob, created = StoredBlob.objects.get_or_create(name=name, defaults={'sha256': sha256, 'size': size})
+    if not created:
+        StoredBlob.objects.filter(pk=blob.pk).update(last_seen_at=timezone.now())
+    return blob
+
+
+def retain(name):
+    from .models import StoredBlob
+
+    if name:
+        StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+
+def release(name):
+    """Снимает ссылку на файл; у файла без ссылок удаляются превью, текст и оглавление"""
+    from .models import StoredBlob
+
+    if not name:
+        return
+    StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') - 1)
+    blob = StoredBlob.objects.filter(name=name, ref_count__lte=0).first()
+    if blob is not None:
+        discard_derived(blob)
+
+
+def discard_derived(blob):
+    """Удаляет то, что воркер построил по файлу; при новой ссылке он построит это заново"""
+    from django.core.files.storage import default_storage
+    from django.db import transaction
+
+    from . import archives, search
+    from .jobs import preview_name
+    from .models import ArchiveManifest, ExtractedText, Job, StoredBlob
+
+    ExtractedText.objects.filter(blob=blob).delete()
+    ArchiveManifest.objects.filter(blob=blob).delete()
+    search.remove_content(blob.pk)
+    # Без заданий jobs.enqueue_file снова поставит этапы в очередь
+    Job.objects.filter(blob=blob).delete()
+    StoredBlob.objects.filter(pk=blob.pk).update(preview='')
+    preview = preview_name(blob)
+    transaction.on_commit(lambda: default_storage.delete(preview))
+    transaction.on_commit(lambda: archives.forget(blob))
+
+
+def adopt(project):
+    """Переносит в хранилище по содержимому файл, сохраненный до его появления"""
+    from django.core.files import File
+
+    from .models import Project
+
+    old_name = project.project_file.name
+    with project_storage.open(old_name, 'rb') as file:
+        project.project_file.save(os.path.basename(old_name), File(file), save=False)
+    new_name = project.project_file.name
+    # update(), а не save(): содержимое и карточки проекта не меняются
+    Project.objects.filter(pk=project.pk).update(
+        project_file=new_name,
+        original_filename=project.original_filename or os.path.basename(old_name),
+    )
+    retain(new_name)
+    if not Project.objects.filter(project_file=old_name).exists():
+        project_storage.delete(old_name)
+    return new_name
+
+
+def recount():
+    """Пересчитывает ссылки по таблице проектов (после ручных правок или сбоев)"""
+    from django.db.models import Count, OuterRef, Subquery
+    from django.db.models.functions import Coalesce
+
+    from .models import Project, StoredBlob
+
+    references = (
+        Project.objects.filter(project_file=OuterRef('name'))
+        .order_by()
+        .values('project_file')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return StoredBlob.objects.update(ref_count=Coalesce(Subquery(references), 0))
+
+
+def collect_garbage(grace=3600, dry_run=False):
+    """Удаляет блобы без ссылок и файлы без записи StoredBlob старше grace секунд.
+
+    Возвращает (число файлов, освобождено байт).
+    """
+    from django.core.files.storage import default_storage
+
+    from .jobs import preview_name
+    from .models import Project, StoredBlob
+
+    cutoff = timezone.now() - datetime.timedelta(seconds=grace)
+    removed, freed = 0, 0
+
+    orphans = StoredBlob.objects.filter(ref_count__lte=0, last_seen_at__lt=cutoff)
+    for blob in orphans:
+        if dry_run:
+            removed += 1
+            freed += blob.size
+            continue
+        # Блоб мог снова понадобиться, пока шла сборка: тогда запись не удалится
+        deleted, _ = StoredBlob.objects.filter(pk=blob.pk, ref_count__lte=0, last_seen_at__lt=cutoff).delete()
+        if deleted:
+            project_storage.delete(blob.name)
+            # Превью остается, если ссылки обнулил recount(), а не release()
+            default_storage.delete(preview_name(blob))
+            removed += 1
+            freed += blob.size
+
+    # Файлы, оставшиеся после сбоев: без записи в базе или недописанные
+    known = set(StoredBlob.objects.values_list('name', flat=True))
+    known.update(Project.objects.exclude(project_file='').values_list('project_file', flat=True))
+    blobs_root = project_storage.path(_upload_directory())
+    for root in (blobs_root, project_storage.path(INCOMING_DIR)):
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, project_storage.location).replace(os.sep, '/')
+                modified = datetime.datetime.fromtimestamp(os.path.getmtime(path), tz=datetime.timezone.utc)
+                if name in known or modified >= cutoff:
+                    continue
+                removed += 1
+                freed += os.path.getsize(path)
+                if not dry_run:
+                    os.remove(path)
+    return removed, freed
+
+
+def _upload_directory():
+    from .models import Project
+
+    return Project._meta.get_field('project_file').upload_to.rstrip('/')
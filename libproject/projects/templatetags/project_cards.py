@@ -0,0 +1,20 @@
+# projects/templatetags/project_cards.py
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..fragments import render_cards
+from ..keywords import parse_keywords
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def project_cards(context, projects, variant='catalog'):
+    """Карточки проектов из кэша фрагментов: {% project_cards projects 'moderation' %}"""
+    return mark_safe(render_cards(projects, variant, request=context.get('request')))
+
+
+@register.filter
+def tag_names(keywords):
+    """Теги из строки ключевых слов без запроса к БД (совпадают с Keyword.name)"""
+    return parse_keywords(keywords)
@@ -1,3 +1,1273 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import (
+    archives, autocomplete, buffers, counters, fragments, jobs, keywords, processing, recommendations, reference, roles,
+    search, storage, uploads,
+)
+from .forms import ProjectForm
+from .models import (
+    ArchiveManifest, Comment, FragmentCacheStat, Job, Keyword, PendingRecommendation, Project, Subject, Teacher,
+    Pupil, StoredBlob, UploadSession,
+)
+from .moderation import moderate_projects, status_counts
+from .pagination import encode_cursor
+from .versions import bump_version
+
+
+def create_project(title='Проект', **fields):
+    """Проект с заполненными обязательными полями; по умолчанию опубликованный"""
+    fields = {'description': 'Описание', 'year': 2024, 'status': 'published', **fields}
+    return Project.objects.create(title=title, **fields)
+
+
+def create_teacher(username='teacher', department='', **user_fields):
+    return Teacher.objects.create(user=User.objects.create_user(username, **user_fields), department=department)
+
+
+def create_pupil(username='pupil', **user_fields):
+    return Pupil.objects.create(user=User.objects.create_user(username, **user_fields))
+
+
+@override_settings(PROJECT_COUNTERS_FLUSH_INTERVAL=0)
+class CacheTestCase(TestCase):
+    """Кэш и буферы процесса не очищаются между тестами, а в них номера поколений, фрагменты и счетчики"""
+
+    def setUp(self):
+        cache.clear()
+        counters._deltas.clear()
+        fragments._metrics.clear()
+
+
+class QueryBudgetTests(CacheTestCase):
+    """Число запросов страниц со списками проектов не должно зависеть от числа карточек"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.subject = Subject.objects.create(name='Базы данных', code='БД')
+        cls.teacher = create_teacher(
+            department='Кафедра ИТ', password='pass', first_name='Иван', last_name='Петров'
+        )
+        cls.pupil = create_pupil(password='pass', first_name='Анна', last_name='Сидорова')
+        cls.co_author = create_pupil('pupil2', password='pass', first_name='Петр', last_name='Орлов')
+
+    def create_projects(self, count, status='published'):
+        for number in range(count):
+            project = create_project(
+                f'Проект {number}',
+                description='Описание проекта о базах данных',
+                keywords='sql, базы данных',
+                subject=self.subject,
+                teacher=self.teacher,
+                status=status,
+            )
+            project.pupils.add(self.pupil, self.co_author)
+
+    def clear_cache(self, login=None):
+        """Сбрасывает кэш; вход заново сохраняет в сессии роли с новым номером поколения.
+
+        Снимок справочников живет в памяти процесса и в работе почти всегда актуален,
+        поэтому он перечитывается сразу, вне подсчета запросов страницы.
+        """
+        cache.clear()
+        reference.get_snapshot()
+        if login:
+            self.client.login(username=login, password='pass')
+
+    def assertConstantQueries(self, budget, url, login=None, status='published'):
+        """Проверяет бюджет запросов для 1 и для 9 карточек на странице"""
+        self.create_projects(1, status=status)
+        self.clear_cache(login)
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        self.create_projects(8, status=status)
+        self.clear_cache(login)
+        with self.assertNumQueries(budget):
+            self.client.get(url)
+
+    def test_index(self):
+        self.assertConstantQueries(4, reverse('index'))
+
+    # Седьмой запрос — облако тегов (кэшируется, здесь кэш сброшен)
+    def test_project_list(self):
+        self.assertConstantQueries(7, reverse('project_list'))
+
+    def test_project_list_search(self):
+        self.assertConstantQueries(7, reverse('project_list') + '?q=базы')
+
+    def test_project_list_facets_are_cached(self):
+        self.create_projects(3)
+        self.client.get(reverse('project_list') + '?year=2024')
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('project_list') + '?year=2024')
+        self.assertEqual(response.context['facets']['year'], [(2024, '2024', 3)])
+
+    def test_project_list_more(self):
+        self.create_projects(12)
+        first_page = self.client.get(reverse('project_list'))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('project_list_more') + '?' + first_page.context['next_query'])
+        self.assertIsNone(response.json()['next'])
+
+    def test_moderation_queue(self):
+        self.assertConstantQueries(6, reverse('moderation_queue'), login='teacher', status='pending')
+
+    def test_my_submissions(self):
+        self.assertConstantQueries(3, reverse('my_submissions'), login='pupil', status='pending')
+
+    def test_profile(self):
+        self.assertConstantQueries(4, reverse('profile'), login='pupil')
+
+
+class PaginationTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(12):
+            create_project(f'Проект {number}')
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        project = Project.objects.first()
+        Comment.objects.create(project=project, user=User.objects.create_user('reader'), text='Текст')
+        cursors = [
+            encode_cursor(['2024-01-01T00:00:00+00:00', 'abc']),
+            encode_cursor(['вчера', 1]),
+            encode_cursor([{'id': 1}, 1]),
+            encode_cursor([None, 1]),
+            encode_cursor([True, 1]),
+            encode_cursor(['2024-01-01T00:00:00+00:00', 10 ** 30]),
+            encode_cursor([1]),
+            'не base64',
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('project_list_more'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['html'].count('col-lg-4'), 9)
+                response = self.client.get(reverse('project_comments', args=[project.pk]), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                response = self.client.get(reverse('project_detail', args=[project.pk]), {'comments': cursor})
+                self.assertContains(response, 'Текст')
+
+    def test_search_cursor_is_checked_against_rank_type(self):
+        response = self.client.get(reverse('project_list_more'), {'q': 'проект', 'cursor': encode_cursor(['x', 1])})
+        self.assertEqual(response.status_code, 200)
+
+
+class PublishedCountTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.subject = Subject.objects.create(name='Физика', code='ФИЗ')
+        self.other_subject = Subject.objects.create(name='Химия', code='ХИМ')
+        self.teacher = create_teacher()
+        self.other_teacher = create_teacher('teacher2')
+        self.pupil = create_pupil()
+        self.co_author = create_pupil('pupil2')
+        self.project = create_project(status='pending', subject=self.subject, teacher=self.teacher)
+        self.project.pupils.add(self.pupil)
+
+    def counts(self, *objects):
+        return [type(obj).objects.get(pk=obj.pk).published_count for obj in objects]
+
+    def set_status(self, status):
+        self.project.status = status
+        self.project.save()
+
+    def test_publish_and_unpublish(self):
+        self.assertEqual(self.counts(self.subject, self.teacher, self.pupil), [0, 0, 0])
+        self.set_status('published')
+        self.assertEqual(self.counts(self.subject, self.teacher, self.pupil), [1, 1, 1])
+        self.set_status('revision')
+        self.assertEqual(self.counts(self.subject, self.teacher, self.pupil), [0, 0, 0])
+
+    def test_subject_and_teacher_change(self):
+        self.set_status('published')
+        self.project.subject = self.other_subject
+        self.project.teacher = self.other_teacher
+        self.project.save()
+        self.assertEqual(self.counts(self.subject, self.other_subject), [0, 1])
+        self.assertEqual(self.counts(self.teacher, self.other_teacher), [0, 1])
+
+    def test_pupils_changed_from_both_sides(self):
+        self.set_status('published')
+        self.project.pupils.add(self.co_author)
+        self.assertEqual(self.counts(self.pupil, self.co_author), [1, 1])
+        self.project.pupils.remove(self.pupil)
+        self.assertEqual(self.counts(self.pupil, self.co_author), [0, 1])
+        self.project.pupils.clear()
+        self.assertEqual(self.counts(self.pupil, self.co_author), [0, 0])
+
+        self.pupil.projects.add(self.project)
+        self.assertEqual(self.counts(self.pupil), [1])
+        self.pupil.projects.remove(self.project)
+        self.assertEqual(self.counts(self.pupil), [0])
+        self.co_author.projects.add(self.project)
+        self.co_author.projects.clear()
+        self.assertEqual(self.counts(self.co_author), [0])
+
+    def test_delete(self):
+        self.set_status('published')
+        self.project.delete()
+        self.assertEqual(self.counts(self.subject, self.teacher, self.pupil), [0, 0, 0])
+
+    def test_recount_command(self):
+        self.set_status('published')
+        Subject.objects.update(published_count=7)
+        Pupil.objects.update(published_count=7)
+        call_command('recount_published_projects', stdout=io.StringIO())
+        self.assertEqual(self.counts(self.subject, self.other_subject, self.pupil, self.co_author), [1, 0, 1, 0])
+
+
+class FragmentCacheTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = create_project('Первый проект')
+
+    def test_anonymous_index_is_cached(self):
+        self.client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Первый проект')
+        self.assertEqual(fragments.metrics()['page'][:2], (1, 1))
+
+    def test_edit_refreshes_cards(self):
+        self.client.get(reverse('project_list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.title = 'Новое название'
+            self.project.save()
+        self.assertContains(self.client.get(reverse('index')), 'Новое название')
+        self.assertContains(self.client.get(reverse('project_list')), 'Новое название')
+
+    def test_counter_flush_refreshes_only_changed_cards(self):
+        other = create_project('Второй проект')
+        self.client.get(reverse('project_list'))
+        self.client.get(reverse('index'))
+        generation = fragments.catalog_generation()
+        counters.increment(self.project.pk, 'views', 5)
+        counters.flush()
+        self.assertEqual(fragments.catalog_generation(), generation)
+
+        fragments.reset_metrics()
+        self.assertContains(self.client.get(reverse('project_list')), '<i class="fas fa-eye"></i> 5')
+        # Карточка второго проекта осталась в кэше
+        self.assertEqual(fragments.metrics()['card'][:2], (1, 1))
+        self.assertContains(self.client.get(reverse('index')), '<i class="fas fa-eye"></i> 5')
+        self.assertEqual(other.views, 0)
+
+    def test_metrics_are_stored_for_other_processes(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        fragments.flush_metrics()
+        fragments.flush_metrics()
+        self.assertEqual(FragmentCacheStat.objects.get(name='page').hits, 1)
+
+        # Команда запускается в другом процессе, где буфер пуст
+        fragments._metrics.clear()
+        output = io.StringIO()
+        call_command('fragment_cache_stats', stdout=output)
+        self.assertIn('page: попаданий 1, промахов 1', output.getvalue())
+
+    def test_participant_rename_refreshes_cards(self):
+        pupil = create_pupil(first_name='Анна', last_name='Смирнова')
+        self.project.pupils.add(pupil)
+        outsider = User.objects.create_user('outsider', first_name='Олег')
+        self.assertContains(self.client.get(reverse('project_list')), 'Анна Смирнова')
+        generation = fragments.catalog_generation()
+
+        # Вход и переименование пользователя без профиля не сбрасывают карточки
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(outsider)
+            outsider.first_name = 'Олежка'
+            outsider.save()
+            pupil.user.email = 'anna@example.com'
+            pupil.user.save()
+        self.assertEqual(fragments.catalog_generation(), generation)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pupil.user.last_name = 'Кузнецова'
+            pupil.user.save()
+        self.assertNotEqual(fragments.catalog_generation(), generation)
+        self.assertContains(self.client.get(reverse('project_list')), 'Анна Кузнецова')
+
+
+class CounterTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = create_project('Первый')
+        self.second = create_project('Второй')
+
+    def views(self, project):
+        project.refresh_from_db()
+        return project.views
+
+    def test_increment_and_flush(self):
+        for _ in range(3):
+            counters.increment(self.first.pk, 'views')
+        counters.increment(self.second.pk, 'downloads', 2)
+        self.assertEqual(counters.pending(self.first.pk)['views'], 3)
+        self.assertEqual(self.views(self.first), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counters.flush(), 2)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 2)
+        self.assertEqual(self.views(self.first), 3)
+        self.assertEqual(Project.objects.get(pk=self.second.pk).downloads, 2)
+        self.assertEqual(counters.pending(self.first.pk)['views'], 0)
+        self.assertEqual(counters.flush(), 0)
+
+    def test_failed_flush_keeps_increments(self):
+        counters.increment(self.first.pk, 'views', 2)
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), self.assertLogs('projects.counters', 'ERROR'):
+                counters.flush()
+        self.assertEqual(counters.pending(self.first.pk)['views'], 2)
+        counters.flush()
+        self.assertEqual(self.views(self.first), 2)
+
+    def test_increment_during_flush_is_kept(self):
+        counters.increment(self.first.pk, 'views')
+        update = Project.objects.none().update.__func__
+
+        def update_and_increment(queryset, **kwargs):
+            counters.increment(self.first.pk, 'views')
+            return update(queryset, **kwargs)
+
+        with mock.patch('django.db.models.query.QuerySet.update', update_and_increment):
+            counters.flush()
+        self.assertEqual(self.views(self.first), 1)
+        self.assertEqual(counters.pending(self.first.pk)['views'], 1)
+
+        counters.flush()
+        self.assertEqual(self.views(self.first), 2)
+
+    @override_settings(PROJECT_COUNTERS_FLUSH_INTERVAL=30)
+    def test_flush_thread_and_exit_hook(self):
+        with mock.patch('threading.Thread') as thread, mock.patch('atexit.register') as register, \
+                mock.patch.object(buffers, '_started_pid', None):
+            counters.increment(self.first.pk, 'views')
+            counters.increment(self.first.pk, 'views')
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        register.assert_called_once_with(buffers.flush_all)
+        self.assertIn(counters.flush, buffers._flushers)
+
+
+class ConditionalGetTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = create_project()
+        self.url = reverse('project_detail', args=[self.project.pk])
+
+    def test_detail_not_modified_still_counts_view(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.views + counters.pending(self.project.pk)['views'], 2)
+
+    def test_new_comment_changes_detail_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        user = User.objects.create_user('reader', password='pass')
+        Comment.objects.create(project=self.project, user=user, text='Отличная работа')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_catalog_not_modified_skips_queries(self):
+        etag = self.client.get(reverse('project_list'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('project_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.title = 'Новое название'
+            self.project.save()
+        self.assertEqual(self.client.get(reverse('project_list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_new_submission_changes_moderator_etag(self):
+        create_teacher(password='pass')
+        self.client.login(username='teacher', password='pass')
+        detail_etag = self.client.get(self.url)['ETag']
+        catalog_etag = self.client.get(reverse('project_list'))['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 304)
+
+        # Новый проект на модерации не меняет каталог, но меняет счетчик в шапке модератора
+        with self.captureOnCommitCallbacks(execute=True):
+            create_project('Новая работа', status='pending')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.context['projects_pending'], 1)
+        self.assertEqual(self.client.get(reverse('project_list'), HTTP_IF_NONE_MATCH=catalog_etag).status_code, 200)
+
+
+class TempMediaMixin:
+    """Файлы тестов пишутся во временные каталоги"""
+
+    def use_temp_dirs(self, *setting_names):
+        overrides = {}
+        for name in setting_names:
+            overrides[name] = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, overrides[name])
+        settings_override = override_settings(**overrides)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        return overrides
+
+
+class DownloadTests(TempMediaMixin, CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_dirs('MEDIA_ROOT')
+
+        self.project = create_project(project_file=SimpleUploadedFile('project.zip', b'0123456789'))
+        self.url = reverse('download_project', args=[self.project.pk])
+
+    def downloads(self):
+        self.project.refresh_from_db()
+        return self.project.downloads + counters.pending(self.project.pk)['downloads']
+
+    def test_full_download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.downloads(), 1)
+
+    def test_resume_is_not_counted(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=4-', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 4-9/10')
+        self.assertEqual(b''.join(response.streaming_content), b'456789')
+        self.assertEqual(self.downloads(), 1)
+
+    def test_changed_file_ignores_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=4-', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    @override_settings(PROJECT_FILES_OFFLOAD='x-accel-redirect', PROJECT_FILES_ACCEL_PREFIX='/protected-media/')
+    def test_offload_to_front_server(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.project.project_file.name)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(self.downloads(), 1)
+
+
+@override_settings(PROJECT_UPLOAD_CHUNK_SIZE=4)
+class ChunkedUploadTests(TempMediaMixin, CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dirs = self.use_temp_dirs('MEDIA_ROOT', 'PROJECT_UPLOAD_TEMP_DIR')
+        self.subject = Subject.objects.create(name='Информатика')
+        self.teacher = create_teacher()
+        create_pupil(password='pass')
+        self.client.login(username='pupil', password='pass')
+
+    def start(self, filename='project.zip', size=10):
+        response = self.client.post(reverse('upload_start'), {'filename': filename, 'size': size})
+        return response.status_code, response.json()
+
+    def send(self, upload_id, offset, data, checksum=None):
+        return self.client.post(
+            reverse('upload_session', args=[upload_id]), data=data,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_CHUNK_SHA256=checksum or hashlib.sha256(data).hexdigest(),
+        )
+
+    def test_rejects_unsupported_extension(self):
+        status, data = self.start(filename='virus.exe')
+        self.assertEqual(status, 400)
+
+    def test_resumable_upload_is_attached_to_project(self):
+        status, session = self.start()
+        self.assertEqual(status, 201)
+        upload_id = session['upload_id']
+        self.assertEqual(self.send(upload_id, 0, b'0123').json()['offset'], 4)
+
+        # Поврежденная часть отбрасывается, повтор с неверной позиции получает 409
+        self.assertEqual(self.send(upload_id, 4, b'4567', checksum='0' * 64).status_code, 400)
+        response = self.send(upload_id, 8, b'89')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 4)
+
+        self.send(upload_id, 4, b'4567')
+        session = self.send(upload_id, 8, b'89').json()
+        self.assertTrue(session['complete'])
+        self.assertEqual(session['sha256'], hashlib.sha256(b'0123456789').hexdigest())
+
+        response = self.client.post(reverse('project_add'), {
+            'title': 'Большой проект', 'description': 'Описание', 'subject': self.subject.pk,
+            'teacher': self.teacher.pk, 'year': 2024, 'upload_id': upload_id,
+        })
+        self.assertRedirects(response, reverse('my_submissions'))
+        project = Project.objects.get(title='Большой проект')
+        with project.project_file.open('rb') as file:
+            self.assertEqual(file.read(), b'0123456789')
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(self.dirs['PROJECT_UPLOAD_TEMP_DIR']), [])
+
+    def test_chunk_without_checksum(self):
+        status, session = self.start()
+        url = reverse('upload_session', args=[session['upload_id']])
+        self.assertTrue(session['chunk_sha256_required'])
+        response = self.client.post(
+            url, data=b'0123', content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 0)
+
+        with override_settings(PROJECT_UPLOAD_ALLOW_UNHASHED_CHUNKS=True):
+            response = self.client.post(
+                url, data=b'0123', content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0',
+            )
+        self.assertEqual(response.json()['offset'], 4)
+
+    def test_incomplete_upload_is_not_attached(self):
+        status, session = self.start()
+        self.send(session['upload_id'], 0, b'0123')
+        response = self.client.post(reverse('project_add'), {
+            'title': 'Проект', 'description': 'Описание', 'subject': self.subject.pk,
+            'teacher': self.teacher.pk, 'year': 2024, 'upload_id': session['upload_id'],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Project.objects.exists())
+
+    def test_invalid_form_does_not_keep_upload_open(self):
+        status, session = self.start(size=4)
+        self.send(session['upload_id'], 0, b'0123')
+        data = {
+            'title': '', 'description': 'Описание', 'subject': self.subject.pk,
+            'teacher': self.teacher.pk, 'year': 2024, 'upload_id': session['upload_id'],
+        }
+        with mock.patch.object(uploads, 'completed_file', wraps=uploads.completed_file) as completed_file:
+            response = self.client.post(reverse('project_add'), data)
+        self.assertEqual(response.status_code, 200)
+        completed_file.assert_not_called()
+
+        # Ошибка проверки модели после clean(): открытый файл закрывается
+        data['title'] = 'Проект'
+        form = ProjectForm(data, user=User.objects.get(username='pupil'))
+        with mock.patch.object(Project, 'clean', side_effect=ValidationError('Ошибка')):
+            self.assertFalse(form.is_valid())
+        self.assertTrue(form.cleaned_data['project_file'].closed)
+        self.assertTrue(UploadSession.objects.exists())
+
+
+class ContentAddressedStorageTests(TempMediaMixin, CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_dirs('MEDIA_ROOT')
+
+    def create_project(self, filename, content):
+        return create_project(status='draft', project_file=SimpleUploadedFile(filename, content))
+
+    def test_duplicate_uploads_share_blob(self):
+        first = self.create_project('first.zip', b'same content')
+        second = self.create_project('second.ZIP', b'same content')
+        self.assertEqual(first.project_file.name, second.project_file.name)
+        self.assertTrue(first.project_file.name.endswith(hashlib.sha256(b'same content').hexdigest() + '.zip'))
+        self.assertEqual(second.download_filename, 'second.ZIP')
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+
+    def test_unreferenced_blob_is_collected(self):
+        first = self.create_project('first.zip', b'old content')
+        second = self.create_project('second.zip', b'old content')
+        old_name = first.project_file.name
+
+        first.project_file = SimpleUploadedFile('first.zip', b'new content')
+        first.save()
+        second.delete()
+        self.assertEqual(StoredBlob.objects.get(name=old_name).ref_count, 0)
+
+        self.assertEqual(storage.collect_garbage(grace=0), (1, len(b'old content')))
+        self.assertFalse(storage.project_storage.exists(old_name))
+        self.assertTrue(storage.project_storage.exists(first.project_file.name))
+        self.assertEqual(storage.collect_garbage(grace=0), (0, 0))
+
+
+def make_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+class FileJobTests(TempMediaMixin, CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_dirs('MEDIA_ROOT')
+
+    def create_project(self, filename, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_project(status='draft', project_file=SimpleUploadedFile(filename, content))
+
+    def run_jobs(self):
+        for job in jobs.claim('test', limit=10):
+            jobs.run_now(job)
+
+    def test_archive_pipeline(self):
+        project = self.create_project('project.zip', make_zip({'src/main.py': 'print(1)', 'README.md': '# Проект'}))
+        self.assertEqual(Job.objects.get().stage, 'integrity')
+
+        self.run_jobs()
+        self.assertEqual(project.file_blob.kind, 'zip')
+        self.run_jobs()
+        listing = Job.objects.get(stage='listing')
+        self.assertEqual(listing.status, 'done')
+        self.assertEqual(listing.result['entries'], 2)
+
+    def test_archive_manifest_and_member_download(self):
+        project = self.create_project('project.zip', make_zip({'src/main.py': 'print(1)', 'README.md': '# Проект'}))
+        Project.objects.filter(pk=project.pk).update(status='published')
+        self.run_jobs()
+        self.run_jobs()
+        self.assertNotIn('manifest', Job.objects.get(stage='listing').result)
+
+        blob = project.file_blob
+        self.assertEqual([entry[:2] for entry in archives.get_manifest(blob)], [['src/main.py', 8], ['README.md', 14]])
+        with self.assertNumQueries(0):
+            archives.get_manifest(blob)
+        self.assertEqual(
+            [(row['name'], row['depth']) for row in archives.tree_for(blob)['rows']],
+            [('README.md', 0), ('src', 0), ('main.py', 1)],
+        )
+
+        response = self.client.get(reverse('project_detail', args=[project.pk]))
+        member_url = reverse('download_archive_member', args=[project.pk, 0])
+        self.assertContains(response, member_url)
+
+        response = self.client.get(member_url)
+        self.assertEqual(b''.join(response.streaming_content), b'print(1)')
+        self.assertEqual(response['Content-Length'], '8')
+        self.assertIn('main.py', response['Content-Disposition'])
+        self.assertEqual(self.client.get(member_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(reverse('download_archive_member', args=[project.pk, 5])).status_code, 404)
+
+    def test_mismatched_content_fails_permanently(self):
+        self.create_project('report.pdf', make_zip({'a.txt': 'не pdf'}))
+        self.run_jobs()
+        job = Job.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('pdf', job.error)
+
+    def test_missing_file_is_retried_later(self):
+        project = self.create_project('project.zip', make_zip({'a.txt': 'текст'}))
+        os.remove(project.project_file.path)
+        self.run_jobs()
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_after, job.updated_at)
+        self.assertEqual(jobs.claim('test', limit=10), [])
+
+    def test_document_text_is_searchable(self):
+        paragraphs = ''.join(
+            f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>'
+            for text in ['Введение', 'Измерения проводились на опытной установке с маятником.']
+        )
+        document = f'<w:document xmlns:w="{processing.WORD_NAMESPACE[1:-1]}"><w:body>{paragraphs}</w:body></w:document>'
+        project = self.create_project('report.docx', make_zip({'word/document.xml': document}))
+        Project.objects.filter(pk=project.pk).update(status='published')
+        search.index_project(Project.objects.get(pk=project.pk))
+        self.run_jobs()
+        self.run_jobs()
+
+        extracted = project.file_blob.text
+        self.assertIn('опытной установке', extracted.text)
+        self.assertNotIn('text', Job.objects.get(stage='extract').result)
+
+        found = list(search.search_projects(Project.objects.published(), 'маятники'))
+        self.assertEqual(found, [project])
+        search.attach_snippets(found, 'маятники')
+        self.assertIn('<mark>маятником</mark>', found[0].search_snippet)
+
+        response = self.client.get(reverse('project_list'), {'q': 'маятник'})
+        self.assertContains(response, '<mark>маятником</mark>')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            project.delete()
+        storage.collect_garbage(grace=-1)
+        self.assertFalse(search.search_projects(Project.objects.all(), 'маятник').exists())
+
+    def test_unreferenced_blob_loses_derived_data(self):
+        content = make_zip({'src/main.py': 'print(1)'})
+        project = self.create_project('project.zip', content)
+        self.run_jobs()
+        self.run_jobs()
+        blob = project.file_blob
+        self.assertTrue(archives.get_manifest(blob))
+        # Превью строит PyMuPDF только для PDF; здесь файл превью записывается вручную
+        preview = default_storage.save(jobs.preview_name(blob), io.BytesIO(b'png'))
+        StoredBlob.objects.filter(pk=blob.pk).update(preview=preview)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            project.delete()
+        blob.refresh_from_db()
+        self.assertEqual((blob.ref_count, blob.preview.name), (0, ''))
+        self.assertFalse(default_storage.exists(preview))
+        self.assertFalse(ArchiveManifest.objects.filter(blob=blob).exists())
+        self.assertFalse(Job.objects.filter(blob=blob).exists())
+        self.assertIsNone(archives.get_manifest(blob))
+
+        # Тот же файл загружен снова: этапы выполняются заново
+        self.create_project('again.zip', content)
+        self.run_jobs()
+        self.run_jobs()
+        self.assertEqual([entry[0] for entry in archives.get_manifest(blob)], ['src/main.py'])
+
+    def test_worker_command(self):
+        self.create_project('project.zip', make_zip({'a.txt': 'текст'}))
+        call_command('run_worker', once=True, processes=1, stdout=io.StringIO())
+        self.assertEqual(
+            sorted(Job.objects.values_list('stage', 'status')),
+            [('integrity', 'done'), ('listing', 'done')],
+        )
+
+
+class ExportTests(TempMediaMixin, CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_dirs('MEDIA_ROOT')
+        self.teacher = create_teacher(password='pass')
+        self.subject = Subject.objects.create(name='Физика')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.projects = [
+                create_project(
+                    f'Проект {number}', subject=self.subject, teacher=self.teacher,
+                    project_file=SimpleUploadedFile(f'работа {number}.zip', make_zip({'a.txt': str(number)})),
+                )
+                for number in range(2)
+            ]
+            create_project('Без файла')
+
+    def test_streams_files_and_metadata(self):
+        self.client.login(username='teacher', password='pass')
+        response = self.client.get(reverse('export_projects'), {'year': 2024})
+        content = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(content))
+
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            project = self.projects[0]
+            self.assertEqual(
+                archive.read(f'{project.pk}/работа 0.zip'),
+                project.project_file.storage.open(project.project_file.name).read(),
+            )
+            rows = archive.read('projects.csv').decode('utf-8-sig').splitlines()
+        self.assertEqual(len(rows), 4)
+        self.assertIn('Без файла', rows[1])
+
+    def test_only_teachers(self):
+        User.objects.create_user('reader', password='pass')
+        self.client.login(username='reader', password='pass')
+        self.assertRedirects(self.client.get(reverse('export_projects')), reverse('project_list'))
+
+    @override_settings(PROJECT_EXPORT_MAX_PROJECTS=2)
+    def test_too_many_projects(self):
+        self.client.login(username='teacher', password='pass')
+        response = self.client.get(reverse('export_projects'), {'year': 2024})
+        self.assertEqual(response.status_code, 302)
+
+
+class RecommendationTests(CacheTestCase):
+    def publish(self, title, description):
+        with self.captureOnCommitCallbacks(execute=True):
+            project = create_project(title, description=description)
+        recommendations.process_pending()
+        return project
+
+    def test_similar_projects_are_updated_on_publish(self):
+        robot = self.publish('Робот на Arduino', 'Сборка робота и программирование датчиков')
+        plants = self.publish('Рост растений', 'Наблюдение за ростом растений при разном освещении')
+        rover = self.publish('Колесный робот', 'Программирование робота с датчиками расстояния')
+
+        self.assertEqual(recommendations.similar_projects(rover), [robot])
+        self.assertEqual(recommendations.similar_projects(robot), [rover])
+        self.assertEqual(recommendations.similar_projects(plants), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rover.status = 'archived'
+            rover.save()
+        self.assertEqual(recommendations.process_pending(), 1)
+        self.assertEqual(recommendations.similar_projects(robot), [])
+
+        recommendations.rebuild()
+        with self.assertNumQueries(1):
+            self.assertEqual(recommendations.similar_projects(robot), [])
+
+    @override_settings(PROJECT_SIMILAR_TOP_K=1)
+    def test_edit_keeps_project_in_neighbour_lists(self):
+        robot = self.publish('Робот', 'Сборка робота и датчиков моторов')
+        rover = self.publish('Робот с колесами', 'Сборка робота и датчиков моторов колес')
+        greenhouse = self.publish('Теплица', 'Робот для полива растений')
+        # Сходство несимметрично по спискам: у теплицы ближайший — робот, у робота — колесный робот
+        self.assertEqual(recommendations.similar_projects(greenhouse), [robot])
+        self.assertEqual(recommendations.similar_projects(robot), [rover])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            robot.description += ' с пультом'
+            robot.save()
+        # Пересчет не выполняется в запросе
+        self.assertEqual(recommendations.process_pending(), 1)
+        self.assertEqual(recommendations.similar_projects(greenhouse), [robot])
+        self.assertEqual(recommendations.similar_projects(rover), [robot])
+
+    def test_project_queued_again_during_processing_stays_in_queue(self):
+        robot = self.publish('Робот', 'Сборка робота')
+        update_projects = recommendations.update_projects
+
+        def update_and_requeue(project_ids):
+            update_projects(project_ids)
+            recommendations.schedule([robot.pk])
+
+        recommendations.schedule([robot.pk])
+        with mock.patch.object(recommendations, 'update_projects', update_and_requeue):
+            self.assertEqual(recommendations.process_pending(), 1)
+        self.assertTrue(PendingRecommendation.objects.filter(project=robot).exists())
+        self.assertEqual(recommendations.process_pending(), 1)
+        self.assertFalse(PendingRecommendation.objects.exists())
+
+    def test_same_subject_is_shown_until_table_is_built(self):
+        subject = Subject.objects.create(name='Биология')
+        with self.captureOnCommitCallbacks(execute=True):
+            plants = create_project('Рост растений', description='Освещение и полив', subject=subject)
+            birds = create_project('Птицы парка', description='Наблюдение за кормушками', subject=subject)
+        self.assertEqual(recommendations.similar_projects(plants), [birds])
+
+        recommendations.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_project('Робот', description='Сборка робота')
+            create_project('Колесный робот', description='Сборка робота с колесами')
+        recommendations.process_pending()
+        self.assertEqual(recommendations.similar_projects(plants), [])
+
+    def test_detail_page_shows_recommendations(self):
+        robot = self.publish('Робот на Arduino', 'Сборка робота')
+        rover = self.publish('Колесный робот', 'Программирование робота')
+        response = self.client.get(reverse('project_detail', args=[robot.pk]))
+        self.assertEqual(list(response.context['similar_projects']), [rover])
+
+
+class KeywordTests(CacheTestCase):
+    def create(self, keywords, status='published'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_project(status=status, keywords=keywords)
+
+    def test_keywords_are_parsed_into_tags(self):
+        project = self.create('Машинное  обучение, Python;python, ')
+        self.assertEqual(sorted(project.tags.values_list('name', flat=True)), ['python', 'машинное обучение'])
+        self.assertEqual(Keyword.objects.get(name='python').published_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            project.keywords = 'python'
+            project.save()
+        self.assertEqual(Keyword.objects.get(name='машинное обучение').published_count, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            project.status = 'archived'
+            project.save()
+        self.assertEqual(Keyword.objects.get(name='python').published_count, 0)
+
+    def test_tag_filter_and_cloud(self):
+        tagged = self.create('python, web')
+        self.create('python')
+        self.create('web', status='pending')
+
+        response = self.client.get(reverse('project_list'), {'tag': 'Web'})
+        self.assertEqual([project.pk for project in response.context['page']], [tagged.pk])
+        self.assertEqual(keywords.tag_cloud(), [('python', 2, 5), ('web', 1, 1)])
+        with self.assertNumQueries(0):
+            keywords.tag_cloud()
+
+
+class SearchIndexTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project = create_project(
+                'Солнечная электростанция', description='Модель для кабинета физики', keywords='энергетика',
+            )
+
+    def found(self, query, queryset=None):
+        queryset = Project.objects.all() if queryset is None else queryset
+        return [project.title for project in search.search_projects(queryset, query)]
+
+    def test_created_project_is_indexed(self):
+        self.assertEqual(self.found('электростанция'), ['Солнечная электростанция'])
+        self.assertEqual(self.found('энергетика'), ['Солнечная электростанция'])
+        with self.captureOnCommitCallbacks(execute=True):
+            create_project('Теплица', status='pending')
+        self.assertEqual(self.found('теплица'), [])
+
+    def test_edit_replaces_index_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.title = 'Ветряная электростанция'
+            self.project.save()
+        self.assertEqual(self.found('ветряная'), ['Ветряная электростанция'])
+        self.assertEqual(self.found('солнечная'), [])
+
+    def test_unpublish_and_delete_remove_index_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.status = 'revision'
+            self.project.save()
+        self.assertEqual(self.found('электростанция'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.status = 'published'
+            self.project.save()
+        self.assertEqual(self.found('электростанция'), ['Солнечная электростанция'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {search.FTS_TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_bulk_moderation_reindexes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pending = create_project('Теплица', status='pending')
+        self.assertEqual(self.found('теплица'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            moderate_projects([pending.pk], 'approve')
+        self.assertEqual(self.found('теплица'), ['Теплица'])
+        with self.captureOnCommitCallbacks(execute=True):
+            moderate_projects([pending.pk, self.project.pk], 'reject')
+        self.assertEqual(self.found('теплица'), [])
+        self.assertEqual(self.found('электростанция'), [])
+
+    def test_word_forms_and_field_weights(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_project('Умная теплица', description='Полив растений по расписанию')
+            create_project('Гербарий', description='Коллекция растений и электростанций')
+        # Запрос в другой форме находит слово по основе
+        self.assertEqual(self.found('теплицы'), ['Умная теплица'])
+        self.assertCountEqual(self.found('растения'), ['Умная теплица', 'Гербарий'])
+        # Совпадение в названии весит больше совпадения в описании
+        self.assertEqual(self.found('электростанций'), ['Солнечная электростанция', 'Гербарий'])
+
+
+class AutocompleteTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        autocomplete.invalidate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project = create_project('Солнечная электростанция', keywords='энергетика')
+
+    def titles(self, query):
+        return [title for _, title, _ in autocomplete.get_index().search(query)]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.titles('солн'), ['Солнечная электростанция'])
+        self.assertEqual(self.titles('электро'), ['Солнечная электростанция'])
+        self.assertEqual(self.titles('энерг'), ['Солнечная электростанция'])
+        self.assertEqual(self.titles('ветер'), [])
+
+    def test_local_changes_do_not_rebuild(self):
+        autocomplete.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.title = 'Ветряная электростанция'
+            self.project.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles('ветр'), ['Ветряная электростанция'])
+        self.assertEqual(self.titles('солн'), [])
+
+    def test_unpublished_saves_keep_version(self):
+        autocomplete.get_index()
+        version = autocomplete.current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            draft = create_project('Черновик', status='pending')
+            draft.description = 'Новое описание'
+            draft.save()
+            self.project.description = 'Новое описание'
+            self.project.save()
+        self.assertEqual(autocomplete.current_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            draft.status = 'published'
+            draft.save()
+        self.assertNotEqual(autocomplete.current_version(), version)
+        self.assertEqual(self.titles('черн'), ['Черновик'])
+
+    def test_other_process_change_rebuilds_index(self):
+        autocomplete.get_index()
+        # Другой процесс изменил проект и номер поколения; здесь сигналов не было
+        Project.objects.filter(pk=self.project.pk).update(title='Приливная электростанция')
+        bump_version(autocomplete.VERSION_NAME)
+        self.assertEqual(self.titles('прил'), ['Приливная электростанция'])
+        self.assertEqual(self.titles('солн'), [])
+
+
+class FuzzySearchTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for title in ['Программирование микроконтроллеров', 'Экология леса', 'Программирование игр']:
+            with self.captureOnCommitCallbacks(execute=True):
+                create_project(title)
+
+    def test_suggestion(self):
+        index = autocomplete.get_fuzzy_index()
+        self.assertEqual(index.suggest('програмирование микроконтролеров'), 'программирование микроконтроллеров')
+        self.assertIsNone(index.suggest('экология'))
+        self.assertIsNone(index.suggest('квантовая'))
+
+    def test_project_list_searches_corrected_query(self):
+        response = self.client.get(reverse('project_list'), {'q': 'микроконтролеры'})
+        self.assertEqual(response.context['original_query'], 'микроконтролеры')
+        self.assertEqual([project.title for project in response.context['page']], ['Программирование микроконтроллеров'])
+        self.assertContains(response, 'ничего не найдено')
+
+    def test_search_api_adds_similar_titles(self):
+        response = self.client.get(reverse('search_api'), {'q': 'экалогия'})
+        self.assertEqual([item['title'] for item in response.json()['results']], ['Экология леса'])
+
+
+class CommentTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = create_project()
+        self.user = User.objects.create_user('reader', password='pass')
+        self.url = reverse('project_comments', args=[self.project.pk])
+
+    def create_comments(self, count):
+        for number in range(count):
+            user = User.objects.create_user(f'reader{number}', password='pass')
+            Comment.objects.create(project=self.project, user=user, text=f'Комментарий {number}')
+
+    def test_detail_shows_first_page(self):
+        self.create_comments(25)
+        response = self.client.get(reverse('project_detail', args=[self.project.pk]))
+        self.assertEqual(len(response.context['comments']), 20)
+        self.assertTrue(response.context['comments'].has_next)
+        self.assertContains(response, 'Комментарий 24')
+        self.assertNotContains(response, 'Комментарий 4<')
+
+    def test_next_page_queries_do_not_depend_on_comments(self):
+        self.create_comments(25)
+        cursor = self.client.get(reverse('project_detail', args=[self.project.pk])).context['comments'].next_cursor
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url, {'cursor': cursor}).json()
+        self.assertIsNone(data['next'])
+        self.assertEqual(data['html'].count('class="comment '), 5)
+
+    def test_ajax_post_returns_new_comment_only(self):
+        self.client.login(username='reader', password='pass')
+        response = self.client.post(self.url, {'text': 'Отличная работа'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('Отличная работа', response.json()['html'])
+        self.assertEqual(counters.pending(self.project.pk)['views'], 0)
+
+        response = self.client.post(self.url, {'text': ''}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.project.comments.count(), 1)
+
+    def test_form_post_redirects_without_counting_view(self):
+        self.client.login(username='reader', password='pass')
+        response = self.client.post(reverse('project_detail', args=[self.project.pk]), {'text': 'Спасибо'})
+        self.assertRedirects(response, reverse('project_detail', args=[self.project.pk]), fetch_redirect_response=False)
+        self.assertEqual(counters.pending(self.project.pk)['views'], 0)
+        self.assertEqual(self.project.comments.get().user, self.user)
+
+
+class RoleTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pupil = create_pupil(password='pass')
+        self.user = self.pupil.user
+        self.client.login(username='pupil', password='pass')
+
+    def test_roles_are_kept_in_session(self):
+        response = self.client.get(reverse('index'))
+        self.assertTrue(response.context['roles'].is_pupil)
+        self.assertFalse(response.context['roles'].is_moderator)
+        self.assertEqual(self.client.session[roles.SESSION_KEY]['pupil'], self.pupil.pk)
+
+    def test_new_profile_refreshes_roles(self):
+        project = create_project(status='pending')
+        self.assertEqual(self.client.post(reverse('moderate_project', args=[project.pk])).status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher = Teacher.objects.create(user=self.user)
+        response = self.client.post(reverse('moderate_project', args=[project.pk]), {'action': 'approve'})
+        self.assertRedirects(response, reverse('moderation_queue'), fetch_redirect_response=False)
+        project.refresh_from_db()
+        self.assertEqual((project.status, project.moderated_by), ('published', teacher))
+
+
+class ReferenceDataTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        Subject.objects.create(name='Физика', code='ФИЗ')
+        create_teacher(first_name='Иван', last_name='Петров')
+
+    def test_form_choices_from_snapshot(self):
+        reference.get_snapshot()
+        with self.assertNumQueries(0):
+            form = ProjectForm()
+            html = str(form['subject']) + str(form['teacher'])
+        self.assertIn('Физика', html)
+        self.assertIn('Иван Петров', html)
+
+    def test_changes_refresh_snapshot(self):
+        version = reference.get_snapshot().version
+        with self.captureOnCommitCallbacks(execute=True):
+            Subject.objects.create(name='Астрономия', code='АСТ')
+        snapshot = reference.get_snapshot()
+        self.assertNotEqual(snapshot.version, version)
+        self.assertEqual([subject.name for subject in snapshot.subjects], ['Астрономия', 'Физика'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(username='teacher').update(first_name='Пётр')
+            user = User.objects.get(username='teacher')
+            user.last_name = 'Иванов'
+            user.save()
+        self.assertEqual([teacher.name for teacher in reference.get_snapshot().teachers], ['Пётр Иванов'])
+
+
+class LookupTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(25):
+            Subject.objects.create(name=f'Предмет {number:02}', code=f'П{number}')
+        for name in ['Анна', 'Антон', 'Борис']:
+            create_pupil(name.lower(), password='pass', first_name=name)
+        self.client.login(username='борис', password='pass')
+
+    def test_subjects_are_paginated_from_snapshot(self):
+        reference.get_snapshot()
+        with self.assertNumQueries(2):  # сессия и пользователь
+            data = self.client.get(reverse('lookup', args=['subject']), {'q': 'предмет'}).json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertTrue(data['pagination']['more'])
+        data = self.client.get(reverse('lookup', args=['subject']), {'q': 'предмет', 'page': 2}).json()
+        self.assertEqual([item['text'] for item in data['results']][0], 'Предмет 20')
+        self.assertFalse(data['pagination']['more'])
+
+    def test_pupils_by_name_prefix(self):
+        data = self.client.get(reverse('lookup', args=['pupil']), {'q': 'ан'}).json()
+        self.assertEqual([item['text'] for item in data['results']], ['Анна', 'Антон'])
+        self.assertEqual(self.client.get(reverse('lookup', args=['user'])).status_code, 404)
+
+    def test_large_select_renders_only_selected_choice(self):
+        subject = Subject.objects.get(name='Предмет 07')
+        form = ProjectForm(initial={'subject': subject.pk})
+        form.fields['subject'].widget.max_choices = 10
+        html = str(form['subject'])
+        self.assertIn('Предмет 07', html)
+        self.assertNotIn('Предмет 08', html)
+        self.assertIn('data-lookup-url="/api/lookup/subject/"', html)
+
+
+class BulkModerationTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = create_teacher(password='pass')
+        self.projects = [create_project(f'Проект {number}', status='pending') for number in range(3)]
+        self.client.login(username='teacher', password='pass')
+
+    def test_bulk_approve_reports_each_project(self):
+        self.projects[2].status = 'published'
+        self.projects[2].save()
+        ids = [project.pk for project in self.projects] + [999]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('moderate_bulk'), {'action': 'approve', 'projects': ids},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+        data = response.json()
+        self.assertEqual(data['counts'], {'updated': 2, 'unchanged': 1, 'missing': 1})
+        self.assertEqual(data['results'][str(ids[3])], 'missing')
+        for project in self.projects[:2]:
+            project.refresh_from_db()
+            self.assertEqual(project.status, 'published')
+            self.assertEqual(project.moderated_by, self.teacher)
+            self.assertIsNotNone(project.published_at)
+            self.assertEqual(project.updated_at, project.moderated_at)
+        self.assertEqual(status_counts()['published'], 3)
+        self.assertEqual(autocomplete.get_index().search('проект', limit=5)[0][1], 'Проект 0')
+
+    def test_bulk_moderation_updates_autocomplete_in_place(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            published = create_project('Опубликованный проект')
+        index = autocomplete.get_index()
+        autocomplete.get_fuzzy_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            moderate_projects([self.projects[0].pk], 'approve')
+            moderate_projects([published.pk], 'revision')
+        self.assertIsNotNone(index.version)
+        with self.assertNumQueries(0):
+            self.assertEqual([title for _, title, _ in autocomplete.get_index().search('проект')], ['Проект 0'])
+            self.assertEqual(autocomplete.get_fuzzy_index().version, index.version)
+
+    def test_one_update_per_action(self):
+        ids = [project.pk for project in self.projects]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('moderate_bulk'), {'action': 'reject', 'projects': ids, 'comment': 'Нет файла'})
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "projects_project"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(set(Project.objects.values_list('status', 'moderation_comment')), {('rejected', 'Нет файла')})
+
+    def test_repeated_action_records_new_comment(self):
+        project = self.projects[0]
+        moderate_projects([project.pk], 'revision', comment='Добавьте выводы')
+        other = create_teacher('teacher2', password='pass')
+        self.client.login(username='teacher2', password='pass')
+        response = self.client.post(
+            reverse('moderate_project', args=[project.pk]), {'action': 'revision', 'comment': 'Нет списка литературы'}
+        )
+        self.assertRedirects(response, reverse('moderation_queue'), fetch_redirect_response=False)
+        project.refresh_from_db()
+        self.assertEqual(project.status, 'revision')
+        self.assertEqual((project.moderation_comment, project.moderated_by), ('Нет списка литературы', other))
+
+    def test_pupil_cannot_moderate(self):
+        create_pupil(password='pass')
+        self.client.login(username='pupil', password='pass')
+        response = self.client.post(reverse('moderate_bulk'), {'action': 'approve', 'projects': [self.projects[0].pk]})
+        self.assertEqual(response.status_code, 403)
+
+
+class ModerationStatsTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = create_project(status='pending')
+
+    def test_counts_are_cached(self):
+        with self.assertNumQueries(1):
+            status_counts()
+        with self.assertNumQueries(0):
+            self.assertEqual(status_counts()['pending'], 1)
+
+    def test_status_change_invalidates_counts(self):
+        status_counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.status = 'published'
+            self.project.save()
+        counts = status_counts()
+        self.assertEqual(counts['pending'], 0)
+        self.assertEqual(counts['published'], 1)
+
+    def test_other_edits_keep_counts(self):
+        status_counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.title = 'Новое название'
+            self.project.save()
+        with self.assertNumQueries(0):
+            status_counts()
@@ -0,0 +1,144 @@
+# projects/uploads.py
+"""Загрузка файлов проектов по частям с докачкой.
+
+Клиент открывает сессию (имя и размер файла), затем отправляет части по порядку
+с заголовком Upload-Offset. Каждая часть сразу дописывается во временный файл,
+память процесса не зависит от размера файла. После обрыва клиент узнает у сервера,
+сколько байт уже получено, и продолжает с этого места. Когда получен весь файл,
+считается его SHA-256, и файл можно прикрепить к проекту через ProjectForm (upload_id).
+"""
+import datetime
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Project, UploadSession
+from .storage import file_sha256
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class SessionFile(File):
+    """Собранный файл; хранилище переносит его на место без копирования и повторного хеширования"""
+
+    def __init__(self, file, name, sha256):
+        super().__init__(file, name=name)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(session):
+    return os.path.join(settings.PROJECT_UPLOAD_TEMP_DIR, f'{session.pk}.part')
+
+
+def start(user, filename, size):
+    """Открывает сессию загрузки; имя и размер проверяются до передачи данных"""
+    filename = os.path.basename(filename or '')
+    if not filename:
+        raise UploadError('Не указано имя файла')
+    if size <= 0:
+        raise UploadError('Пустой файл')
+    if size > settings.PROJECT_UPLOAD_MAX_SIZE:
+        raise UploadError('Файл слишком большой', status=413)
+    try:
+        for validator in Project._meta.get_field('project_file').validators:
+            validator(File(None, name=filename))
+    except ValidationError as error:
+        raise UploadError(' '.join(error.messages))
+
+    os.makedirs(settings.PROJECT_UPLOAD_TEMP_DIR, exist_ok=True)
+    session = UploadSession.objects.create(user=user, filename=filename, size=size)
+    open(part_path(session), 'wb').close()
+    return session
+
+
+def write_chunk(session_id, offset, stream, length, chunk_sha256=''):
+    """Дописывает часть с позиции offset; возвращает обновленную сессию.
+
+    Часть принимается, только если offset совпадает с уже полученным объемом
+    (иначе 409 — клиент должен спросить актуальную позицию). Оборванная или
+    поврежденная часть отбрасывается целиком. Часть без SHA-256 принимается,
+    только если это разрешено настройкой PROJECT_UPLOAD_ALLOW_UNHASHED_CHUNKS.
+    """
+    if not chunk_sha256 and not settings.PROJECT_UPLOAD_ALLOW_UNHASHED_CHUNKS:
+        raise UploadError('Не указан SHA-256 части')
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session_id)
+        if session.is_complete:
+            raise UploadError('Файл уже загружен', status=409)
+        if offset != session.received:
+            raise UploadError('Неверная позиция части', status=409)
+        if length <= 0 or offset + length > session.size:
+            raise UploadError('Неверный размер части')
+
+        digest = hashlib.sha256()
+        written = 0
+        with open(part_path(session), 'r+b') as part:
+            part.truncate(offset)
+            part.seek(offset)
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                part.write(data)
+                digest.update(data)
+                written += len(data)
+            if written != length or (chunk_sha256 and digest.hexdigest() != chunk_sha256.lower()):
+                part.truncate(offset)
+                raise UploadError('Часть повреждена или получена не полностью')
+
+        session.received = offset + length
+        if session.received == session.size:
+            session.sha256 = file_sha256(part_path(session))
+        session.save()
+    return session
+
+
+def status(session):
+    return {
+        'upload_id': str(session.pk),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.received,
+        'chunk_size': settings.PROJECT_UPLOAD_CHUNK_SIZE,
+        'chunk_sha256_required': not settings.PROJECT_UPLOAD_ALLOW_UNHASHED_CHUNKS,
+        'complete': session.is_complete,
+        'sha256': session.sha256,
+    }
+
+
+def completed_file(session):
+    return SessionFile(open(part_path(session), 'rb'), session.filename, session.sha256)
+
+
+def discard(session):
+    """Удаляет сессию и временный файл, если он еще не перенесен в хранилище"""
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def clear_stale(max_age=None):
+    """Удаляет брошенные загрузки; возвращает их число"""
+    if max_age is None:
+        max_age = settings.PROJECT_UPLOAD_SESSION_TTL
+    cutoff = timezone.now() - datetime.timedelta(seconds=max_age)
+    stale = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+    for session in stale:
+        discard(session)
+    return len(stale)
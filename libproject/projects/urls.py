@@ -8,10 +8,16 @@ urlpatterns = [
 
     # Проекты
     path('projects/', views.project_list, name='project_list'),
+    path('projects/more/', views.project_list_more, name='project_list_more'),
+    path('projects/export/', views.export_projects, name='export_projects'),
     path('projects/add/', views.project_add, name='project_add'),
     path('projects/<int:pk>/', views.project_detail, name='project_detail'),
+    path('projects/<int:pk>/comments/', views.project_comments, name='project_comments'),
     path('projects/<int:pk>/edit/', views.project_edit, name='project_edit'),
     path('projects/<int:pk>/download/', views.download_project, name='download_project'),
+    path('projects/<int:pk>/files/<int:index>/', views.download_archive_member, name='download_archive_member'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_session, name='upload_session'),
 
     # Авторизация
     path('register/', views.register_view, name='register'),
@@ -20,10 +26,12 @@ urlpatterns = [
     path('profile/', views.profile_view, name='profile'),
     path('moderation/', views.moderation_queue, name='moderation_queue'),
     path('moderation/<int:pk>/', views.moderate_project, name='moderate_project'),
+    path('moderation/bulk/', views.moderate_bulk, name='moderate_bulk'),
 
     # Мои проекты
     path('my-projects/', views.my_submissions, name='my_submissions'),
     path('resubmit/<int:pk>/', views.resubmit_project, name='resubmit_project'),
     # API - ИСПРАВЛЕНО: используем правильное имя функции
     path('api/search/', views.search_api, name='search_api'),  # Было project_search_api, стало search_api
+    path('api/lookup/<str:kind>/', views.lookup, name='lookup'),
 ]
\ No newline at end of file
@@ -0,0 +1,26 @@
+# projects/versions.py
+"""Номера поколений в общем кэше: по ним процессы узнают, что локальные данные устарели"""
+import time
+
+from django.core.cache import cache
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    version = cache.get(_key(name))
+    if version is None:
+        # Начальное значение от времени: после вытеснения ключа номер не повторится
+        cache.add(_key(name), int(time.time() * 1000), timeout=None)
+        version = cache.get(_key(name))
+    return version
+
+
+def bump_version(name):
+    try:
+        return cache.incr(_key(name))
+    except ValueError:
+        get_version(name)
+        return cache.incr(_key(name))
@@ -1,20 +1,32 @@
 # projects/views.py
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
-from django.db.models import Q, Count
-from django.core.paginator import Paginator
-from django.http import FileResponse, JsonResponse
-from .models import Project, Subject, Teacher, Pupil, Comment
+from django.db.models import Q, Count, Max
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import content_disposition_header, urlencode
+from django.views.decorators.http import require_POST
+from .models import Project, Subject, Teacher, Pupil, Comment, UploadSession
 from .forms import UserRegistrationForm, ProjectForm, CommentForm
-from django.utils import timezone
+from . import archives, autocomplete, export, lookups, recommendations, reference, uploads
+from .catalog import facet_counts, filter_projects, parse_filters
+from .conditional import conditional_page, make_etag
+from .downloads import serve_file
+from .fragments import cached_page, catalog_state
+from .moderation import ACTIONS, MAX_BATCH, MISSING, UNCHANGED, UPDATED, moderate_projects, status_counts
+from .pagination import KeysetPaginator, estimate_count
+from .keywords import tag_cloud
+from .search import attach_snippets
 
 
-def index(request):
-    """Главная страница"""
-    latest_projects = Project.objects.filter(status='published')[:6]
-    popular_projects = Project.objects.filter(status='published').order_by('-views')[:3]
+def _index_context():
+    latest_projects = Project.objects.published().cards()[:6]
+    popular_projects = Project.objects.published().cards().order_by('-views')[:3]
 
     # stats = {
     #     'projects': Project.objects.filter(status='published').count(),
@@ -23,150 +35,175 @@ def index(request):
     #     'subjects': Subject.objects.count(),
     # }
 
-    context = {
+    return {
         'latest_projects': latest_projects,
         'popular_projects': popular_projects,
         # 'stats': stats,
     }
-    return render(request, 'projects/index.html', context)
 
 
-def project_list(request):
-    """Список всех проектов с фильтрацией"""
-    # Для тестирования показываем все проекты (можно потом вернуть фильтр)
-    projects = Project.objects.filter(status='published')
-
-    # Поиск по ключевым словам
-    query = request.GET.get('q')
-    if query:
-        projects = projects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(keywords__icontains=query)
-        )
+def index(request):
+    """Главная страница"""
+    # Для анонимных посетителей страница одинакова: отдаем ее целиком из кэша,
+    # если нет всплывающих сообщений
+    if request.user.is_authenticated or messages.get_messages(request):
+        return render(request, 'projects/index.html', _index_context())
+    content = cached_page(
+        'index', lambda: render_to_string('projects/index.html', _index_context(), request=request)
+    )
+    return HttpResponse(content)
+
 
-    # Фильтр по предмету
-    subject_id = request.GET.get('subject')
-    if subject_id:
-        projects = projects.filter(subject_id=subject_id)
+CATALOG_PAGE_SIZE = 9
+COMMENTS_PAGE_SIZE = 20
 
-    # Фильтр по преподавателю
-    teacher_id = request.GET.get('teacher')
-    if teacher_id:
-        projects = projects.filter(teacher_id=teacher_id)
 
-    # Фильтр по году
-    year = request.GET.get('year')
-    if year:
-        projects = projects.filter(year=year)
+def _catalog(request, query=None):
+    """Проекты каталога с учетом поиска и фильтров: (queryset, порядок, фильтры).
 
-    # Сортировка по дате создания (новые сверху)
-    projects = projects.order_by('-created_at')
+    query заменяет поисковый запрос из GET (исправленный запрос с опечатками).
+    """
+    filters = parse_filters(request.GET)
+    if query is not None:
+        filters['q'] = query
+    projects = filter_projects(filters, queryset=Project.objects.published().cards())
+    # Результаты поиска отсортированы по релевантности, остальное — новые сверху
+    ordering = ('-search_rank', '-id') if filters['q'] else ('-created_at', '-id')
+    return projects, ordering, filters
 
-    # Пагинация - 9 проектов на страницу
-    paginator = Paginator(projects, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
 
-    # Получаем данные для фильтров
-    subjects = Subject.objects.all()
-    teachers = Teacher.objects.all()
-    years = Project.objects.values_list('year', flat=True).distinct().order_by('-year')
+def _next_page_query(request, page, filters):
+    """Строка запроса следующей страницы: текущие фильтры и новый курсор"""
+    if not page.has_next:
+        return ''
+    params = request.GET.copy()
+    if filters['q']:
+        params['q'] = filters['q']
+    params['cursor'] = page.next_cursor
+    return params.urlencode()
 
-    # Для отладки
-    print(f"Всего проектов: {projects.count()}")
-    print(f"Проектов на странице: {len(page_obj)}")
+
+def _catalog_etag(request):
+    """Страница каталога меняется только вместе с поколениями каталога и счетчиков"""
+    return make_etag(request, 'catalog', request.path, sorted(request.GET.lists()), catalog_state())
+
+
+def project_list(request):
+    """Список всех проектов с фильтрацией"""
+    return conditional_page(request, _catalog_etag(request), lambda: _render_project_list(request))
+
+
+def _render_project_list(request):
+    projects, ordering, filters = _catalog(request)
+    cursor = request.GET.get('cursor')
+    page = KeysetPaginator(projects, CATALOG_PAGE_SIZE, ordering).get_page(cursor)
+
+    # Ничего не нашлось — возможно, опечатка: ищем по исправленному запросу
+    original_query = None
+    if filters['q'] and not cursor and not page:
+        suggestion = autocomplete.get_fuzzy_index().suggest(filters['q'])
+        if suggestion:
+            original_query = filters['q']
+            projects, ordering, filters = _catalog(request, query=suggestion)
+            page = KeysetPaginator(projects, CATALOG_PAGE_SIZE, ordering).get_page(None)
+    if filters['q']:
+        attach_snippets(page, filters['q'])
+
+    # Общее число считаем только для первой страницы: без фильтров оно уже есть
+    # в статистике модерации, с фильтрами — приблизительно, не более 1000
+    total, total_exact = None, True
+    if not cursor:
+        if any(filters.values()):
+            total, total_exact = estimate_count(projects)
+        else:
+            total = status_counts()['published']
+
+    # Значения фильтров с числом опубликованных проектов для текущего запроса
+    facets = facet_counts(filters)
 
     context = {
-        'page_obj': page_obj,
-        'subjects': subjects,
-        'teachers': teachers,
-        'years': years,
-        'current_filters': {
-            'subject': subject_id,
-            'teacher': teacher_id,
-            'year': year,
-            'q': query,
-        }
+        'page': page,
+        'next_query': _next_page_query(request, page, filters),
+        'original_query': original_query,
+        'total': total,
+        'total_exact': total_exact,
+        'facets': facets,
+        'tag_cloud': tag_cloud(),
+        'current_filters': filters,
     }
     return render(request, 'projects/project_list.html', context)
 
 
+def project_list_more(request):
+    """Следующая порция карточек каталога для бесконечной прокрутки"""
+    return conditional_page(request, _catalog_etag(request), lambda: _render_project_list_more(request))
+
+
+def _render_project_list_more(request):
+    projects, ordering, filters = _catalog(request)
+    page = KeysetPaginator(projects, CATALOG_PAGE_SIZE, ordering).get_page(request.GET.get('cursor'))
+    if filters['q']:
+        attach_snippets(page, filters['q'])
+    html = render_to_string('projects/includes/project_cards.html', {'projects': page}, request=request)
+    return JsonResponse({
+        'html': html,
+        'next': _next_page_query(request, page, filters) or None,
+    })
+
+
 @login_required
 def moderation_queue(request):
     """Очередь на модерацию (для преподавателей и админов)"""
     # Проверяем, является ли пользователь преподавателем или админом
-    try:
-        teacher = Teacher.objects.get(user=request.user)
-        is_moderator = True
-    except Teacher.DoesNotExist:
-        if not request.user.is_staff:
-            messages.error(request, 'У вас нет доступа к модерации.')
-            return redirect('index')
-        teacher = None
-        is_moderator = True
+    if not request.roles.is_moderator:
+        messages.error(request, 'У вас нет доступа к модерации.')
+        return redirect('index')
 
     # Фильтры
     status_filter = request.GET.get('status', 'pending')
-    projects = Project.objects.filter(status=status_filter).order_by('-created_at')
+    projects = Project.objects.filter(status=status_filter).cards().order_by('-created_at')
 
     # Статистика
-    stats = {
-        'pending': Project.objects.filter(status='pending').count(),
-        'revision': Project.objects.filter(status='revision').count(),
-        'published': Project.objects.filter(status='published').count(),
-        'rejected': Project.objects.filter(status='rejected').count(),
-    }
+    stats = status_counts()
 
     context = {
         'projects': projects,
         'stats': stats,
         'current_status': status_filter,
-        'teacher': teacher,
+        'teacher': request.roles.teacher,
     }
     return render(request, 'projects/moderation_queue.html', context)
 
 
+MODERATION_MESSAGES = {
+    'approve': (messages.SUCCESS, 'Проект "{title}" опубликован!'),
+    'reject': (messages.WARNING, 'Проект "{title}" отклонен.'),
+    'revision': (messages.INFO, 'Проект "{title}" отправлен на доработку.'),
+}
+
+
 @login_required
 def moderate_project(request, pk):
     """Модерация конкретного проекта"""
     project = get_object_or_404(Project, pk=pk)
 
     # Проверка прав
-    try:
-        teacher = Teacher.objects.get(user=request.user)
-    except Teacher.DoesNotExist:
-        if not request.user.is_staff:
-            return HttpResponseForbidden("У вас нет прав на модерацию")
-        teacher = None
+    if not request.roles.is_moderator:
+        return HttpResponseForbidden("У вас нет прав на модерацию")
+    teacher_id = request.roles.teacher_id
 
     if request.method == 'POST':
         action = request.POST.get('action')
-        comment = request.POST.get('comment', '')
+        if action not in MODERATION_MESSAGES:
+            messages.error(request, 'Выберите действие.')
+            return redirect('moderate_project', pk=project.pk)
 
-        if action == 'approve':
-            project.status = 'published'
-            project.moderated_by = teacher if teacher else None
-            project.moderation_comment = ''
-            project.moderated_at = timezone.now()
-            project.published_at = timezone.now()
-            messages.success(request, f'Проект "{project.title}" опубликован!')
-
-        elif action == 'reject':
-            project.status = 'rejected'
-            project.moderated_by = teacher if teacher else None
-            project.moderation_comment = comment
-            project.moderated_at = timezone.now()
-            messages.warning(request, f'Проект "{project.title}" отклонен.')
-
-        elif action == 'revision':
-            project.status = 'revision'
-            project.moderated_by = teacher if teacher else None
-            project.moderation_comment = comment
-            project.moderated_at = timezone.now()
-            messages.info(request, f'Проект "{project.title}" отправлен на доработку.')
-
-        project.save()
+        results = moderate_projects([project.pk], action, teacher_id, request.POST.get('comment', ''))
+        if results[project.pk] == UNCHANGED:
+            messages.info(request, f'Проект "{project.title}" уже в этом статусе, решение и комментарий обновлены.')
+        else:
+            level, text = MODERATION_MESSAGES[action]
+            messages.add_message(request, level, text.format(title=project.title))
         return redirect('moderation_queue')
 
     context = {
@@ -175,16 +212,50 @@ def moderate_project(request, pk):
     return render(request, 'projects/moderate_project.html', context)
 
 
+@login_required
+@require_POST
+def moderate_bulk(request):
+    """Одно действие модератора сразу для всех отмеченных в очереди проектов"""
+    if not request.roles.is_moderator:
+        return HttpResponseForbidden("У вас нет прав на модерацию")
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    queue_url = f"{reverse('moderation_queue')}?{urlencode({'status': request.POST.get('status', 'pending')})}"
+
+    action = request.POST.get('action')
+    project_ids = [pk for pk in request.POST.getlist('projects') if pk.isdigit()]
+    error = None
+    if action not in ACTIONS:
+        error = 'Выберите действие.'
+    elif not project_ids:
+        error = 'Отметьте хотя бы один проект.'
+    elif len(project_ids) > MAX_BATCH:
+        error = f'За один раз можно обработать не более {MAX_BATCH} проектов.'
+    if error:
+        if is_ajax:
+            return JsonResponse({'error': error}, status=400)
+        messages.error(request, error)
+        return redirect(queue_url)
+
+    results = moderate_projects(project_ids, action, request.roles.teacher_id, request.POST.get('comment', ''))
+    counts = {result: list(results.values()).count(result) for result in (UPDATED, UNCHANGED, MISSING)}
+    if is_ajax:
+        return JsonResponse({'results': results, 'counts': counts})
+
+    messages.success(request, f'Обработано проектов: {counts[UPDATED]}.')
+    if counts[UNCHANGED]:
+        messages.info(request, f'Уже были в этом статусе (обновлены комментарий и модератор): {counts[UNCHANGED]}.')
+    if counts[MISSING]:
+        messages.warning(request, f'Не найдено (удалены): {counts[MISSING]}.')
+    return redirect(queue_url)
+
+
 @login_required
 def my_submissions(request):
     """Мои отправленные проекты (для учеников)"""
-    try:
-        pupil = Pupil.objects.get(user=request.user)
-        projects = Project.objects.filter(pupils=pupil).order_by('-created_at')
-    except Pupil.DoesNotExist:
-        projects = []
+    if not request.roles.is_pupil:
         messages.error(request, 'Только ученики могут отправлять проекты.')
         return redirect('index')
+    projects = Project.objects.filter(pupils=request.roles.pupil_id).select_related('subject').order_by('-created_at')
 
     context = {
         'projects': projects,
@@ -203,13 +274,14 @@ def resubmit_project(request, pk):
         return redirect('index')
 
     if request.method == 'POST':
-        form = ProjectForm(request.POST, request.FILES, instance=project)
+        form = ProjectForm(request.POST, request.FILES, instance=project, user=request.user)
         if form.is_valid():
             project = form.save(commit=False)
             project.status = 'pending'
             project.moderated_by = None
             project.moderation_comment = ''
             project.save()
+            form.release_upload()
             messages.success(request, 'Проект отправлен на повторную модерацию!')
             return redirect('my_submissions')
     else:
@@ -226,19 +298,18 @@ def resubmit_project(request, pk):
 @login_required
 def project_add(request):
     """Добавление нового проекта (только для учеников)"""
-    try:
-        pupil = Pupil.objects.get(user=request.user)
-    except Pupil.DoesNotExist:
+    if not request.roles.is_pupil:
         messages.error(request, 'Только ученики могут добавлять проекты.')
         return redirect('index')
 
     if request.method == 'POST':
-        form = ProjectForm(request.POST, request.FILES)
+        form = ProjectForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             project = form.save(commit=False)
             project.status = 'pending'  # Отправляем на модерацию
             project.save()
-            project.pupils.add(pupil)
+            form.release_upload()
+            project.pupils.add(request.roles.pupil_id)
             messages.success(request, 'Проект успешно отправлен на модерацию! Вы получите уведомление после проверки.')
             return redirect('my_submissions')
         else:
@@ -248,13 +319,12 @@ def project_add(request):
     else:
         form = ProjectForm()
 
-    subjects = Subject.objects.all()
-    teachers = Teacher.objects.all()
+    snapshot = reference.get_snapshot()
 
     context = {
         'form': form,
-        'subjects': subjects,
-        'teachers': teachers,
+        'subjects': snapshot.subjects,
+        'teachers': snapshot.teachers,
     }
     return render(request, 'projects/project_add.html', context)
 
@@ -269,9 +339,10 @@ def project_edit(request, pk):
         return redirect('project_detail', pk=project.pk)
 
     if request.method == 'POST':
-        form = ProjectForm(request.POST, request.FILES, instance=project)
+        form = ProjectForm(request.POST, request.FILES, instance=project, user=request.user)
         if form.is_valid():
             project = form.save()
+            form.release_upload()
             messages.success(request, 'Проект успешно обновлен!')
             return redirect('project_detail', pk=project.pk)
     else:
@@ -285,18 +356,87 @@ def project_edit(request, pk):
     return render(request, 'projects/project_add.html', context)
 
 
+@login_required
+@require_POST
+def upload_start(request):
+    """Начало загрузки файла по частям"""
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Не указан размер файла'}, status=400)
+    try:
+        session = uploads.start(request.user, request.POST.get('filename'), size)
+    except uploads.UploadError as error:
+        return JsonResponse({'error': str(error)}, status=error.status)
+    return JsonResponse(uploads.status(session), status=201)
+
+
+@login_required
+def upload_session(request, upload_id):
+    """GET — сколько байт уже получено (для докачки), POST — следующая часть файла"""
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if request.method == 'GET':
+        return JsonResponse(uploads.status(session))
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['GET', 'POST'])
+
+    # Тело запроса читается потоком, в память целиком не попадает
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        session = uploads.write_chunk(
+            session.pk, offset, request, length, request.headers.get('Chunk-SHA256', '')
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Не указана позиция части'}, status=400)
+    except uploads.UploadError as error:
+        session.refresh_from_db()
+        return JsonResponse(dict(uploads.status(session), error=str(error)), status=error.status)
+    return JsonResponse(uploads.status(session))
+
+
 def download_project(request, pk):
     """Скачивание файла проекта"""
     project = get_object_or_404(Project, pk=pk, status='published')
 
-    if project.project_file:
-        project.increase_downloads()
-        return FileResponse(project.project_file, as_attachment=True)
+    if project.project_file and project.project_file.storage.exists(project.project_file.name):
+        return serve_file(
+            request, project.project_file, project.download_filename, on_start=project.increase_downloads
+        )
     else:
         messages.error(request, 'Файл проекта не найден.')
         return redirect('project_detail', pk=project.pk)
 
 
+@login_required
+def export_projects(request):
+    """Zip-архив файлов опубликованных проектов по фильтрам каталога (для преподавателей)"""
+    if not request.roles.is_moderator:
+        messages.error(request, 'Выгрузка проектов доступна только преподавателям.')
+        return redirect('project_list')
+
+    projects, ordering, filters = _catalog(request)
+    limit = settings.PROJECT_EXPORT_MAX_PROJECTS
+    projects = list(projects.order_by(*ordering)[:limit + 1])
+    if len(projects) > limit:
+        messages.error(request, f'Можно выгрузить не более {limit} проектов. Уточните фильтры.')
+        return redirect(f"{reverse('project_list')}?{request.GET.urlencode()}")
+
+    entries = export.project_entries(projects, request)
+    response = StreamingHttpResponse(export.stream(entries), content_type='application/zip')
+    size = export.archive_size(entries)
+    if size is not None:
+        response.headers['Content-Length'] = str(size)
+    response.headers['Content-Disposition'] = content_disposition_header(True, 'projects.zip')
+    return response
+
+
+def download_archive_member(request, pk, index):
+    """Скачивание одного файла из архива проекта (номер — по оглавлению архива)"""
+    project = get_object_or_404(Project, pk=pk, status='published')
+    return archives.serve_member(request, project.project_file, project.file_blob, index)
+
+
 def register_view(request):
     """Регистрация нового пользователя"""
     if request.method == 'POST':
@@ -330,82 +470,135 @@ def logout_view(request):
 @login_required
 def profile_view(request):
     """Профиль пользователя"""
-    try:
-        pupil = Pupil.objects.get(user=request.user)
-        projects = Project.objects.filter(pupils=pupil)
-    except Pupil.DoesNotExist:
-        pupil = None
-        projects = []
-
-    try:
-        teacher = Teacher.objects.get(user=request.user)
-    except Teacher.DoesNotExist:
-        teacher = None
+    roles = request.roles
+    projects = Project.objects.filter(pupils=roles.pupil_id).select_related('subject') if roles.is_pupil else []
 
     context = {
-        'pupil': pupil,
-        'teacher': teacher,
+        'pupil': roles.pupil,
+        'teacher': roles.teacher,
         'projects': projects,
     }
     return render(request, 'projects/profile.html', context)
 
 
+@login_required
+def lookup(request, kind):
+    """Варианты для полей с автодополнением: ?q=текст&page=номер"""
+    page = request.GET.get('page', '1')
+    data = lookups.lookup(kind, request.GET.get('q', ''), int(page) if page.isdigit() and int(page) > 0 else 1)
+    if data is None:
+        return JsonResponse({'error': 'Неизвестный справочник'}, status=404)
+    return JsonResponse(data)
+
+
 def search_api(request):
-    """API для поиска (AJAX)"""
+    """API для поиска (AJAX): автодополнение из индекса в памяти, без запросов к БД"""
     query = request.GET.get('q', '')
     if len(query) < 2:
         return JsonResponse({'results': []})
 
-    projects = Project.objects.filter(
-        status='published',
-        title__icontains=query
-    )[:5]
-
-    results = [{
-        'id': p.id,
-        'title': p.title,
-        'year': p.year,
-        'url': f'/projects/{p.id}/'
-    } for p in projects]
+    def build():
+        found = autocomplete.get_index().search(query, limit=5)
+        if len(found) < 5:
+            # Дополняем похожими по написанию (запрос с опечаткой)
+            seen = {pk for pk, _, _ in found}
+            found += [
+                item for item in autocomplete.get_fuzzy_index().search(query, limit=5)
+                if item[0] not in seen
+            ][:5 - len(found)]
+        results = [{
+            'id': pk,
+            'title': title,
+            'year': year,
+            'url': f'/projects/{pk}/'
+        } for pk, title, year in found]
+        return JsonResponse({'results': results})
 
-    return JsonResponse({'results': results})
+    etag = make_etag(request, 'search', query, autocomplete.current_version())
+    return conditional_page(request, etag, build)
 
 
 def project_detail(request, pk):
     """Детальная страница проекта"""
     project = get_object_or_404(Project, pk=pk)
+    if request.method == 'POST':
+        # Отправка комментария без JavaScript: просмотр не засчитывается
+        return _add_comment(request, project)
     project.increase_views()
 
     # Для отладки - выведем информацию
     print(f"Запрошен проект: {project.title}")
     print(f"Шаблон: projects/project_detail.html")
 
-    similar_projects = Project.objects.filter(
-        subject=project.subject,
-        status='published'
-    ).exclude(pk=project.pk)[:3]
-
-    comments = project.comments.all()
-
-    if request.method == 'POST' and request.user.is_authenticated:
-        comment_form = CommentForm(request.POST)
-        if comment_form.is_valid():
-            comment = comment_form.save(commit=False)
-            comment.project = project
-            comment.user = request.user
-            comment.save()
-            messages.success(request, 'Комментарий добавлен!')
-            return redirect('project_detail', pk=project.pk)
-    else:
-        comment_form = CommentForm()
+    similar_projects = recommendations.similar_projects(project)
+
+    # Первая порция комментариев (или следующая по ?comments= без JavaScript)
+    comments_cursor = request.GET.get('comments')
+    comments = _comments_page(project, comments_cursor)
+    comments_state = project.comments.aggregate(count=Count('id'), last=Max('created_at'))
 
     context = {
         'project': project,
         'similar_projects': similar_projects,
         'comments': comments,
-        'comment_form': comment_form,
+        'comments_count': comments_state['count'],
+        'comment_form': CommentForm(),
     }
-    return render(request, 'projects/project_detail.html', context)
+
+    # Просмотр уже засчитан выше, поэтому 304 не теряет посещений.
+    # Счетчик на странице обновляется вместе с поколением счетчиков (при их сбросе)
+    last_modified = max(filter(None, [project.updated_at, comments_state['last']]))
+    etag = make_etag(
+        request, 'project', project.pk, project.updated_at,
+        comments_state['count'], comments_state['last'], comments_cursor, catalog_state()
+    )
+    return conditional_page(
+        request, etag, lambda: render(request, 'projects/project_detail.html', context), last_modified
+    )
+
+
+def _comments_page(project, cursor=None):
+    """Порция комментариев проекта, новые первыми; авторы загружаются тем же запросом"""
+    comments = project.comments.select_related('user')
+    return KeysetPaginator(comments, COMMENTS_PAGE_SIZE, ('-created_at', '-id')).get_page(cursor)
+
+
+def _add_comment(request, project):
+    """Сохраняет комментарий: AJAX получает HTML только нового комментария, форма — редирект"""
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    if not request.user.is_authenticated:
+        if is_ajax:
+            return JsonResponse({'errors': {'__all__': ['Войдите, чтобы оставить комментарий.']}}, status=403)
+        return redirect_to_login(request.get_full_path())
+
+    comment_form = CommentForm(request.POST)
+    if not comment_form.is_valid():
+        if is_ajax:
+            return JsonResponse({'errors': comment_form.errors}, status=400)
+        messages.error(request, 'Комментарий не может быть пустым.')
+        return redirect('project_detail', pk=project.pk)
+
+    comment = comment_form.save(commit=False)
+    comment.project = project
+    comment.user = request.user
+    comment.save()
+    if is_ajax:
+        html = render_to_string('projects/includes/comment.html', {'comment': comment}, request=request)
+        return JsonResponse({'html': html}, status=201)
+    messages.success(request, 'Комментарий добавлен!')
+    return redirect('project_detail', pk=project.pk)
+
+
+def project_comments(request, pk):
+    """Комментарии проекта: следующая порция (GET) или добавление нового (POST)"""
+    project = get_object_or_404(Project, pk=pk)
+    if request.method == 'POST':
+        return _add_comment(request, project)
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET', 'POST'])
+    page = _comments_page(project, request.GET.get('cursor'))
+    html = render_to_string('projects/includes/comments.html', {'comments': page}, request=request)
+    return JsonResponse({'html': html, 'next': page.next_cursor})
 
 
 def login_view(request):